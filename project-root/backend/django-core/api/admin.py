@@ -6,7 +6,8 @@ from .models import (
     ChatSession,
     ChatMessage,
     SafetyAlert, # <--- Corrected name: SafetyAlert
-    TrustedContact
+    TrustedContact,
+    NotificationOutbox
 )
 
 # --- 1. Character Admin ---
@@ -38,6 +39,7 @@ class SafetyAlertAdmin(admin.ModelAdmin):
     list_filter = ('alert_level', 'is_resolved')
     search_fields = ('user__username', 'trigger_keywords')
     list_editable = ('is_resolved',)
+    raw_id_fields = ('user', 'chat_session', 'chat_message')
 
 # --- 4. Trusted Contact Admin ---
 @admin.register(TrustedContact)
@@ -45,4 +47,13 @@ class TrustedContactAdmin(admin.ModelAdmin):
     list_display = ('user', 'name', 'email', 'phone_number', 'sos_enabled', 'priority_level')
     list_filter = ('sos_enabled',)
     search_fields = ('user__username', 'name', 'email')
-    list_editable = ('sos_enabled', 'priority_level')
\ No newline at end of file
+    list_editable = ('sos_enabled', 'priority_level')
+
+# --- 5. Notification Outbox Admin ---
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    search_fields = ('recipient', 'alert__user__username')
+    raw_id_fields = ('alert', 'contact')
+    readonly_fields = ('claimed_by', 'locked_until', 'latency_ms', 'created_at', 'sent_at')
@@ -0,0 +1,178 @@
+# api/admission.py
+
+import math
+import time
+from threading import Lock
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+# Routes shed once their in-flight limit (a setting) is reached
+SHEDDABLE_ROUTES = {"chat-submit": "CHAT_MAX_IN_FLIGHT"}
+# Routes that are always admitted, whatever else the process is doing
+PRIORITY_ROUTES = frozenset({"sos-trigger"})
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user token bucket: `burst` requests at once, refilled at `rate_per_minute`.
+
+    Implemented as GCRA, so the bucket is a single timestamp per user in the
+    default cache (Redis when REDIS_URL is set, so the limit holds across
+    workers). Like DRF's own throttles the read-modify-write is not atomic; two
+    racing requests may both take the last token.
+    """
+    scope = None
+    cache = default_cache
+    timer = time.time
+
+    def get_rate(self):
+        """(requests per minute, burst) for this throttle's scope."""
+        raise NotImplementedError
+
+    def get_cache_key(self, request, view):
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        return f"throttle_bucket_{self.scope}_{ident}"
+
+    def allow_request(self, request, view):
+        per_minute, burst = self.get_rate()
+        if not per_minute:
+            return True
+        interval = 60 / per_minute
+        key = self.get_cache_key(request, view)
+        now = self.timer()
+        # The bucket is full when the theoretical arrival time is in the past
+        tat = max(self.cache.get(key, now), now)
+        allowed_from = tat - (burst - 1) * interval
+        if now < allowed_from:
+            self._wait = allowed_from - now
+            return False
+        tat += interval
+        self.cache.set(key, tat, math.ceil(tat - now) + 1)
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class ChatUserThrottle(TokenBucketThrottle):
+    scope = "chat"
+
+    def get_rate(self):
+        return settings.CHAT_USER_RATE_PER_MINUTE, settings.CHAT_USER_BURST
+
+
+class ConcurrencyLimiter:
+    """In-process count of a route's in-flight requests, admitting new ones only below `limit`."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.in_flight = 0
+        self.shed = 0
+
+    def try_acquire(self, limit):
+        with self._lock:
+            if self.in_flight >= limit:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+_limiters = {route: ConcurrencyLimiter() for route in SHEDDABLE_ROUTES}
+
+
+def get_limiter(route):
+    return _limiters[route]
+
+
+def _collect_admission():
+    yield "# HELP django_admission_in_flight Requests in flight per sheddable route."
+    yield "# TYPE django_admission_in_flight gauge"
+    for route, limiter in _limiters.items():
+        yield f'django_admission_in_flight{{route="{route}"}} {limiter.in_flight}'
+    yield "# HELP django_admission_shed_total Requests rejected with 429 at the in-flight limit."
+    yield "# TYPE django_admission_shed_total counter"
+    for route, limiter in _limiters.items():
+        yield f'django_admission_shed_total{{route="{route}"}} {limiter.shed}'
+
+
+registry.collectors.append(_collect_admission)
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds chat turns before they take a worker, so SOS never queues behind them.
+
+    Each route in SHEDDABLE_ROUTES is admitted only while fewer than its limit
+    are in flight in this process; a slot is held until the response has been
+    sent (for a streamed reply, until the stream ends), and excess requests get
+    429 with Retry-After without authenticating or touching the database. Keep
+    CHAT_MAX_IN_FLIGHT below the process's capacity (threads per worker under
+    WSGI) so the remainder is a lane that PRIORITY_ROUTES such as sos/trigger
+    can always use; those are never shed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _admit(self, request):
+        """Returns (release callback or None, 429 response or None)."""
+        try:
+            route = resolve(request.path_info).url_name
+        except Resolver404:
+            return None, None
+        if route not in SHEDDABLE_ROUTES or route in PRIORITY_ROUTES:
+            return None, None
+        limiter = get_limiter(route)
+        if not limiter.try_acquire(getattr(settings, SHEDDABLE_ROUTES[route])):
+            response = JsonResponse({"detail": "Too many requests in progress; try again shortly."}, status=429)
+            response["Retry-After"] = str(settings.CHAT_SHED_RETRY_AFTER)
+            return None, response
+        return limiter.release, None
+
+    def _hold_until_sent(self, response, release):
+        # Run with the response's other closers once the server has sent it (or the client went away)
+        response._resource_closers.append(release)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        release, rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        if release is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        return self._hold_until_sent(response, release)
+
+    async def __acall__(self, request):
+        release, rejected = self._admit(request)
+        if rejected is not None:
+            return rejected
+        if release is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            release()
+            raise
+        return self._hold_until_sent(response, release)
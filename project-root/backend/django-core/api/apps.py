@@ -3,3 +3,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # noqa: F401 (registers the catalogue cache invalidation receivers)
+        from .metrics import install_query_counter
+        connection_created.connect(install_query_counter, dispatch_uid="api.metrics.install_query_counter")
@@ -0,0 +1,105 @@
+# api/catalogue.py
+
+import json
+import time
+import uuid
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "characters:catalogue:state"
+LEADERBOARD_KEY = "characters:leaderboard"
+
+
+def get_catalogue_state():
+    """
+    Returns (version, last_modified) for the public character catalogue.
+
+    Every cached page key embeds the version, so bumping it invalidates all pages
+    at once; the orphaned entries simply expire. last_modified (a Unix timestamp)
+    feeds the Last-Modified header.
+    """
+    state = cache.get(STATE_KEY)
+    if state is None:
+        state = _new_state()
+        # add() so concurrent first requests agree on one version
+        if not cache.add(STATE_KEY, state, timeout=None):
+            state = cache.get(STATE_KEY) or state
+    return state
+
+
+def bump_catalogue_version():
+    """Invalidates every cached catalogue page."""
+    previous = cache.get(STATE_KEY)
+    version, last_modified = _new_state()
+    if previous is not None:
+        # Last-Modified has one-second resolution; keep it strictly increasing so If-Modified-Since can't go stale
+        last_modified = max(last_modified, previous[1] + 1)
+    cache.set(STATE_KEY, (version, last_modified), timeout=None)
+    cache.delete(LEADERBOARD_KEY)
+    logger.debug("Character catalogue cache invalidated")
+
+
+def _new_state():
+    return uuid.uuid4().hex, int(time.time())
+
+
+def get_catalogue_page(page_key, build):
+    """
+    Returns (data, etag, last_modified) for one catalogue page, calling build() on a miss.
+
+    The strong ETag is a hash of the serialized page, so identical content yields
+    the same ETag in every process. last_modified is when the page was built (never
+    before the catalogue state's): a page rebuilt after its TTL under the same
+    version may differ (e.g. a queryset.update() that skipped the signals), and
+    its Last-Modified must move with its ETag.
+    """
+    version, last_modified = get_catalogue_state()
+    key = page_cache_key(version, page_key)
+    entry = cache.get(key)
+    if entry is None:
+        data = build()
+        entry = (data, _etag(data), max(int(time.time()), last_modified))
+        cache.set(key, entry, timeout=settings.CHARACTER_CATALOGUE_TTL)
+    return entry
+
+
+def page_cache_key(version, page_key):
+    return f"characters:catalogue:{version}:{hashlib.md5(page_key.encode()).hexdigest()}"
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def refresh_leaderboard():
+    """
+    Recomputes the top-LEADERBOARD_SIZE public characters by fandom_score and caches them.
+
+    The query walks the (-fandom_score, name, is_public) index and stops after N
+    rows, so it never sorts the table. Called after every counter flush
+    (api/counters.py); Character changes drop it via bump_catalogue_version.
+    """
+    from .models import Character
+    from .serializers import CharacterSerializer
+
+    top = (
+        Character.objects.filter(is_public=True).select_related("creator")
+        .order_by("-fandom_score", "name")[:settings.LEADERBOARD_SIZE]
+    )
+    entry = (CharacterSerializer(top, many=True).data, int(time.time()))
+    cache.set(LEADERBOARD_KEY, entry, timeout=settings.CHARACTER_CATALOGUE_TTL)
+    return entry
+
+
+def get_leaderboard(limit):
+    """Returns (data, etag, last_modified) for the top `limit` characters of the precomputed leaderboard."""
+    entry = cache.get(LEADERBOARD_KEY) or refresh_leaderboard()
+    data, computed_at = entry
+    data = data[:limit]
+    return data, _etag(data), computed_at
@@ -0,0 +1,106 @@
+# api/context.py
+
+import logging
+from dataclasses import dataclass, field
+from django.conf import settings
+from django.db.models import Q
+
+from .models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+# Per-message overhead (role/separators) added to each message's token estimate
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass
+class ChatContext:
+    """What the LLM sees for one turn: the rolling summary plus the newest messages, oldest first."""
+    summary: str = ""
+    messages: list = field(default_factory=list)
+    tokens: int = 0
+
+
+def _before(queryset, timestamp, pk):
+    return queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+
+
+def _after(queryset, timestamp, pk):
+    return queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk))
+
+
+def build_context(session, backend, budget=None, pending=()):
+    """
+    Returns the ChatContext for the next turn of `session`.
+
+    Reads the session backwards on the (session, timestamp, id) index, a page at a
+    time, only until the token budget is spent or the summary's position is reached.
+    Messages that have just fallen out of the window are folded into
+    ChatSession.summary, so each turn reads the window plus the few newly
+    evicted messages, however long the session is.
+
+    `pending` are this turn's not-yet-saved messages (oldest first); they are
+    always included as the newest part of the window.
+    """
+    budget = budget or settings.CHAT_CONTEXT_TOKEN_BUDGET
+    summary_budget = settings.CHAT_SUMMARY_TOKEN_BUDGET
+    window_budget = max(budget - summary_budget, 0)
+    page_size = settings.CHAT_CONTEXT_FETCH_SIZE
+
+    history = ChatMessage.objects.filter(session=session).only("id", "sender", "content", "timestamp")
+    if session.summary_through_id is not None:
+        history = _after(history, session.summary_through_at, session.summary_through_id)
+
+    window = list(reversed(pending))
+    used = sum(backend.count_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in pending)
+    evicted_from = None
+    page = history.order_by("-timestamp", "-id")
+    while evicted_from is None:
+        rows = list(page[:page_size])
+        for message in rows:
+            cost = backend.count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+            # The newest message is always kept, even if it alone exceeds the budget
+            if window and used + cost > window_budget:
+                evicted_from = message
+                break
+            window.append(message)
+            used += cost
+        if len(rows) < page_size:
+            break
+        page = _before(history, rows[-1].timestamp, rows[-1].id).order_by("-timestamp", "-id")
+    window.reverse()
+
+    if evicted_from is not None:
+        _fold_into_summary(session, backend, history, evicted_from, summary_budget)
+
+    summary_tokens = backend.count_tokens(session.summary) if session.summary else 0
+    return ChatContext(summary=session.summary, messages=window, tokens=used + summary_tokens)
+
+
+def _fold_into_summary(session, backend, history, newest_evicted, max_tokens):
+    """Summarizes the messages between the old summary position and `newest_evicted` (inclusive)."""
+    summary = session.summary
+    evicted = history.filter(
+        Q(timestamp__lt=newest_evicted.timestamp) | Q(timestamp=newest_evicted.timestamp, id__lte=newest_evicted.id)
+    ).order_by("timestamp", "id")
+    chunk_size = settings.CHAT_CONTEXT_FETCH_SIZE
+    while True:
+        rows = list(evicted[:chunk_size])
+        if rows:
+            summary = backend.summarize(summary, rows, max_tokens)
+        if len(rows) < chunk_size:
+            break
+        evicted = _after(evicted, rows[-1].timestamp, rows[-1].id)
+
+    # Conditional on the position we started from, so a concurrent turn that already
+    # advanced the summary isn't overwritten with an older one.
+    updated = ChatSession.objects.filter(
+        id=session.id, summary_through_id=session.summary_through_id
+    ).update(
+        summary=summary, summary_through_at=newest_evicted.timestamp, summary_through_id=newest_evicted.id
+    )
+    if updated:
+        session.summary = summary
+        session.summary_through_at, session.summary_through_id = newest_evicted.timestamp, newest_evicted.id
+    else:
+        logger.info(f"Summary of session {session.id} was advanced concurrently; keeping theirs")
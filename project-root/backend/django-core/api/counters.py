@@ -0,0 +1,121 @@
+# api/counters.py
+
+import atexit
+import logging
+from collections import defaultdict
+from threading import Event, Lock, Thread
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from .catalogue import refresh_leaderboard
+from .models import Character
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Accumulates Character.fandom_score increments in process memory and applies them in batches.
+
+    incr() only touches a dict under a lock, so a burst of likes on a hot character
+    never queues on that row's lock. flush() swaps the pending deltas out and
+    applies them with `UPDATE ... SET fandom_score = fandom_score + n` (F()), which is
+    atomic across processes, so concurrent flushers never lose increments.
+    Increments still buffered when a process dies are lost; FANDOM_FLUSH_INTERVAL
+    bounds that window. A flush that changed rows recomputes the leaderboard;
+    cached catalogue pages are left alone (dropping them every interval would keep
+    the list cold under steady likes) and pick up new scores within
+    CHARACTER_CATALOGUE_TTL.
+    """
+
+    def __init__(self, interval=5.0, max_pending=1000):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = defaultdict(int)
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    def incr(self, character_id, amount=1):
+        with self._lock:
+            self._pending[character_id] += amount
+            backlog = len(self._pending)
+        if self.interval and self._thread is None:
+            self._start()
+        if backlog >= self.max_pending:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        """Applies the buffered deltas; returns the number of increments written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, defaultdict(int)
+            # One UPDATE per distinct delta: WHERE id IN (...) SET fandom_score = fandom_score + delta
+            by_delta = defaultdict(list)
+            for character_id, delta in batch.items():
+                if delta:
+                    by_delta[delta].append(character_id)
+            if not by_delta:
+                return 0
+            updated = 0
+            try:
+                with transaction.atomic():
+                    for delta, ids in sorted(by_delta.items()):
+                        updated += Character.objects.filter(id__in=sorted(ids)).update(fandom_score=F("fandom_score") + delta)
+            except DatabaseError:
+                logger.exception(f"fandom_score flush failed; keeping {len(batch)} counters for the next attempt")
+                with self._lock:
+                    for character_id, delta in batch.items():
+                        self._pending[character_id] += delta
+                return 0
+        if updated:
+            # The scores are written; a cache failure here must not reach incr()'s caller (a like request)
+            try:
+                refresh_leaderboard()
+            except Exception:
+                logger.exception("Leaderboard refresh after fandom_score flush failed; it is recomputed on the next flush")
+        return sum(batch.values())
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(target=self._run, name="fandom-score-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("fandom_score flusher crashed; retrying next interval")
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = Lock()
+
+
+def get_counter_buffer():
+    """Returns the process-wide CounterBuffer, built on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CounterBuffer(settings.FANDOM_FLUSH_INTERVAL, settings.FANDOM_FLUSH_MAX_PENDING)
+        return _buffer
+
+
+def record_like(character_id):
+    get_counter_buffer().incr(character_id)
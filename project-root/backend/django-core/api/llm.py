@@ -0,0 +1,119 @@
+# api/llm.py
+
+import asyncio
+import math
+import time
+from threading import Lock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+_DONE = object()
+
+
+class LLMBackend:
+    """
+    Produces a character's reply as a stream of text chunks.
+
+    `context` is the ChatContext (api/context.py) for the turn: the rolling
+    summary plus the newest messages that fit the token budget.
+    """
+
+    def stream(self, *, user, character, session, message, context=None):
+        """Yields the reply chunk by chunk as the model produces it."""
+        raise NotImplementedError
+
+    def complete(self, **kwargs):
+        """Returns the whole reply at once."""
+        return "".join(self.stream(**kwargs))
+
+    async def astream(self, **kwargs):
+        """
+        Async version of stream(), used by the async chat view.
+
+        The default drives the synchronous generator in a worker thread one chunk
+        at a time; backends that talk to a model over the network should
+        override it with native async I/O.
+        """
+        chunks = iter(self.stream(**kwargs))
+        next_chunk = sync_to_async(next, thread_sensitive=False)
+        try:
+            while (chunk := await next_chunk(chunks, _DONE)) is not _DONE:
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()  # e.g. the client went away: let the backend stop generating
+
+    async def acomplete(self, **kwargs):
+        """Async version of complete()."""
+        return "".join([chunk async for chunk in self.astream(**kwargs)])
+
+    def count_tokens(self, text):
+        """Estimated prompt tokens for `text`; backends with a real tokenizer should override this."""
+        return math.ceil(len(text) / 4)
+
+    def summarize(self, summary, messages, max_tokens):
+        """
+        Folds `messages` (oldest first) into the running `summary`, within `max_tokens`.
+
+        The default is extractive: one clipped line per message, dropping the
+        oldest lines once over budget. A model-backed backend should override
+        it with a real summarization call.
+        """
+        lines = summary.splitlines() if summary else []
+        lines += [f"{m.sender}: {' '.join(m.content.split())[:200]}" for m in messages]
+        while len(lines) > 1 and self.count_tokens("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+
+class StubLLMBackend(LLMBackend):
+    """
+    Deterministic local generator used until a real model is wired in (and in tests).
+
+    Emits the placeholder reply word by word; `delay` seconds between words
+    simulates token latency.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def _words(self, user, character, session):
+        reply = (
+            f"Hello {user.username}, I am {character.name}. "
+            f"Thank you for your message in session {session.id}. (LLM integration pending)"
+        )
+        return [word if i == 0 else f" {word}" for i, word in enumerate(reply.split(" "))]
+
+    def stream(self, *, user, character, session, message, context=None):
+        for word in self._words(user, character, session):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word
+
+    async def astream(self, *, user, character, session, message, context=None):
+        for word in self._words(user, character, session):
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word
+
+
+_backends = {}
+_backends_lock = Lock()
+
+
+def get_llm_backend():
+    """Returns the process-wide CHAT_LLM_BACKEND instance, built on first use."""
+    path = settings.CHAT_LLM_BACKEND
+    with _backends_lock:
+        backend = _backends.get(path)
+        if backend is None:
+            backend = _backends[path] = import_string(path)(**settings.CHAT_LLM_OPTIONS)
+        return backend
+
+
+def reset_llm_backend():
+    """Drops cached backends so the next call rebuilds them from settings."""
+    with _backends_lock:
+        _backends.clear()
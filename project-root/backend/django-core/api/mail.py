@@ -0,0 +1,165 @@
+# api/mail.py
+
+import time
+import smtplib
+import logging
+from collections import deque
+from threading import Lock
+from django.conf import settings
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Errors that only fail the current message; the connection stays usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+# Anything else socket-level (smtplib.SMTPException subclasses OSError) means the connection is gone
+CONNECTION_ERRORS = (OSError,)
+# Replies that close the transmission channel (RFC 5321 4.2.3) even when smtplib raises them as one of
+# MESSAGE_ERRORS: 421 "service not available" is how servers shed load or enforce a per-connection limit
+CONNECTION_CODES = frozenset({421})
+
+
+def _closes_connection(error):
+    """Whether a MESSAGE_ERRORS exception actually means the server hung up."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(code in CONNECTION_CODES for code, _ in error.recipients.values())
+    return error.smtp_code in CONNECTION_CODES
+
+
+class SMTPConnectionPool:
+    """
+    Keeps a few authenticated SMTP connections warm between alerts.
+
+    Each connection pays the TCP + TLS handshake and AUTH once; afterwards every
+    message is only MAIL/RCPT/DATA. Idle connections older than `idle_timeout`
+    are closed instead of reused, and reused ones are health-checked with NOOP.
+    """
+
+    def __init__(self, size=2, idle_timeout=30.0, backend=None):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.backend = backend
+        self._idle = deque()  # (connection, last_used)
+        self._lock = Lock()
+
+    def _open(self):
+        connection = get_connection(self.backend, fail_silently=False)
+        connection.open()
+        return connection
+
+    @staticmethod
+    def _is_alive(connection):
+        smtp = getattr(connection, "connection", None)
+        if smtp is None:
+            # Non-SMTP backends (locmem, console) have nothing to keep alive
+            return not hasattr(connection, "connection")
+        try:
+            return smtp.noop()[0] == 250
+        except CONNECTION_ERRORS:
+            return False
+
+    def acquire(self):
+        """Returns an open connection, reusing a healthy idle one when possible."""
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if now - last_used <= self.idle_timeout and self._is_alive(connection):
+                return connection
+            self.discard(connection)
+        return self._open()
+
+    def release(self, connection):
+        """Returns a healthy connection to the pool (or closes it if the pool is full)."""
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self.discard(connection)
+
+    @staticmethod
+    def discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def send_batch(self, messages):
+        """
+        Sends EmailMessages over a single pooled connection.
+
+        Returns one (latency_ms, error) per message. If the connection drops
+        mid-batch (or the server answers 421), the unsent remainder (including
+        the message in flight) is retried once on a fresh connection.
+        """
+        results = [None] * len(messages)
+        pending = list(range(len(messages)))
+        for attempt in range(2):
+            if not pending:
+                break
+            try:
+                connection = self.acquire()
+            except Exception as e:
+                logger.exception("Could not open SMTP connection", exc_info=e)
+                for i in pending:
+                    results[i] = (0.0, str(e) or e.__class__.__name__)
+                return results
+
+            dropped = False
+            while pending:
+                i = pending[0]
+                started = time.perf_counter()
+                try:
+                    connection.send_messages([messages[i]])
+                    error, lost = "", False
+                except MESSAGE_ERRORS as e:
+                    error, lost = str(e) or e.__class__.__name__, _closes_connection(e)
+                except CONNECTION_ERRORS as e:
+                    error, lost = str(e) or e.__class__.__name__, True
+                if lost:
+                    logger.warning(f"SMTP connection dropped mid-batch ({error})")
+                    self.discard(connection)
+                    dropped = True
+                    if attempt == 0:
+                        break  # reconnect and resend the rest
+                    for j in pending:
+                        results[j] = ((time.perf_counter() - started) * 1000, error)
+                    pending = []
+                    break
+                results[i] = ((time.perf_counter() - started) * 1000, error)
+                pending.pop(0)
+
+            if not dropped:
+                self.release(connection)
+        return results
+
+
+_pools = {}
+_pools_lock = Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool for the configured EMAIL_BACKEND."""
+    backend = settings.EMAIL_BACKEND
+    with _pools_lock:
+        pool = _pools.get(backend)
+        if pool is None:
+            pool = _pools[backend] = SMTPConnectionPool(
+                size=settings.SMTP_POOL_SIZE,
+                idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+                backend=backend,
+            )
+        return pool
+
+
+def send_batch(messages):
+    """Sends EmailMessages over one warm connection from the shared pool."""
+    return get_pool().send_batch(messages)
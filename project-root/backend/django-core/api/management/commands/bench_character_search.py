@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+
+from api.models import Character
+from api.search import index_characters, search_characters
+
+WORDS = (
+    "brave knight dragon wizard forest ocean pirate robot detective space captain healer ninja poet "
+    "vampire ghost scholar merchant archer queen king rebel hacker chef singer dancer monk witch giant "
+    "explorer guardian oracle thief sailor pilot doctor artist farmer hunter scientist warrior"
+).split()
+SYLLABLES = "ka lo mi ra te vu zen sho pa ri do ne fi gu ya mo".split()
+TAGS = ["fantasy", "scifi", "romance", "horror", "comedy", "anime", "mystery", "history", "adventure", "slice-of-life"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares icontains scans with the inverted search index as the catalogue grows "
+        "(default up to 100k characters). Runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000", help="Catalogue sizes to measure at.")
+        parser.add_argument("--repeat", type=int, default=20, help="Queries timed per size and method.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        # Prompts draw from a Zipf-distributed vocabulary, like real text: a few very common words, a long tail
+        vocabulary = WORDS + sorted({"".join(rng.choices(SYLLABLES, k=3)) for _ in range(6000)})
+        self.vocabulary, self.zipf = vocabulary, [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        queries = [(" ".join(self._words(rng, 2)), [rng.choice(TAGS)]) for _ in range(options["repeat"])]
+
+        with transaction.atomic():
+            creator = get_user_model().objects.create_user(
+                username="bench-search", email="bench-search@example.com", password="bench"
+            )
+            count = 0
+            for size in sizes:
+                while count < size:
+                    n = min(5000, size - count)
+                    batch = Character.objects.bulk_create([self._character(rng, creator, count + i) for i in range(n)])
+                    index_characters(batch, batch_size=5000)
+                    count += n
+                scan = self._time(queries, self._icontains)
+                index = self._time(queries, lambda q, tags: search_characters(q, tags, 20))
+                self.stdout.write(
+                    f"{size:>8} characters: icontains p50 {scan:8.2f} ms | inverted index p50 {index:7.2f} ms "
+                    f"({scan / index:5.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    def _character(self, rng, creator, i):
+        return Character(
+            creator=creator,
+            name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}",
+            personality_prompt=" ".join(self._words(rng, 25)),
+            tags=rng.sample(TAGS, 2),
+            fandom_score=rng.randint(0, 10_000),
+        )
+
+    def _words(self, rng, k):
+        return rng.choices(self.vocabulary, weights=self.zipf, k=k)
+
+    def _icontains(self, query, tags):
+        # The same ranked query built on substring matches (the admin's search_fields approach):
+        # every row has to be tested before the best 20 are known
+        text, matched = Q(), Value(0)
+        for word in query.split():
+            hit = Q(name__icontains=word) | Q(personality_prompt__icontains=word)
+            text |= hit
+            matched = matched + Case(When(hit, then=Value(1)), default=Value(0))
+        queryset = Character.objects.filter(text, is_public=True)
+        for tag in tags:
+            queryset = queryset.filter(tags__icontains=tag)
+        return list(queryset.annotate(matched=matched).order_by("-matched", "-fandom_score")[:20])
+
+    def _time(self, queries, run):
+        timings = []
+        for query, tags in queries:
+            started = time.perf_counter()
+            run(query, tags)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
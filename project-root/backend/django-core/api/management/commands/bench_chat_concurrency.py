@@ -0,0 +1,170 @@
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from api.llm import StubLLMBackend, get_llm_backend, reset_llm_backend
+from api.models import Character
+
+BENCH_BACKEND = "api.management.commands.bench_chat_concurrency.CountingStubBackend"
+
+
+class CountingStubBackend(StubLLMBackend):
+    """The slow stub reply, counting how many generations are in flight at once."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self.in_flight = self.peak = 0
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stream(self, **kwargs):
+        self._enter()
+        try:
+            yield from super().stream(**kwargs)
+        finally:
+            self._exit()
+
+    async def astream(self, **kwargs):
+        self._enter()
+        try:
+            async for chunk in super().astream(**kwargs):
+                yield chunk
+        finally:
+            self._exit()
+
+
+class _PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """A WSGI process with a fixed pool of worker threads, like gunicorn --threads N."""
+    request_queue_size = 1024
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve_wsgi(threads):
+    server = make_server("127.0.0.1", _free_port(), WSGIHandler(), server_class=_PooledWSGIServer,
+                         handler_class=_QuietHandler)
+    server.pool = ThreadPoolExecutor(max_workers=threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.pool.shutdown(wait=True)
+        server.server_close()
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def _serve_asgi():
+    import uvicorn
+
+    config = uvicorn.Config(ASGIHandler(), host="127.0.0.1", port=_free_port(), lifespan="off",
+                            log_level="warning", backlog=1024)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+    return f"http://127.0.0.1:{config.port}", stop
+
+
+async def _load(base_url, path, token, payload, requests, concurrency):
+    latencies, failures = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            nonlocal failures
+            async with gate:
+                started = time.perf_counter()
+                r = await client.post(path, json=payload)
+                latencies.append(time.perf_counter() - started)
+                failures += r.status_code != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - started, latencies, failures
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares concurrent in-flight chat turns per process when Django is served over WSGI "
+        "(fixed thread pool) vs ASGI (uvicorn, async views), with a slow stub LLM backend. "
+        "Writes a bench user and chat sessions to the configured database; the load generator "
+        "runs in the same process, so compare the two lines rather than absolute numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=200, help="Client-side concurrent requests.")
+        parser.add_argument("--threads", type=int, default=8, help="Worker threads of the WSGI process.")
+        parser.add_argument("--delay-ms", type=float, default=50.0, help="Stub backend delay per streamed word.")
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("uvicorn is not installed (pip install 'uvicorn[standard]').")
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        user, _ = get_user_model().objects.get_or_create(username="bench-chat", defaults={"email": "bench@example.com"})
+        character, _ = Character.objects.get_or_create(creator=user, name="Bench", defaults={"personality_prompt": "calm"})
+        token = str(AccessToken.for_user(user))
+        payload = {"character_id": character.id, "message": "hi there"}
+        n, concurrency = options["requests"], options["concurrency"]
+
+        servers = (("WSGI", lambda: _serve_wsgi(options["threads"])), ("ASGI", _serve_asgi))
+        # Admission control off: this measures what each server can hold, not what it is allowed to
+        with override_settings(CHAT_LLM_BACKEND=BENCH_BACKEND, CHAT_LLM_OPTIONS={"delay": options["delay_ms"] / 1000},
+                               CHAT_USER_RATE_PER_MINUTE=0, CHAT_MAX_IN_FLIGHT=concurrency):
+            for label, serve in servers:
+                reset_llm_backend()
+                backend = get_llm_backend()
+                base_url, stop = serve()
+                try:
+                    elapsed, latencies, failures = asyncio.run(
+                        _load(base_url, reverse("chat-submit"), token, payload, n, concurrency))
+                finally:
+                    stop()
+                self.stdout.write(
+                    f"{label}: {n / elapsed:7.1f} turns/s, p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+                    f"peak {backend.peak:4d} turns in flight, {failures} failed"
+                )
+        reset_llm_backend()
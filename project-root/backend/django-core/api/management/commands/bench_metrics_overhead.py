@@ -0,0 +1,57 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from api.metrics import Histogram, registry
+
+METRICS_MIDDLEWARE = "api.metrics.MetricsMiddleware"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures what the metrics layer costs: one histogram record, one request with and without "
+        "MetricsMiddleware (and its SQL counting), and one /metrics render."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--records", type=int, default=1_000_000)
+
+    def per_request_us(self, path, n, middleware):
+        with override_settings(MIDDLEWARE=middleware):
+            client = Client()
+            client.get(path)  # warm up: URL resolver, first connection
+            started = time.perf_counter()
+            for _ in range(n):
+                client.get(path)
+            return (time.perf_counter() - started) / n * 1e6
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+
+        histogram = Histogram()
+        records = options["records"]
+        started = time.perf_counter()
+        for i in range(records):
+            histogram.record(i * 1e-7)
+        self.stdout.write(f"Histogram.record: {(time.perf_counter() - started) / records * 1e9:6.0f} ns")
+
+        with_metrics = list(settings.MIDDLEWARE)
+        without = [m for m in with_metrics if m != METRICS_MIDDLEWARE]
+        # A view without SQL and one that runs queries (the public character list)
+        for label, path in (("home", reverse("home")), ("character list", reverse("character-list-create"))):
+            # Best of three interleaved runs, so drift (caches, CPU frequency) affects both sides alike
+            runs = [(self.per_request_us(path, n, without), self.per_request_us(path, n, with_metrics))
+                    for _ in range(3)]
+            base, instrumented = min(r[0] for r in runs), min(r[1] for r in runs)
+            self.stdout.write(
+                f"{label:>15}: {base:7.1f} us/request without metrics, {instrumented:7.1f} us with "
+                f"({instrumented - base:+.1f} us, {(instrumented - base) / base:+.1%})"
+            )
+
+        started = time.perf_counter()
+        body = registry.render()
+        self.stdout.write(f"/metrics render: {(time.perf_counter() - started) * 1000:.2f} ms for {len(body)} bytes")
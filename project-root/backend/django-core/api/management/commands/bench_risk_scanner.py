@@ -0,0 +1,54 @@
+import random
+import string
+import time
+from django.core.management.base import BaseCommand
+
+from api.risk import RiskScanner
+
+
+class Command(BaseCommand):
+    help = "Measures risk-scan throughput as the lexicon grows (Aho-Corasick vs the naive substring loop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000,5000", help="Comma-separated lexicon sizes.")
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        sizes = [int(n) for n in options["sizes"].split(",")]
+
+        def word():
+            return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+
+        vocabulary = list({word() for _ in range(max(sizes) * 2)})
+        lexicon_terms = vocabulary[:max(sizes)]
+        filler = vocabulary[max(sizes):]
+        messages = [
+            " ".join(rng.choice(lexicon_terms) if rng.random() < 0.02 else rng.choice(filler) for _ in range(30))
+            for _ in range(options["messages"])
+        ]
+        total_bytes = sum(len(m) for m in messages)
+
+        self.stdout.write(f"{'terms':>6} | {'aho-corasick msg/s':>18} | {'naive loop msg/s':>16} | build ms")
+        for size in sizes:
+            terms = lexicon_terms[:size]
+            started = time.perf_counter()
+            scanner = RiskScanner({"bench": {"weight": 1.0, "terms": terms}})
+            build_ms = (time.perf_counter() - started) * 1000
+
+            for message in messages:  # warm the lazily resolved transitions
+                scanner.scan(message)
+            started = time.perf_counter()
+            for message in messages:
+                scanner.scan(message)
+            ac_rate = len(messages) / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            for message in messages:
+                lower = message.lower()
+                [t for t in terms if t in lower]
+            naive_rate = len(messages) / (time.perf_counter() - started)
+
+            self.stdout.write(f"{size:>6} | {ac_rate:>18.0f} | {naive_rate:>16.0f} | {build_ms:8.1f}")
+        self.stdout.write(f"({options['messages']} messages, {total_bytes / len(messages):.0f} chars each on average)")
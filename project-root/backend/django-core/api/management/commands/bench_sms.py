@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+
+from api.sms import FakeSMSProvider
+
+
+class Command(BaseCommand):
+    help = "Compares an SMS burst with a new provider client per message vs the shared, pooled provider."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--connect-ms", type=float, default=40.0, help="Simulated TCP + TLS setup per new connection.")
+        parser.add_argument("--send-ms", type=float, default=5.0, help="Simulated API call on a warm connection.")
+
+    def handle(self, *args, **options):
+        n, concurrency = options["messages"], options["concurrency"]
+        params = {
+            "connect_latency": options["connect_ms"] / 1000,
+            "latency": options["send_ms"] / 1000,
+            "max_concurrency": concurrency,
+        }
+
+        def per_message_client(i):
+            # What send_sms_placeholder used to do: a fresh client (and HTTP session) per SMS
+            provider = FakeSMSProvider(**params)
+            provider.send(f"+1555{i:07d}", "SOS")
+            return provider.connections_opened
+
+        shared = FakeSMSProvider(**params)
+
+        def shared_client(i):
+            shared.send(f"+1555{i:07d}", "SOS")
+            return 0
+
+        for label, send in (("client per message", per_message_client), ("shared pooled client", shared_client)):
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                started = time.perf_counter()
+                opened = sum(pool.map(send, range(n)))
+                elapsed = time.perf_counter() - started
+            if send is shared_client:
+                opened = shared.connections_opened
+            self.stdout.write(
+                f"{label:>20}: {n / elapsed:8.1f} SMS/s, {opened} connections opened for {n} messages"
+            )
@@ -0,0 +1,53 @@
+import time
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.mail import SMTPConnectionPool
+from api.test_support import SMTPStandIn
+from api.utils import _email_message
+
+
+class Command(BaseCommand):
+    help = "Compares SMTP handshakes per SOS alert: one send_mail per recipient vs the pooled batch sender."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--alerts", type=int, default=20)
+        parser.add_argument("--recipients", type=int, default=5, help="Trusted contacts per alert.")
+        parser.add_argument("--handshake-ms", type=float, default=30.0, help="Simulated TLS handshake + AUTH cost.")
+
+    def handle(self, *args, **options):
+        alerts, recipients = options["alerts"], options["recipients"]
+        addresses = [f"contact{i}@example.com" for i in range(recipients)]
+
+        for label, run in (("per-recipient send_mail", self._per_recipient), ("pooled batch", self._pooled)):
+            with SMTPStandIn(handshake_delay=options["handshake_ms"] / 1000) as server:
+                with override_settings(
+                    EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                    EMAIL_HOST="127.0.0.1", EMAIL_PORT=server.port,
+                    EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+                    EMAIL_HOST_USER="bench", EMAIL_HOST_PASSWORD="bench",
+                ):
+                    started = time.perf_counter()
+                    run(alerts, addresses)
+                    elapsed = time.perf_counter() - started
+
+                self.stdout.write(
+                    f"{label:>24}: {server.connections / alerts:5.2f} handshakes/alert, "
+                    f"{server.auths / alerts:5.2f} AUTHs/alert, "
+                    f"{elapsed / alerts * 1000:7.1f} ms/alert, "
+                    f"{len(server.messages)}/{alerts * recipients} delivered"
+                )
+
+    def _per_recipient(self, alerts, addresses):
+        for _ in range(alerts):
+            for address in addresses:
+                send_mail("SOS", "bench", "sos@example.com", [address])
+
+    def _pooled(self, alerts, addresses):
+        pool = SMTPConnectionPool(size=2, idle_timeout=60)
+        try:
+            for _ in range(alerts):
+                pool.send_batch([_email_message(address, "SOS", "bench") for address in addresses])
+        finally:
+            pool.close_all()
@@ -0,0 +1,56 @@
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.metrics import CONTENT_TYPE, registry
+from api.outbox import process_outbox
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the worker's metrics (e.g. sos_notification_delivery_seconds) on any GET."""
+
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Delivers queued SOS notifications from the outbox, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Rows claimed per batch.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument("--max-attempts", type=int, default=None, help="Attempts before a row is marked failed.")
+        parser.add_argument("--once", action="store_true", help="Drain the currently due rows and exit.")
+        parser.add_argument("--metrics-port", type=int, default=None,
+                            help="Serve Prometheus metrics for this worker on this port.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        if options["metrics_port"]:
+            server = ThreadingHTTPServer(("0.0.0.0", options["metrics_port"]), MetricsHandler)
+            Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write("Notification worker started.")
+        try:
+            while True:
+                close_old_connections()
+                processed = process_outbox(batch_size, options["max_attempts"])
+                total += processed
+                if processed:
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Notification worker stopped after {total} deliveries."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Character
+from api.search import index_characters
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the character search index (needed after bulk_create/update, which skip the save signal)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Characters reindexed per transaction.")
+
+    def handle(self, *args, **options):
+        batch_size, last_id, total = options["batch_size"], 0, 0
+        while True:
+            batch = list(
+                Character.objects.filter(id__gt=last_id).order_by("id")
+                .only("id", "name", "personality_prompt", "tags")[:batch_size]
+            )
+            if not batch:
+                break
+            index_characters(batch)
+            last_id = batch[-1].id
+            total += len(batch)
+            self.stdout.write(f"Indexed {total} characters (last id {last_id})")
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {total} characters."))
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from api.models import ChatMessage, SafetyAlert
+from api.risk import alert_level, init_scan_worker, load_lexicon, scan_rows
+
+UPDATE_FIELDS = ["alert_level", "trigger_keywords", "risk_score"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-scores the user ChatMessage history against the current risk lexicon, creating or updating "
+        "SafetyAlert rows. Reads keyset chunks by id, scores them in a process pool and checkpoints after "
+        "every committed chunk so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Messages read and scored per chunk.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per bulk_create/bulk_update statement.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Scoring processes; 0 scores in this process.")
+        parser.add_argument("--checkpoint", default="rescan_risk.checkpoint.json", help="Checkpoint file used to resume.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and rescan from the first message.")
+        parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines.")
+
+    def handle(self, *args, **options):
+        self.chunk_size, self.batch_size = options["chunk_size"], options["batch_size"]
+        self.checkpoint_path, self.report_every = options["checkpoint"], options["report_every"]
+        lexicon = load_lexicon(settings.RISK_LEXICON_PATH)
+        self.state = self._load_checkpoint(options["restart"], _fingerprint(lexicon))
+
+        messages = ChatMessage.objects.filter(sender=ChatMessage.SENDER_USER)
+        # Fix the upper bound at start so a long run doesn't chase messages written meanwhile;
+        # the next run picks those up from the checkpoint.
+        self.until_id = messages.aggregate(top=Max("id"))["top"] or 0
+        self.messages = messages.filter(id__lte=self.until_id).order_by("id")
+        self.started_from = self.state["last_id"]
+        self.started = self.last_report = time.monotonic()
+        self.run_processed = 0
+
+        self.stdout.write(
+            f"Rescanning messages {self.started_from + 1}..{self.until_id} "
+            f"with {options['workers'] or 'no'} worker processes."
+        )
+        try:
+            if options["workers"] > 0:
+                self._run_pool(lexicon, options["workers"])
+            else:
+                init_scan_worker(lexicon)
+                for rows, meta in self._chunks():
+                    self._commit(scan_rows(rows), meta)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(
+                f"Interrupted; progress is saved up to message {self.state['last_id']}. Run again to resume."
+            ))
+            return
+        self.state["complete"] = True
+        self._save_checkpoint()
+        self._report(final=True)
+
+    def _chunks(self):
+        """Yields ([(id, content)], {id: (session_id, user_id)}) keyset chunks after the checkpoint."""
+        last_id = self.state["last_id"]
+        while True:
+            chunk = list(
+                self.messages.filter(id__gt=last_id)
+                .values_list("id", "content", "session_id", "session__user_id")[:self.chunk_size]
+            )
+            if not chunk:
+                return
+            last_id = chunk[-1][0]
+            yield (
+                [(message_id, content) for message_id, content, _, _ in chunk],
+                {message_id: (session_id, user_id) for message_id, _, session_id, user_id in chunk},
+            )
+
+    def _run_pool(self, lexicon, workers):
+        """Keeps a few chunks in flight per worker and commits their results in id order."""
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_scan_worker, initargs=(lexicon,)) as pool:
+            try:
+                for rows, meta in self._chunks():
+                    pending.append((pool.submit(scan_rows, rows), meta))
+                    if len(pending) >= workers * 2:
+                        future, meta = pending.popleft()
+                        self._commit(future.result(), meta)
+                while pending:
+                    future, meta = pending.popleft()
+                    self._commit(future.result(), meta)
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def _commit(self, results, meta):
+        """Upserts the alerts for one scored chunk, then advances the checkpoint past it."""
+        threshold = settings.RISK_ALERT_THRESHOLD
+        existing = {
+            alert.chat_message_id: alert
+            for alert in SafetyAlert.objects.filter(chat_message_id__in=meta).only("id", "chat_message_id", *UPDATE_FIELDS)
+        }
+        to_create, to_update = [], []
+        for message_id, score, terms in results:
+            keywords = ", ".join(terms)
+            level = alert_level(score)
+            alert = existing.get(message_id)
+            if alert is not None:
+                # Reviewed alerts are kept even if the message now scores lower; only the scoring is refreshed.
+                if (alert.risk_score, alert.trigger_keywords, alert.alert_level) != (score, keywords, level):
+                    alert.risk_score, alert.trigger_keywords, alert.alert_level = score, keywords, level
+                    to_update.append(alert)
+            elif score >= threshold:
+                session_id, user_id = meta[message_id]
+                to_create.append(SafetyAlert(
+                    user_id=user_id, chat_session_id=session_id, chat_message_id=message_id,
+                    alert_level=level, trigger_keywords=keywords, risk_score=score,
+                ))
+
+        with transaction.atomic():
+            SafetyAlert.objects.bulk_create(to_create, batch_size=self.batch_size)
+            SafetyAlert.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=self.batch_size)
+
+        # Saved only after the commit: a crash in between rescans this chunk, which the upsert makes harmless.
+        self.state["last_id"] = max(meta)
+        self.state["processed"] += len(results)
+        self.state["created"] += len(to_create)
+        self.state["updated"] += len(to_update)
+        self._save_checkpoint()
+        self.run_processed += len(results)
+        if time.monotonic() - self.last_report >= self.report_every:
+            self._report()
+
+    def _report(self, final=False):
+        self.last_report = now = time.monotonic()
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.run_processed / elapsed
+        span = self.until_id - self.started_from
+        done = (self.state["last_id"] - self.started_from) / span if span > 0 else 1.0
+        eta = elapsed * (1 - done) / done if 0 < done < 1 else 0
+        line = (
+            f"{self.state['processed']:,} messages scanned, last id {self.state['last_id']}/{self.until_id} "
+            f"({done:.1%}), {rate:,.0f} msg/s, {self.state['created']:,} alerts created, "
+            f"{self.state['updated']:,} updated"
+        )
+        if final:
+            self.stdout.write(self.style.SUCCESS(f"Rescan complete: {line}, {elapsed:.1f}s."))
+        else:
+            self.stdout.write(f"{line}, ETA {eta:,.0f}s")
+
+    def _load_checkpoint(self, restart, fingerprint):
+        fresh = {"lexicon": fingerprint, "last_id": 0, "processed": 0, "created": 0, "updated": 0, "complete": False}
+        if restart or not os.path.exists(self.checkpoint_path):
+            return fresh
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("lexicon") != fingerprint:
+            self.stdout.write("Risk lexicon or thresholds changed since the checkpoint; rescanning from the first message.")
+            return fresh
+        self.stdout.write(f"Resuming after message {state['last_id']} ({state['processed']:,} already scanned).")
+        state["complete"] = False
+        return state
+
+    def _save_checkpoint(self):
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+
+def _fingerprint(lexicon):
+    """Stable hash of the lexicon and alert thresholds, so a checkpoint is only resumed against the rules it was made with."""
+    rules = {"lexicon": lexicon, "alert": settings.RISK_ALERT_THRESHOLD, "high": settings.RISK_HIGH_THRESHOLD}
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16]
@@ -0,0 +1,280 @@
+# api/metrics.py
+
+import hmac
+import time
+from contextvars import ContextVar
+from threading import Lock
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Prometheus `le` boundaries each histogram is exported at
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram.
+
+    Values are scaled to integers (`scale=1e6` records seconds at microsecond
+    resolution). Below 2**sub_bits every integer has its own bucket; above, each
+    power of two is split into 2**(sub_bits - 1) equal buckets, so a bucket's
+    width is at most 1/2**(sub_bits - 1) of its value (~3% for the default 6)
+    over the whole range, in a fixed array of counts. Recording is a bit_length,
+    a shift and an increment.
+    """
+
+    def __init__(self, scale=1e6, sub_bits=6, max_bits=40):
+        self.scale = scale
+        self.sub_bits = sub_bits
+        self._half = 1 << (sub_bits - 1)
+        self._max = (1 << max_bits) - 1
+        self.counts = [0] * ((1 << sub_bits) + (max_bits - sub_bits) * self._half)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def _lowest(self, index):
+        """Smallest scaled value that falls in bucket `index`."""
+        if index < 1 << self.sub_bits:
+            return index
+        shift, offset = divmod(index - (1 << self.sub_bits), self._half)
+        return (offset + self._half) << (shift + 1)
+
+    def record(self, value):
+        v = int(value * self.scale)
+        if v < 0:
+            v = 0
+        elif v > self._max:
+            v = self._max
+        # Bucket index (inverse of _lowest): exact below 2**sub_bits, then _half buckets per power of two
+        shift = v.bit_length() - self.sub_bits
+        index = v if shift <= 0 else (1 << self.sub_bits) + (shift - 1) * self._half + (v >> shift) - self._half
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def percentile(self, q, snapshot=None):
+        counts, count, _, maximum = snapshot or self.snapshot()
+        if not count:
+            return 0.0
+        rank, seen = max(1, round(q * count)), 0
+        for index, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                # Upper edge of the bucket, never past the largest value seen
+                return min((self._lowest(index + 1) - 1) / self.scale, maximum)
+        return maximum
+
+    def cumulative(self, bounds, snapshot=None):
+        """Count of recorded values <= each bound (to bucket precision)."""
+        counts, _, _, _ = snapshot or self.snapshot()
+        result, seen, index = [], 0, 0
+        for bound in bounds:
+            limit = int(bound * self.scale)
+            while index < len(counts) and self._lowest(index) <= limit:
+                seen += counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+class _Family:
+    def __init__(self, name, help_text, labels, kind, buckets=None, scale=1e6):
+        self.name, self.help, self.labels, self.kind = name, help_text, labels, kind
+        self.buckets, self.scale = buckets, scale
+        self.children = {}
+        self._lock = Lock()
+
+    def _child(self, values, factory):
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(values, factory())
+        return child
+
+
+class HistogramFamily(_Family):
+    def __init__(self, name, help_text, labels, buckets=SECONDS_BUCKETS, scale=1e6):
+        super().__init__(name, help_text, labels, "histogram", buckets, scale)
+
+    def observe(self, value, *labels):
+        histogram = self.children.get(labels)
+        if histogram is None:
+            histogram = self._child(labels, lambda: Histogram(self.scale))
+        histogram.record(value)
+
+    def render(self):
+        quantiles = []
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, histogram in sorted(self.children.items()):
+            snapshot = histogram.snapshot()
+            labels = _labels(self.labels, values)
+            for bound, seen in zip(self.buckets, histogram.cumulative(self.buckets, snapshot)):
+                yield f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {seen}'
+            yield f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {snapshot[1]}'
+            yield f"{self.name}_sum{{{labels}}} {snapshot[2]}"
+            yield f"{self.name}_count{{{labels}}} {snapshot[1]}"
+            quantiles += [(labels, q, histogram.percentile(q, snapshot)) for q in QUANTILES]
+        # HDR percentiles of this process, exact to bucket precision (no aggregation across processes)
+        yield f"# HELP {self.name}_quantile {self.help} (percentiles)"
+        yield f"# TYPE {self.name}_quantile gauge"
+        for labels, q, value in quantiles:
+            yield f'{self.name}_quantile{{{labels}{"," if labels else ""}quantile="{q}"}} {value}'
+
+
+class CounterFamily(_Family):
+    def __init__(self, name, help_text, labels):
+        super().__init__(name, help_text, labels, "counter")
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.children[labels] = self.children.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, count in sorted(self.children.items()):
+            yield f"{self.name}{{{_labels(self.labels, values)}}} {count}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = []
+        self.collectors = []  # callables yielding extra exposition lines (gauges read at scrape time)
+
+    def register(self, family):
+        self.families.append(family)
+        return family
+
+    def render(self):
+        lines = [line for family in self.families for line in family.render()]
+        lines += [line for collect in self.collectors for line in collect()]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.register(HistogramFamily(
+    "django_http_request_duration_seconds", "Time from request to response (headers, for streams), by view.",
+    ("view", "method")))
+REQUESTS = registry.register(CounterFamily(
+    "django_http_requests_total", "Responses by view, method and status.", ("view", "method", "status")))
+REQUEST_QUERIES = registry.register(HistogramFamily(
+    "django_db_queries_per_request", "SQL queries run while handling one request, by view.",
+    ("view",), buckets=COUNT_BUCKETS, scale=1))
+REQUEST_QUERY_TIME = registry.register(HistogramFamily(
+    "django_db_query_duration_seconds_per_request", "Total SQL time while handling one request, by view.", ("view",)))
+NOTIFICATION_LATENCY = registry.register(HistogramFamily(
+    "sos_notification_delivery_seconds", "Time to deliver one SOS notification, by channel and outcome.",
+    ("channel", "outcome")))
+
+
+class _RequestStats:
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# The stats of the request being handled; sync_to_async copies the context, so DB work in threads counts too
+_current = ContextVar("request_metrics", default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper (installed on every connection, see install_query_counter)."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: wraps each new database connection once."""
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class MetricsMiddleware:
+    """
+    Records each request's latency, status and SQL query count and time.
+
+    Put it first in MIDDLEWARE so the latency covers the whole stack. Requests
+    are labelled by URL name, so cardinality is bounded by the URLconf
+    (unrouted paths are "unmatched").
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request, response, started, stats):
+        elapsed = time.perf_counter() - started
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match else "unmatched"
+        REQUEST_LATENCY.observe(elapsed, view, request.method)
+        REQUESTS.inc(view, request.method, response.status_code)
+        REQUEST_QUERIES.observe(stats.queries, view)
+        REQUEST_QUERY_TIME.observe(stats.query_time, view)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = _RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, started, stats)
+        return response
+
+
+def metrics_view(request):
+    """GET /metrics: Prometheus text exposition of this process's metrics."""
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-17 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='safetyalert',
+            name='chat_message',
+            field=models.ForeignKey(blank=True, help_text='Message whose content triggered the alert', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='safety_alerts', to='api.chatmessage'),
+        ),
+    ]
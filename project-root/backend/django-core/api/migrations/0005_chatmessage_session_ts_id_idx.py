@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-17 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_safetyalert_chat_message'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='chatmsg_session_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-17 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_chatmessage_session_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['-fandom_score', 'name', 'is_public'], name='character_public_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', '-last_updated'], name='chatsession_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safetyalert',
+            index=models.Index(fields=['user', '-timestamp', 'is_resolved'], name='alert_user_open_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trustedcontact',
+            index=models.Index(fields=['user', 'sos_enabled'], name='contact_user_sos_idx'),
+        ),
+    ]
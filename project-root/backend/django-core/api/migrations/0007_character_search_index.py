@@ -0,0 +1,37 @@
+# Generated by Django 4.2.27 on 2026-10-17 05:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharacterTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=64)),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tags', to='api.character')),
+            ],
+            options={
+                'unique_together': {('tag', 'character')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CharacterSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.FloatField(default=1.0, help_text='Occurrences, with name tokens counting extra')),
+                ('character', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='api.character')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', '-weight', 'character'], name='search_token_impact_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.27 on 2026-10-17 07:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_inactive_users(apps, schema_editor):
+    """Starts the feed with the users who are already inactive, so the gateway's first sync sees them."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStatusChange = apps.get_model("api", "UserStatusChange")
+    ids = User.objects.filter(is_active=False).order_by("id").values_list("id", flat=True)
+    UserStatusChange.objects.bulk_create(
+        [UserStatusChange(user_id=user_id, is_active=False) for user_id in ids.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0008_chatsession_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField()),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(seed_inactive_users, migrations.RunPython.noop),
+    ]
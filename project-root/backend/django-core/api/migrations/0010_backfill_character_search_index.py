@@ -0,0 +1,72 @@
+# Generated by Django 4.2.27 on 2026-10-17 09:12
+
+import re
+from collections import Counter
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Frozen copy of api.search's tokenizer as of 0007, so this migration keeps working as the index evolves
+_TOKEN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64
+NAME_WEIGHT = 5.0
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or so that the this to was "
+    "with you your".split()
+)
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TOKEN_LENGTH] for token in _TOKEN.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def normalize_tags(tags):
+    if not isinstance(tags, (list, tuple)):
+        return []
+    cleaned = (tag.strip().lower()[:MAX_TOKEN_LENGTH] for tag in tags if isinstance(tag, str))
+    return list(dict.fromkeys(tag for tag in cleaned if tag))
+
+
+def backfill_search_index(apps, schema_editor):
+    """Indexes the characters that existed before 0007, in id-ordered batches."""
+    Character = apps.get_model("api", "Character")
+    CharacterSearchToken = apps.get_model("api", "CharacterSearchToken")
+    CharacterTag = apps.get_model("api", "CharacterTag")
+    db = schema_editor.connection.alias
+    last_id = 0
+    while True:
+        batch = list(
+            Character.objects.using(db).filter(id__gt=last_id).order_by("id")
+            .only("id", "name", "personality_prompt", "tags")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        tokens, tags = [], []
+        for character in batch:
+            weights = Counter(tokenize(character.personality_prompt))
+            for token in tokenize(character.name):
+                weights[token] += NAME_WEIGHT
+            tokens += [CharacterSearchToken(character_id=character.id, token=token, weight=weight)
+                       for token, weight in weights.items()]
+            tags += [CharacterTag(character_id=character.id, tag=tag) for tag in normalize_tags(character.tags)]
+        ids = [character.id for character in batch]
+        CharacterSearchToken.objects.using(db).filter(character_id__in=ids).delete()
+        CharacterTag.objects.using(db).filter(character_id__in=ids).delete()
+        CharacterSearchToken.objects.using(db).bulk_create(tokens, batch_size=BATCH_SIZE)
+        CharacterTag.objects.using(db).bulk_create(tags, batch_size=BATCH_SIZE)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_userstatuschange'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
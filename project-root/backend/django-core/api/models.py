@@ -2,6 +2,7 @@
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 # --- 1. AI Character ---
@@ -19,6 +20,13 @@ class Character(models.Model):
     fandom_score = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Public catalogue, ORDER BY -fandom_score, name. Django emits `WHERE is_public` (no `= 1`),
+            # which can't be sought on, so the flag trails the sort key and is checked inside the index.
+            models.Index(fields=["-fandom_score", "name", "is_public"], name="character_public_rank_idx"),
+        ]
+
     def __str__(self):
         return f"{self.name} (by {self.creator.username})"
 
@@ -31,9 +39,18 @@ class ChatSession(models.Model):
     character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name="chat_sessions")
     start_time = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
+    # Rolling summary of the turns that no longer fit the LLM context window (see api/context.py);
+    # it covers every message up to the (summary_through_at, summary_through_id) keyset position.
+    summary = models.TextField(blank=True)
+    summary_through_at = models.DateTimeField(null=True, blank=True)
+    summary_through_id = models.BigIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ["-last_updated"]
+        indexes = [
+            # A user's sessions, most recently active first
+            models.Index(fields=["user", "-last_updated"], name="chatsession_user_recent_idx"),
+        ]
 
     def __str__(self):
         return f"Session {self.id} - {self.user.username} x {self.character.name}"
@@ -52,6 +69,10 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            # Keyset pagination of a session's history (see api.pagination.KeysetPagination)
+            models.Index(fields=["session", "timestamp", "id"], name="chatmsg_session_ts_id_idx"),
+        ]
 
     def __str__(self):
         return f"Message {self.id} ({self.sender}) in session {self.session_id}"
@@ -68,6 +89,7 @@ class SafetyAlert(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="safety_alerts")
     chat_session = models.ForeignKey(ChatSession, null=True, blank=True, on_delete=models.SET_NULL, related_name="safety_alerts_session")
+    chat_message = models.ForeignKey(ChatMessage, null=True, blank=True, on_delete=models.SET_NULL, related_name="safety_alerts", help_text="Message whose content triggered the alert")
     alert_level = models.CharField(max_length=10, choices=ALERT_LEVEL_CHOICES, default=ALERT_LOW)
     trigger_keywords = models.TextField(blank=True)
     risk_score = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(1.0)], default=0.0)
@@ -76,6 +98,10 @@ class SafetyAlert(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # A user's open (or resolved) alerts, newest first; is_resolved trails for the same reason as Character
+            models.Index(fields=["user", "-timestamp", "is_resolved"], name="alert_user_open_recent_idx"),
+        ]
 
     def __str__(self):
         return f"Alert {self.id} for {self.user.username} - {self.alert_level}"
@@ -97,6 +123,99 @@ class TrustedContact(models.Model):
     class Meta:
         # Ensures a user doesn't accidentally add the same email twice
         unique_together = ('user', 'email') 
+        indexes = [
+            # SOS fan-out: the user's contacts with sos_enabled
+            models.Index(fields=["user", "sos_enabled"], name="contact_user_sos_idx"),
+        ]
+
+    def __str__(self):
+        return f"Contact {self.name} for {self.user.username}"
+
+# --- 6. Notification Outbox (durable SOS delivery queue) ---
+class NotificationOutbox(models.Model):
+    """One pending email/SMS for a SafetyAlert, written in the same transaction as the alert."""
+    CHANNEL_EMAIL = "email"
+    CHANNEL_SMS = "sms"
+    CHANNEL_CHOICES = ((CHANNEL_EMAIL, "Email"), (CHANNEL_SMS, "SMS"))
+
+    STATUS_PENDING = "pending"
+    STATUS_SENDING = "sending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENDING, "Sending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    alert = models.ForeignKey(SafetyAlert, on_delete=models.CASCADE, related_name="notifications")
+    contact = models.ForeignKey(TrustedContact, null=True, blank=True, on_delete=models.SET_NULL, related_name="notifications")
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Lease expiry of the worker currently sending this row")
+    claimed_by = models.CharField(max_length=36, blank=True)
+    last_error = models.TextField(blank=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            # The worker's claim query: due rows in the order they should go out
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} for alert {self.alert_id} ({self.status})"
+
+# --- 7. Character Search Index (maintained by api/search.py) ---
+class CharacterSearchToken(models.Model):
+    """Inverted index posting: one normalized token of a character's name/prompt and its weight."""
+    character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=64)
+    weight = models.FloatField(default=1.0, help_text="Occurrences, with name tokens counting extra")
+
+    class Meta:
+        indexes = [
+            # Posting list in impact order, so a search reads a token's best postings first and stops
+            models.Index(fields=["token", "-weight", "character"], name="search_token_impact_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> character {self.character_id}"
+
+
+class CharacterTag(models.Model):
+    """One normalized entry of Character.tags, so tag filters use an index instead of scanning JSON."""
+    character = models.ForeignKey(Character, on_delete=models.CASCADE, related_name="search_tags")
+    tag = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ("tag", "character")
+
+    def __str__(self):
+        return f"#{self.tag} -> character {self.character_id}"
+
+
+# --- 8. User Status Feed (read by the gateway through TokenRevocationsView) ---
+class UserStatusChange(models.Model):
+    """
+    One change of a user's is_active, appended by api/signals.py on save.
+
+    The gateway follows this feed by id instead of downloading every inactive
+    user on each poll. QuerySet.update(is_active=...) bypasses signals and so
+    does not reach the gateway; save the user instead.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="status_changes")
+    is_active = models.BooleanField()
+    changed_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Contact {self.name} for {self.user.username}"
\ No newline at end of file
+        return f"user {self.user_id} {'activated' if self.is_active else 'deactivated'}"
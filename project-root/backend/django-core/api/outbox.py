@@ -0,0 +1,126 @@
+# api/outbox.py
+
+import random
+import uuid
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import NotificationOutbox
+from .utils import ChannelResult, build_sos_messages, deliver_concurrently
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_sos_notifications(alert, user, contacts, latitude=None, longitude=None, message=None):
+    """
+    Writes one outbox row per contact/channel for `alert`.
+
+    Call inside the transaction that creates the alert so the alert and its
+    notifications are committed (or lost) together.
+    """
+    subject, body, sms_body = build_sos_messages(user, latitude, longitude, message)
+
+    rows = []
+    for c in contacts:
+        if c.email:
+            rows.append(NotificationOutbox(
+                alert=alert, contact=c, channel=NotificationOutbox.CHANNEL_EMAIL,
+                recipient=c.email, subject=subject, body=body,
+            ))
+        if c.phone_number:
+            rows.append(NotificationOutbox(
+                alert=alert, contact=c, channel=NotificationOutbox.CHANNEL_SMS,
+                recipient=c.phone_number, body=sms_body,
+            ))
+    return NotificationOutbox.objects.bulk_create(rows)
+
+
+def _due(now):
+    """Rows ready to send: pending and due, or stuck in 'sending' past their lease (crashed worker)."""
+    return NotificationOutbox.objects.filter(
+        Q(status=NotificationOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=NotificationOutbox.STATUS_SENDING, locked_until__lt=now)
+    )
+
+
+def claim_batch(batch_size=50, lease_seconds=None):
+    """
+    Claims up to `batch_size` due rows for this worker and returns them.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database supports it so
+    concurrent workers never block on each other. The claim itself is a
+    conditional UPDATE stamped with a unique token, so on databases without
+    SKIP LOCKED (SQLite) two workers still cannot claim the same row.
+    """
+    lease_seconds = lease_seconds or settings.SOS_OUTBOX_LEASE_SECONDS
+    now = timezone.now()
+    token = uuid.uuid4().hex
+
+    with transaction.atomic():
+        candidates = _due(now).order_by("next_attempt_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return []
+        _due(now).filter(id__in=ids).update(
+            status=NotificationOutbox.STATUS_SENDING,
+            claimed_by=token,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=F("attempts") + 1,
+        )
+
+    return list(NotificationOutbox.objects.filter(id__in=ids, claimed_by=token))
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter (seconds) before retry number `attempts + 1`."""
+    base = settings.SOS_OUTBOX_BACKOFF_BASE
+    delay = min(settings.SOS_OUTBOX_BACKOFF_MAX, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def deliver_batch(rows, max_attempts=None):
+    """Sends claimed rows concurrently and records each outcome. Returns (sent, retried, failed) counts."""
+    max_attempts = max_attempts or settings.SOS_OUTBOX_MAX_ATTEMPTS
+    results = deliver_concurrently([
+        (ChannelResult(channel=row.channel, recipient=row.recipient), row.subject, row.body)
+        for row in rows
+    ])
+
+    now = timezone.now()
+    sent = retried = failed = 0
+    for row, result in zip(rows, results):
+        row.latency_ms = result.latency_ms
+        row.locked_until = None
+        row.last_error = result.error
+        if result.success:
+            row.status = NotificationOutbox.STATUS_SENT
+            row.sent_at = now
+            sent += 1
+        elif row.attempts >= max_attempts:
+            row.status = NotificationOutbox.STATUS_FAILED
+            failed += 1
+            logger.error(f"Giving up on {row.channel} to {row.recipient} for alert {row.alert_id} after {row.attempts} attempts")
+        else:
+            row.status = NotificationOutbox.STATUS_PENDING
+            row.next_attempt_at = now + timedelta(seconds=backoff_delay(row.attempts))
+            retried += 1
+
+    NotificationOutbox.objects.bulk_update(
+        rows, ["status", "latency_ms", "locked_until", "last_error", "sent_at", "next_attempt_at"]
+    )
+    return sent, retried, failed
+
+
+def process_outbox(batch_size=50, max_attempts=None):
+    """Claims and delivers one batch. Returns the number of rows processed."""
+    rows = claim_batch(batch_size)
+    if rows:
+        sent, retried, failed = deliver_batch(rows, max_attempts)
+        logger.info(f"Outbox batch: {sent} sent, {retried} retrying, {failed} failed")
+    return len(rows)
@@ -0,0 +1,102 @@
+# api/pagination.py
+
+import json
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a (timestamp, id) key.
+
+    Each page is `WHERE key < cursor ORDER BY key LIMIT n` (or `>` for the other
+    direction), so with an index on (..., timestamp, id) a deep page costs the same
+    as the first one. Unlike DRF's CursorPagination, ties on the timestamp are
+    broken by id inside the query rather than by an OFFSET.
+
+    Query params: `order` (newest | oldest, default newest), `cursor`, `page_size`.
+    """
+    timestamp_field = "timestamp"
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.newest_first = request.query_params.get("order", "newest") != "oldest"
+        position = self.decode_cursor(request)
+        # A `previous` cursor walks against the requested order, then flips the page back.
+        reverse = bool(position and position["p"])
+        descending = self.newest_first != reverse
+
+        if position:
+            ts, pk, op = position["t"], position["i"], "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.timestamp_field}__{op}": ts}) | Q(**{self.timestamp_field: ts, f"id__{op}": pk})
+            )
+        ordering = (f"-{self.timestamp_field}", "-id") if descending else (self.timestamp_field, "id")
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_position = self.previous_position = None
+        if page:
+            if has_more or reverse:
+                self.next_position = (page[-1], False)
+            if (position and not reverse) or (reverse and has_more):
+                self.previous_position = (page[0], True)
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.encode_cursor(self.next_position),
+            "previous": self.encode_cursor(self.previous_position),
+            "results": data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get("page_size", self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get("cursor")
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            position["t"] = parse_datetime(position["t"])
+            position["i"] = int(position["i"])
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position["t"] is None:
+            raise NotFound(self.invalid_cursor_message)
+        position["p"] = bool(position.get("p"))
+        return position
+
+    def encode_cursor(self, position):
+        if position is None:
+            return None
+        obj, previous = position
+        payload = {"t": getattr(obj, self.timestamp_field).isoformat(), "i": obj.pk, "p": int(previous)}
+        cursor = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode("ascii")
+        return replace_query_param(self.base_url, "cursor", cursor)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {"name": "cursor", "required": False, "in": "query", "schema": {"type": "string"}},
+            {"name": "order", "required": False, "in": "query", "schema": {"type": "string", "enum": ["newest", "oldest"]}},
+            {"name": "page_size", "required": False, "in": "query", "schema": {"type": "integer"}},
+        ]
@@ -0,0 +1,13 @@
+# api/permissions.py
+
+import hmac
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsGatewayService(BasePermission):
+    """Allows service calls carrying the configured X-Gateway-Key."""
+
+    def has_permission(self, request, view):
+        key = settings.GATEWAY_SERVICE_KEY
+        return bool(key) and hmac.compare_digest(request.headers.get('X-Gateway-Key', ''), key)
@@ -0,0 +1,19 @@
+# api/renderers.py
+
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views accept `Accept: text/event-stream`.
+
+    Streaming views return their own StreamingHttpResponse; this renderer only
+    formats regular responses (e.g. validation errors) as a single SSE `error` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode(self.charset)
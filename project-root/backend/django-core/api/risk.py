@@ -0,0 +1,225 @@
+# api/risk.py
+
+import json
+import os
+import re
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from threading import Lock
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w]+")
+# A lexicon term ending in this matches any word starting with it ("stalk*": stalked, stalker)
+STEM_MARKER = "*"
+
+
+def _normalize(text):
+    """Lowercases and collapses every run of non-word characters to one space, between a leading and trailing space."""
+    return " " + _NON_WORD.sub(" ", text.lower()) + " "
+
+
+@dataclass
+class RiskScan:
+    """Result of scanning one message: matched terms and the resulting 0..1 score."""
+    score: float = 0.0
+    matches: list = field(default_factory=list)  # (term, tier, weight) per occurrence
+
+    @property
+    def terms(self):
+        return list(dict.fromkeys(term for term, _, _ in self.matches))
+
+    @property
+    def level(self):
+        return alert_level(self.score)
+
+
+def alert_level(score):
+    """Maps a 0..1 risk score to a SafetyAlert level."""
+    from .models import SafetyAlert  # imported lazily so worker processes need no app registry
+    return SafetyAlert.ALERT_HIGH if score >= settings.RISK_HIGH_THRESHOLD else SafetyAlert.ALERT_LOW
+
+
+class RiskScanner:
+    """
+    Aho-Corasick automaton over the keyword lexicon.
+
+    Built once per lexicon version; `scan` walks each message a single time,
+    one transition per character, no matter how many terms the lexicon holds.
+
+    Terms and text are normalized and every term is anchored on the spaces
+    around it, so a term only matches whole words ("die" matches "die" but not
+    "diet" or "studied", unlike the substring test in the Supabase chat
+    function). Terms marked as stems ("kill*") are anchored on the leading
+    space only and also match longer words ("killed", but still not "skill").
+    """
+
+    def __init__(self, lexicon):
+        # lexicon: {tier: {"weight": float, "terms": [str, ...]}}
+        self.terms = []  # (term, tier, weight)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for tier, spec in lexicon.items():
+            for term in spec["terms"]:
+                stem = term.endswith(STEM_MARKER)
+                anchored = _normalize(term[:-1] if stem else term).rstrip()
+                if anchored.strip():
+                    self._add(anchored if stem else anchored + " ", len(self.terms))
+                    self.terms.append((anchored.lstrip(), tier, float(spec["weight"])))
+        self._link()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _add(self, term, index):
+        state = 0
+        for char in term:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += (index,)
+
+    def _link(self):
+        """Computes failure links breadth-first and merges outputs along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                self._out[nxt] += self._out[self._fail[nxt]]
+        # Resolved transitions (goto + failure walk), filled in lazily by _step so the
+        # scan loop is a single dict lookup per character once the automaton is warm.
+        self._delta = [dict(edges) for edges in self._goto]
+        # Characters that occur in some term; only these are memoized, so _delta stays
+        # bounded by states x alphabet whatever text the scanner sees
+        self._alphabet = frozenset(char for edges in self._goto for char in edges)
+
+    def _step(self, state, char):
+        """Follows failure links to the next state and memoizes the resolved transition."""
+        if char not in self._alphabet:
+            return 0  # no term contains it: every state falls back to the root
+        target = state
+        while target and char not in self._goto[target]:
+            target = self._fail[target]
+        nxt = self._goto[target].get(char, 0)
+        self._delta[state][char] = nxt
+        return nxt
+
+    def scan(self, text):
+        """Returns a RiskScan with every lexicon term found in `text`."""
+        delta, out, terms, step = self._delta, self._out, self.terms, self._step
+        state = 0
+        matches = []
+        for char in _normalize(text):
+            nxt = delta[state].get(char)
+            state = step(state, char) if nxt is None else nxt
+            if out[state]:
+                matches.extend(terms[index] for index in out[state])
+        score = max((weight for _, _, weight in matches), default=0.0)
+        return RiskScan(score=score, matches=matches)
+
+
+def load_lexicon(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_scanner = None
+_scanner_mtime = None
+_checked_at = 0.0
+_scanner_lock = Lock()
+
+
+def get_scanner():
+    """
+    Returns the shared scanner, rebuilding it only when RISK_LEXICON_PATH changes on disk.
+
+    The file is stat'ed at most once every RISK_LEXICON_CHECK_INTERVAL seconds,
+    so editing the lexicon takes effect without a restart or per-request rebuilds.
+    """
+    global _scanner, _scanner_mtime, _checked_at
+    now = time.monotonic()
+    if _scanner is not None and now - _checked_at < settings.RISK_LEXICON_CHECK_INTERVAL:
+        return _scanner
+
+    with _scanner_lock:
+        _checked_at = now
+        path = settings.RISK_LEXICON_PATH
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            logger.exception(f"Risk lexicon {path} is unreadable; keeping the current scanner")
+            mtime = _scanner_mtime
+        if _scanner is None or mtime != _scanner_mtime:
+            try:
+                _scanner = RiskScanner(load_lexicon(path))
+            except (ValueError, KeyError, TypeError):
+                if _scanner is None:
+                    raise
+                logger.exception(f"Risk lexicon {path} is invalid; keeping the current scanner")
+            else:
+                logger.info(f"Loaded risk lexicon with {len(_scanner)} terms from {path}")
+            _scanner_mtime = mtime
+        return _scanner
+
+
+def reload_scanner():
+    """Forces the next get_scanner() call to re-read the lexicon."""
+    global _scanner, _scanner_mtime
+    with _scanner_lock:
+        _scanner = _scanner_mtime = None
+
+
+def record_risk(user, session, message, scan=None):
+    """
+    Scans a user ChatMessage and stores a SafetyAlert when it crosses RISK_ALERT_THRESHOLD.
+
+    Returns (scan, alert); alert is None below the threshold.
+    """
+    from .models import SafetyAlert
+
+    scan = scan or get_scanner().scan(message.content)
+    if scan.score < settings.RISK_ALERT_THRESHOLD:
+        return scan, None
+    alert = SafetyAlert.objects.create(
+        user=user,
+        chat_session=session,
+        chat_message=message,
+        alert_level=scan.level,
+        trigger_keywords=", ".join(scan.terms),
+        risk_score=scan.score,
+    )
+    return scan, alert
+
+
+# --- Process-pool helpers (used by `manage.py rescan_risk`) ---
+_worker_scanner = None
+
+
+def init_scan_worker(lexicon):
+    """Process-pool initializer: builds the automaton once per worker process."""
+    global _worker_scanner
+    _worker_scanner = RiskScanner(lexicon)
+
+
+def scan_rows(rows):
+    """Scores (message_id, content) rows in a worker; returns (message_id, score, terms) tuples."""
+    results = []
+    for message_id, content in rows:
+        scan = _worker_scanner.scan(content)
+        results.append((message_id, scan.score, scan.terms))
+    return results
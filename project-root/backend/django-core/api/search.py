@@ -0,0 +1,101 @@
+# api/search.py
+
+import re
+from collections import Counter
+from django.db import transaction
+
+from .models import Character, CharacterSearchToken, CharacterTag
+
+_TOKEN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 64
+# A token in the name counts this many times its occurrences in the prompt
+NAME_WEIGHT = 5.0
+# Postings read per query token (see search_characters)
+CANDIDATES_PER_TOKEN = 500
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or so that the this to was "
+    "with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens, minus one-letter words and stopwords."""
+    return [
+        token[:MAX_TOKEN_LENGTH] for token in _TOKEN.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def normalize_tags(tags):
+    """Lowercased, stripped, de-duplicated string tags; anything else in the JSON list is ignored."""
+    if not isinstance(tags, (list, tuple)):
+        return []
+    cleaned = (tag.strip().lower()[:MAX_TOKEN_LENGTH] for tag in tags if isinstance(tag, str))
+    return list(dict.fromkeys(tag for tag in cleaned if tag))
+
+
+def character_postings(character):
+    """Returns the (tokens, tags) index rows for one character."""
+    weights = Counter(tokenize(character.personality_prompt))
+    for token in tokenize(character.name):
+        weights[token] += NAME_WEIGHT
+    tokens = [CharacterSearchToken(character_id=character.id, token=token, weight=weight) for token, weight in weights.items()]
+    tags = [CharacterTag(character_id=character.id, tag=tag) for tag in normalize_tags(character.tags)]
+    return tokens, tags
+
+
+def index_characters(characters, batch_size=1000):
+    """(Re)builds the search postings of `characters`. Called on save; bulk writes need `manage.py reindex_characters`."""
+    tokens, tags, ids = [], [], []
+    for character in characters:
+        character_tokens, character_tags = character_postings(character)
+        tokens += character_tokens
+        tags += character_tags
+        ids.append(character.id)
+    with transaction.atomic():
+        CharacterSearchToken.objects.filter(character_id__in=ids).delete()
+        CharacterTag.objects.filter(character_id__in=ids).delete()
+        CharacterSearchToken.objects.bulk_create(tokens, batch_size=batch_size)
+        CharacterTag.objects.bulk_create(tags, batch_size=batch_size)
+
+
+def search_characters(query="", tags=(), limit=20):
+    """
+    Returns up to `limit` public characters matching `query` and carrying every tag in `tags`.
+
+    Text results are ranked by how many query tokens they match, then by summed
+    token weight (name hits weigh more), then fandom_score; each gets a
+    `search_score`. For each query token only its CANDIDATES_PER_TOKEN heaviest
+    postings are read, walking the (token, -weight) index, so the work is bounded by
+    the query rather than the catalogue size. Rankings are exact whenever a token
+    has fewer postings than that cap. Tag-only searches return the most popular
+    characters carrying every tag.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    tags = normalize_tags(list(tags))
+    if tokens:
+        scores = {}
+        for token in tokens:
+            postings = CharacterSearchToken.objects.filter(token=token, character__is_public=True)
+            for tag in tags:
+                postings = postings.filter(character__search_tags__tag=tag)
+            for character_id, weight in postings.order_by("-weight").values_list("character_id", "weight")[:CANDIDATES_PER_TOKEN]:
+                matched, score = scores.get(character_id, (0, 0.0))
+                scores[character_id] = (matched + 1, score + weight)
+        popularity = dict(Character.objects.filter(id__in=list(scores)).values_list("id", "fandom_score"))
+        top = sorted(scores, key=lambda cid: (-scores[cid][0], -scores[cid][1], -popularity[cid], cid))[:limit]
+        characters = Character.objects.select_related("creator").in_bulk(top)
+        ranked = [characters[cid] for cid in top]
+        for character in ranked:
+            character.search_score = scores[character.id][1]
+        return ranked
+
+    if not tags:
+        return []
+    queryset = Character.objects.filter(is_public=True).select_related("creator")
+    for tag in tags:
+        queryset = queryset.filter(search_tags__tag=tag)
+    ranked = list(queryset.order_by("-fandom_score", "name")[:limit])
+    for character in ranked:
+        character.search_score = None
+    return ranked
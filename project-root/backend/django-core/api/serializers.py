@@ -2,7 +2,7 @@
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Character, ChatSession, SafetyAlert, TrustedContact, ChatMessage
+from .models import Character, ChatSession, SafetyAlert, TrustedContact, ChatMessage, NotificationOutbox
 # Ensure all models are imported: ^^^^^^^^^^^ (SafetyAlert is correct)
 
 # Get the active User model defined in settings.AUTH_USER_MODEL
@@ -32,6 +32,26 @@ class CharacterSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'creator_username', 'created_at', 'fandom_score']
 
 
+class CharacterSearchSerializer(serializers.Serializer):
+    """Validates the query string of the character search endpoint."""
+    q = serializers.CharField(required=False, allow_blank=True, default="")
+    tag = serializers.ListField(child=serializers.CharField(max_length=64), required=False, default=list)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+
+    def validate(self, attrs):
+        if not attrs["q"].strip() and not attrs["tag"]:
+            raise serializers.ValidationError("Provide a text query (q) and/or at least one tag.")
+        return attrs
+
+
+class CharacterSearchResultSerializer(CharacterSerializer):
+    """A character search hit; score is null for tag-only searches."""
+    score = serializers.FloatField(source='search_score', read_only=True, allow_null=True)
+
+    class Meta(CharacterSerializer.Meta):
+        fields = CharacterSerializer.Meta.fields + ['score']
+
+
 # --- 2. Chat Serializers ---
 class ChatMessageSerializer(serializers.ModelSerializer):
     """Serializer for displaying individual messages."""
@@ -46,6 +66,7 @@ class ChatRequestSerializer(serializers.Serializer):
     character_id = serializers.IntegerField(required=True)
     session_id = serializers.IntegerField(required=False, allow_null=True)
     message = serializers.CharField(required=True)
+    stream = serializers.BooleanField(required=False, default=False)
 
 
 # --- 3. SOS Serializers ---
@@ -65,9 +86,23 @@ class SOSRequestSerializer(serializers.Serializer):
     source_character = serializers.CharField(required=False, allow_blank=True) 
     
     
+class NotificationOutboxSerializer(serializers.ModelSerializer):
+    """Delivery status of one queued SOS notification."""
+    contact_name = serializers.CharField(source='contact.name', read_only=True, default=None)
+
+    class Meta:
+        model = NotificationOutbox
+        fields = [
+            'id', 'contact', 'contact_name', 'channel', 'recipient', 'status',
+            'attempts', 'last_error', 'latency_ms', 'created_at', 'sent_at'
+        ]
+        read_only_fields = fields
+
+
 class SOSResponseSerializer(serializers.Serializer):
     """Standardizes the response structure sent back to the frontend."""
     success = serializers.BooleanField()
     alert_id = serializers.IntegerField(allow_null=True)
     contacts_notified = serializers.IntegerField()
-    message = serializers.CharField()
\ No newline at end of file
+    message = serializers.CharField()
+    deliveries = NotificationOutboxSerializer(many=True, required=False)
\ No newline at end of file
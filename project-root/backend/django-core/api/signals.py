@@ -0,0 +1,52 @@
+# api/signals.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalogue import bump_catalogue_version
+from .models import Character, UserStatusChange
+from .search import index_characters
+
+
+@receiver(post_save, sender=Character, dispatch_uid="catalogue_character_saved")
+@receiver(post_delete, sender=Character, dispatch_uid="catalogue_character_deleted")
+def invalidate_catalogue_on_character_change(sender, **kwargs):
+    # After commit, so a concurrent request can't re-cache the old rows under the new version
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(post_save, sender=Character, dispatch_uid="search_index_character_saved")
+def reindex_character_on_save(sender, instance, raw=False, **kwargs):
+    # Same transaction as the save, so the index never disagrees with committed rows (deletes cascade)
+    if not raw:
+        index_characters([instance])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="catalogue_creator_saved")
+def invalidate_catalogue_on_creator_change(sender, update_fields=None, created=False, **kwargs):
+    # The catalogue shows creator_username; logins (update_fields={"last_login"}) don't affect it
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="user_status_check")
+def note_user_status_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    # One extra read per full save of an existing user; logins (update_fields={"last_login"}) skip it
+    if raw or (update_fields is not None and "is_active" not in update_fields):
+        instance._status_changed = False
+    elif instance.pk is None or instance._state.adding:
+        instance._status_changed = not instance.is_active
+    else:
+        previous = sender.objects.filter(pk=instance.pk).values_list("is_active", flat=True).first()
+        instance._status_changed = previous is not None and previous != instance.is_active
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL, dispatch_uid="user_status_feed")
+def record_user_status_change(sender, instance, **kwargs):
+    # Same transaction as the save; the gateway picks it up from TokenRevocationsView
+    if getattr(instance, "_status_changed", False):
+        instance._status_changed = False
+        UserStatusChange.objects.create(user=instance, is_active=instance.is_active)
@@ -0,0 +1,141 @@
+# api/sms.py
+
+import os
+import time
+import logging
+from threading import BoundedSemaphore, Lock
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class SMSProvider:
+    """
+    Base SMS provider. One instance is shared by the whole process (see get_sms_provider).
+
+    `max_concurrency` caps in-flight sends (and sizes the HTTP connection pool);
+    `timeout` bounds both the wait for a free slot and each provider call.
+    """
+
+    def __init__(self, max_concurrency=8, timeout=10.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(max_concurrency)
+
+    def send(self, phone_number, message):
+        """Sends one SMS, raising on failure."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No SMS slot free within {self.timeout:g}s")
+        try:
+            self._send(phone_number, message)
+        finally:
+            self._slots.release()
+
+    def _send(self, phone_number, message):
+        raise NotImplementedError
+
+
+class ConsoleSMSProvider(SMSProvider):
+    """Logs messages instead of sending them (development / Twilio not configured)."""
+
+    def _send(self, phone_number, message):
+        logger.info(f"[SMS Placeholder] To: {phone_number} Msg: {message}")
+
+
+class TwilioSMSProvider(SMSProvider):
+    """Twilio provider with one client and a keep-alive HTTP connection pool for the whole process."""
+
+    def __init__(self, account_sid=None, auth_token=None, from_number=None, **kwargs):
+        super().__init__(**kwargs)
+        # Note: Ensure twilio is installed in your virtual environment
+        from twilio.rest import Client
+        from twilio.http.http_client import TwilioHttpClient
+        from requests.adapters import HTTPAdapter
+
+        http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+        http_client.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency))
+        self.client = Client(
+            account_sid or os.getenv("TWILIO_ACCOUNT_SID"),
+            auth_token or os.getenv("TWILIO_AUTH_TOKEN"),
+            http_client=http_client,
+        )
+        self.from_number = from_number or os.getenv("TWILIO_FROM")
+
+    def _send(self, phone_number, message):
+        self.client.messages.create(body=message, from_=self.from_number, to=phone_number)
+        logger.info(f"SMS sent via Twilio to {phone_number}")
+
+
+class FakeSMSProvider(SMSProvider):
+    """
+    In-memory provider for tests and benchmarks.
+
+    Models a keep-alive connection pool: a send reuses an idle connection or
+    pays `connect_latency` to open one, then takes `latency`. Sent messages are
+    recorded in `sent`; set `fail_with` to an exception to make sends fail.
+    """
+
+    def __init__(self, latency=0.0, connect_latency=0.0, fail_with=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.fail_with = fail_with
+        self.sent = []
+        self.connections_opened = 0
+        self._idle_connections = 0
+        self._lock = Lock()
+
+    def _send(self, phone_number, message):
+        with self._lock:
+            reuse = self._idle_connections > 0
+            if reuse:
+                self._idle_connections -= 1
+            else:
+                self.connections_opened += 1
+        if not reuse:
+            time.sleep(self.connect_latency)
+        try:
+            time.sleep(self.latency)
+            if self.fail_with:
+                raise self.fail_with
+            with self._lock:
+                self.sent.append((phone_number, message))
+        finally:
+            with self._lock:
+                self._idle_connections += 1
+
+
+_providers = {}
+_providers_lock = Lock()
+
+
+def build_sms_provider(path=None):
+    """Instantiates the SMS_PROVIDER class with the configured concurrency cap and timeout."""
+    path = path or settings.SMS_PROVIDER
+    options = {
+        "max_concurrency": settings.SMS_MAX_CONCURRENCY,
+        "timeout": settings.SMS_SEND_TIMEOUT,
+        **settings.SMS_PROVIDER_OPTIONS,
+    }
+    try:
+        return import_string(path)(**options)
+    except ImportError:
+        logger.error(f"SMS provider {path} is configured but its library is not installed (pip install twilio).")
+        return ConsoleSMSProvider(max_concurrency=options["max_concurrency"], timeout=options["timeout"])
+
+
+def get_sms_provider():
+    """Returns the process-wide provider for SMS_PROVIDER, built on first use."""
+    path = settings.SMS_PROVIDER
+    with _providers_lock:
+        provider = _providers.get(path)
+        if provider is None:
+            provider = _providers[path] = build_sms_provider(path)
+        return provider
+
+
+def reset_sms_provider():
+    """Drops cached providers so the next send rebuilds them from settings."""
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,279 @@
+"""
+Performance regression suite: every API endpoint against seeded, realistic
+volumes on SQLite, with
+
+- an explicit query budget (assertNumQueries; a failure lists the SQL), and
+- a wall-clock guard: the median of RUNS requests must stay within
+  PERF_TOLERANCE x the endpoint's entry in perf_baseline.json (+ PERF_SLACK_MS).
+
+Runs with the rest of the suite (`manage.py test`). After an intended
+change, re-record the baseline on a quiet machine with
+PERF_RECORD_BASELINE=1 manage.py test api.test_performance
+"""
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import urls as api_urls
+from .counters import get_counter_buffer
+from .context import build_context
+from .llm import get_llm_backend, reset_llm_backend
+from .models import (
+    Character, ChatMessage, ChatSession, NotificationOutbox, SafetyAlert, TrustedContact, UserStatusChange,
+)
+from .search import index_characters
+
+User = get_user_model()
+
+BASELINE_PATH = Path(__file__).with_name("perf_baseline.json")
+RUNS = 5
+TOLERANCE = float(os.environ.get("PERF_TOLERANCE", 3))
+SLACK_MS = float(os.environ.get("PERF_SLACK_MS", 20))
+RECORD = os.environ.get("PERF_RECORD_BASELINE") == "1"
+
+# Seeded volumes
+USERS = 200
+CHARACTERS = 1000
+CONTACTS = 5
+HISTORY = 500
+DELIVERIES = 10
+REVOKED_TOKENS = 100
+INACTIVE_USERS = 20
+
+# Other endpoints in the root URLconf that carry API traffic; users/urls.py is not mounted,
+# so sign-in and sign-out are these SimpleJWT views
+ROOT_ENDPOINTS = {"token_obtain_pair", "token_refresh", "token_blacklist"}
+
+TAGS = ["fantasy", "comedy", "romance", "mystery", "sci-fi", "horror", "slice-of-life", "anime"]
+WORDS = ["brave", "grumpy", "dragon", "knight", "detective", "witch", "pilot", "bard", "robot", "ghost"]
+
+
+def sql_of(queries):
+    return "\n".join(f"{i}. {q['sql']}" for i, q in enumerate(queries.captured_queries, start=1))
+
+
+# Hashing is a fixed cost outside our code; at its production work factor it would drown everything else
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+                   GATEWAY_SERVICE_KEY="gateway-secret", SMS_PROVIDER="api.sms.FakeSMSProvider")
+class EndpointPerformanceTest(TestCase):
+    baseline = {}
+    measured = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baseline = {} if RECORD else json.loads(BASELINE_PATH.read_text())
+        cls.measured = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if RECORD:
+            BASELINE_PATH.write_text(json.dumps(dict(sorted(cls.measured.items())), indent=2) + "\n")
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password("pw")
+        User.objects.bulk_create([
+            User(username=f"user{i}", email=f"user{i}@example.com", password=password, is_active=i >= INACTIVE_USERS)
+            for i in range(USERS)
+        ])
+        cls.users = list(User.objects.order_by("id"))
+        # bulk_create skips the signal that feeds the gateway
+        UserStatusChange.objects.bulk_create([UserStatusChange(user=u, is_active=False) for u in cls.users[:INACTIVE_USERS]])
+        cls.user = cls.users[-1]
+
+        Character.objects.bulk_create([
+            Character(
+                creator=cls.users[i % USERS], name=f"{WORDS[i % 10].title()} {WORDS[i // 10 % 10]} {i}",
+                personality_prompt=f"A {WORDS[i % 7]} {WORDS[i % 10]} who {WORDS[i % 3]}s through every story.",
+                tags=[TAGS[i % 8], TAGS[i % 3]], is_public=i % 10 != 0, fandom_score=(i * 37) % 1000,
+            )
+            for i in range(CHARACTERS)
+        ])
+        characters = list(Character.objects.order_by("id"))
+        index_characters(characters)  # bulk_create skips the post_save indexing
+        cls.character = next(c for c in characters if c.is_public)
+
+        TrustedContact.objects.bulk_create([
+            TrustedContact(user=cls.user, name=f"contact{i}", email=f"contact{i}@example.com",
+                           phone_number=f"+1555000{i:04d}", priority_level=i)
+            for i in range(CONTACTS)
+        ])
+
+        cls.session = ChatSession.objects.create(user=cls.user, character=cls.character)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=cls.session, sender=ChatMessage.SENDER_USER if i % 2 == 0 else ChatMessage.SENDER_AI,
+                        content=f"message {i}: " + " ".join(WORDS[(i + j) % 10] for j in range(20)))
+            for i in range(HISTORY)
+        ])
+        # Fold the older turns into the summary, as the turns that wrote them would have
+        build_context(cls.session, get_llm_backend())
+
+        cls.alert = SafetyAlert.objects.create(user=cls.user, alert_level="high", risk_score=1.0)
+        contacts = list(TrustedContact.objects.filter(user=cls.user))
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(alert=cls.alert, contact=contacts[i % CONTACTS],
+                               channel=NotificationOutbox.CHANNEL_EMAIL if i % 2 == 0 else NotificationOutbox.CHANNEL_SMS,
+                               recipient=f"contact{i}@example.com", body="SOS")
+            for i in range(DELIVERIES)
+        ])
+
+        for user in cls.users[INACTIVE_USERS:INACTIVE_USERS + REVOKED_TOKENS]:
+            token = RefreshToken.for_user(user)
+            BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token["jti"]))
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reset_llm_backend()
+        self.addCleanup(reset_llm_backend)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def check(self, label, queries, method, url, status=200, before=None, data=None, **kwargs):
+        """
+        One request within `queries` queries, then the median of RUNS more within the baseline.
+
+        `before` (not timed) runs ahead of every request, e.g. to clear a cache
+        so each run takes the same path; `data` may be a callable for a fresh
+        payload per request.
+        """
+        def request():
+            if before:
+                before()
+            payload = data() if callable(data) else data
+            started = time.perf_counter()
+            response = getattr(self.client, method)(url, payload, **kwargs)
+            return response, (time.perf_counter() - started) * 1000
+
+        with self.assertNumQueries(queries):
+            response, _ = request()
+        self.assertEqual(response.status_code, status, getattr(response, "data", response))
+
+        timings = []
+        with CaptureQueriesContext(connection) as captured:
+            for _ in range(RUNS):
+                timings.append(request()[1])
+        median = statistics.median(timings)
+        self.measured[label] = round(median, 2)
+        if RECORD:
+            return
+        self.assertIn(label, self.baseline, f"No baseline for {label}; record one with PERF_RECORD_BASELINE=1")
+        limit = self.baseline[label] * TOLERANCE + SLACK_MS
+        self.assertLessEqual(
+            median, limit,
+            f"{label}: median {median:.1f} ms over {RUNS} runs, limit {limit:.1f} ms "
+            f"(baseline {self.baseline[label]} ms). Queries of those runs:\n{sql_of(captured)}",
+        )
+
+    # --- Coverage ---
+    def test_every_endpoint_has_a_baseline(self):
+        if RECORD:
+            return
+        names = {pattern.name for pattern in api_urls.urlpatterns if isinstance(pattern, URLPattern)} | ROOT_ENDPOINTS
+        covered = {label.split(" ", 2)[1] for label in self.baseline}
+        self.assertEqual(names - covered, set(), "Endpoints without a performance budget")
+
+    # --- Characters ---
+    def test_character_list_cold(self):
+        # One SELECT ... JOIN creator, whatever the number of characters
+        self.check("GET character-list-create cold", 1, "get", reverse("character-list-create"), before=cache.clear)
+
+    def test_character_list_cached(self):
+        url = reverse("character-list-create")
+        self.client.get(url)
+        self.check("GET character-list-create cached", 0, "get", url)
+
+    def test_character_leaderboard_cold(self):
+        self.check("GET character-list-create top", 1, "get", reverse("character-list-create") + "?top=10",
+                   before=cache.clear)
+
+    def test_character_create(self):
+        # Creator lookup, INSERT, then the search index rebuild (2 DELETEs, 2 bulk INSERTs) in a savepoint
+        self.check("POST character-list-create", 8, "post", reverse("character-list-create"), status=201,
+                   data={"creator": self.user.id, "name": "Nova the brave", "personality_prompt": "kind", "tags": ["fantasy"]}, format="json")
+
+    def test_character_detail(self):
+        self.check("GET character-detail", 1, "get", reverse("character-detail", args=[self.character.id]))
+
+    def test_character_update(self):
+        self.check("PATCH character-detail", 8, "patch", reverse("character-detail", args=[self.character.id]),
+                   data={"tags": ["fantasy", "mystery"]}, format="json")
+
+    def test_character_search(self):
+        # Postings per term, then scores and rows of the ranked page
+        self.check("GET character-search", 4, "get", reverse("character-search"),
+                   data={"q": "brave dragon", "tag": "fantasy"})
+
+    def test_character_like(self):
+        self.addCleanup(get_counter_buffer().flush)
+        self.check("POST character-like", 1, "post", reverse("character-like", args=[self.character.id]), status=202)
+
+    # --- SOS ---
+    def test_sos_trigger(self):
+        self.check("POST sos-trigger", 6, "post", reverse("sos-trigger"), format="json", data={
+            "user_id": self.user.id, "risk_level": "high", "message": "help",
+            "location": {"latitude": 51.5, "longitude": -0.12},
+        })
+
+    def test_sos_delivery_status(self):
+        self.check("GET sos-delivery-status", 2, "get", reverse("sos-delivery-status", args=[self.alert.id]))
+
+    # --- Chat ---
+    def test_chat_turn_in_long_session(self):
+        # Session, the window since the summary, then the turn in one savepoint
+        self.check("POST chat-submit", 7, "post", reverse("chat-submit"), format="json", data={
+            "character_id": self.character.id, "session_id": self.session.id, "message": "tell me a story",
+        })
+
+    def test_chat_turn_new_session(self):
+        self.check("POST chat-submit new session", 7, "post", reverse("chat-submit"), format="json", data={
+            "character_id": self.character.id, "message": "hello there",
+        })
+
+    def test_chat_history_page(self):
+        self.check("GET chat-session-messages", 2, "get", reverse("chat-session-messages", args=[self.session.id]))
+
+    # --- Gateway service calls ---
+    def test_token_revocations(self):
+        self.client.force_authenticate(None)
+        # High-water mark and rows of each feed
+        self.check("GET token-revocations", 4, "get", reverse("token-revocations"),
+                   HTTP_X_GATEWAY_KEY="gateway-secret")
+
+    def test_bulk_users(self):
+        self.client.force_authenticate(None)
+        ids = ",".join(str(u.id) for u in self.users)
+        self.check("GET users-bulk", 1, "get", reverse("users-bulk"), data={"ids": ids},
+                   HTTP_X_GATEWAY_KEY="gateway-secret")
+
+    # --- Sign-in / sign-out (SimpleJWT) ---
+    def test_token_obtain(self):
+        self.client.force_authenticate(None)
+        self.check("POST token_obtain_pair", 2, "post", reverse("token_obtain_pair"),
+                   data={"username": self.user.username, "password": "pw"}, format="json")
+
+    def test_token_refresh(self):
+        self.client.force_authenticate(None)
+        refresh = str(RefreshToken.for_user(self.user))
+        self.check("POST token_refresh", 2, "post", reverse("token_refresh"), data={"refresh": refresh}, format="json")
+
+    def test_token_blacklist(self):
+        self.client.force_authenticate(None)
+        tokens = iter([str(RefreshToken.for_user(self.user)) for _ in range(RUNS + 1)])
+        self.check("POST token_blacklist", 7, "post", reverse("token_blacklist"),
+                   data=lambda: {"refresh": next(tokens)}, format="json")
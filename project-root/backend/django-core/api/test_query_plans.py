@@ -0,0 +1,108 @@
+# api/test_query_plans.py
+#
+# Query-plan regression suite: runs EXPLAIN for each hot query and fails when the
+# plan falls back to a full table scan or a sort outside an index (filesort).
+# Runs on SQLite here and on MySQL when the test database is MySQL.
+
+import re
+import json
+import unittest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from .models import Character, ChatMessage, ChatSession, SafetyAlert, TrustedContact
+from .views import CharacterListCreateView
+
+User = get_user_model()
+
+
+def plan_problems(queryset):
+    """Returns the full scans / filesorts found in the queryset's EXPLAIN output."""
+    if connection.vendor == "sqlite":
+        return _sqlite_problems(queryset.explain())
+    if connection.vendor == "mysql":
+        return _mysql_problems(json.loads(queryset.explain(format="json")))
+    raise unittest.SkipTest(f"No plan checks for {connection.vendor}")
+
+
+def _sqlite_problems(plan):
+    problems = []
+    for line in plan.splitlines():
+        step = re.sub(r"^[\d\s|`-]+", "", line)  # drop the id/parent columns and tree drawing
+        # "SCAN t USING INDEX i" walks an index in order; a bare "SCAN t" reads the table
+        if step.startswith("SCAN ") and " USING " not in step:
+            problems.append(f"full scan: {step}")
+        if "USE TEMP B-TREE" in step:
+            problems.append(f"filesort: {step}")
+    return problems
+
+
+def _mysql_problems(node, problems=None):
+    problems = [] if problems is None else problems
+    if isinstance(node, dict):
+        if node.get("access_type") == "ALL":
+            problems.append(f"full scan: {node.get('table_name')}")
+        if node.get("using_filesort"):
+            problems.append("filesort")
+        for value in node.values():
+            _mysql_problems(value, problems)
+    elif isinstance(node, list):
+        for value in node:
+            _mysql_problems(value, problems)
+    return problems
+
+
+class HotQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f"plan{i}", email=f"plan{i}@example.com", password="pw") for i in range(5)
+        ]
+        cls.user = cls.users[0]
+        characters = Character.objects.bulk_create([
+            Character(creator=cls.users[i % 5], name=f"c{i}", personality_prompt="p", is_public=i % 4 == 0, fandom_score=i)
+            for i in range(200)
+        ])
+        sessions = ChatSession.objects.bulk_create([
+            ChatSession(user=cls.users[i % 5], character=characters[i % 50]) for i in range(100)
+        ])
+        cls.session = sessions[0]
+        ChatMessage.objects.bulk_create([ChatMessage(session=sessions[i % 100], content=f"m{i}") for i in range(1000)])
+        SafetyAlert.objects.bulk_create([
+            SafetyAlert(user=cls.users[i % 5], is_resolved=i % 3 == 0, risk_score=0.5) for i in range(200)
+        ])
+        TrustedContact.objects.bulk_create([
+            TrustedContact(user=cls.users[i % 5], name=f"t{i}", email=f"t{i}@example.com", sos_enabled=i % 2 == 0)
+            for i in range(50)
+        ])
+        if connection.vendor == "mysql":
+            with connection.cursor() as cursor:
+                for model in (Character, ChatSession, ChatMessage, SafetyAlert, TrustedContact):
+                    cursor.execute(f"ANALYZE TABLE {model._meta.db_table}")
+
+    def assertIndexedPlan(self, queryset):
+        problems = plan_problems(queryset)
+        self.assertEqual(problems, [], f"{queryset.query}\n{queryset.explain()}")
+
+    def test_public_character_catalogue(self):
+        self.assertIndexedPlan(CharacterListCreateView.queryset.all())
+
+    def test_user_sessions_by_recent_activity(self):
+        self.assertIndexedPlan(ChatSession.objects.filter(user=self.user))
+
+    def test_user_open_alerts_newest_first(self):
+        self.assertIndexedPlan(SafetyAlert.objects.filter(user=self.user, is_resolved=False))
+
+    def test_sos_enabled_contacts(self):
+        self.assertIndexedPlan(TrustedContact.objects.filter(user=self.user, sos_enabled=True))
+
+    def test_chat_history_page(self):
+        queryset = ChatMessage.objects.filter(session=self.session).order_by("-timestamp", "-id")[:51]
+        self.assertIndexedPlan(queryset)
+
+    def test_detects_unindexed_plans(self):
+        # Guards the checker itself: an unindexed filter and sort must be reported.
+        problems = plan_problems(ChatMessage.objects.filter(content="m1").order_by("sender"))
+        self.assertTrue(any(p.startswith("full scan") for p in problems), problems)
+        self.assertIn("filesort", " ".join(problems))
@@ -0,0 +1,111 @@
+# api/test_support.py
+#
+# Stand-ins for external services, shared by the tests and the bench_* management
+# commands. Nothing in the application imports this module.
+
+import time
+import socketserver
+from threading import Lock, Thread
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """
+    Minimal local SMTP server for tests and benchmarks.
+
+    Accepts EHLO/AUTH/MAIL/RCPT/DATA/NOOP/RSET/QUIT and counts connections
+    (each one stands for a TLS handshake + AUTH on the real server), AUTH
+    exchanges and delivered messages. `handshake_delay` simulates the cost of
+    the TLS handshake; `drop_after` closes a connection after that many
+    messages to emulate a server hanging up mid-batch, and `shutdown_after`
+    answers the next MAIL with 421 and closes, like a server shedding load.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, handshake_delay=0.0, drop_after=None, shutdown_after=None):
+        super().__init__((host, port), _SMTPHandler)
+        self.handshake_delay = handshake_delay
+        self.drop_after = drop_after
+        self.shutdown_after = shutdown_after
+        self.connections = 0
+        self.auths = 0
+        self.messages = []
+        self._lock = Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def start(self):
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.count("connections")
+        if server.handshake_delay:
+            time.sleep(server.handshake_delay)
+        self.reply("220 localhost SMTP stand-in")
+        sent_here = 0
+        recipients = []
+
+        for raw in self.rfile:
+            command = raw.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN\r\n250 OK\r\n")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "AUTH":
+                if len(command.split()) == 2:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                server.count("auths")
+                self.reply("235 Authentication successful")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip(" <>"))
+                self.reply("250 OK")
+            elif verb == "MAIL" and server.shutdown_after is not None and sent_here >= server.shutdown_after:
+                self.reply("421 Service not available, closing transmission channel")
+                return
+            elif verb in ("MAIL", "RSET", "NOOP"):
+                if verb != "NOOP":
+                    recipients = []
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                for line in self.rfile:
+                    if line in (b".\r\n", b".\n"):
+                        break
+                with server._lock:
+                    server.messages.extend(recipients)
+                self.reply("250 Queued")
+                sent_here += 1
+                if server.drop_after and sent_here >= server.drop_after:
+                    return  # hang up without QUIT
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
@@ -1,5 +1,1250 @@
-from django.test import TestCase
+import os
+import json
+import asyncio
+import time
+import tempfile
+import socket
+import smtplib
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from .admission import ChatUserThrottle, get_limiter
+from .mail import SMTPConnectionPool
+from .metrics import Histogram
+from .catalogue import get_catalogue_state, page_cache_key
+from .context import build_context
+from .counters import CounterBuffer, get_counter_buffer
+from .llm import StubLLMBackend, reset_llm_backend
+from .management.commands.rescan_risk import Command as RescanRiskCommand
+from .models import Character, CharacterSearchToken, ChatMessage, ChatSession, NotificationOutbox, SafetyAlert, TrustedContact
+from .outbox import claim_batch, enqueue_sos_notifications, process_outbox
+from .risk import RiskScanner, get_scanner, reload_scanner
+from .test_support import SMTPStandIn
+from .sms import ConsoleSMSProvider, FakeSMSProvider, build_sms_provider, get_sms_provider, reset_sms_provider
+from .utils import _email_message, notify_trusted_contacts
+
+User = get_user_model()
+
 
 class SimpleTest(TestCase):
     def test_basic(self):
         self.assertEqual(1 + 1, 2)
+
+
+class BrokenEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise smtplib.SMTPDataError(554, "smtp down")
+
+
+# --- SOS fan-out ---
+class NotifyTrustedContactsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice", email="alice@example.com", password="pw")
+        for i in range(5):
+            TrustedContact.objects.create(
+                user=self.user, name=f"Contact {i}",
+                email=f"c{i}@example.com", phone_number=f"+1555000{i}",
+            )
+        self.contacts = TrustedContact.objects.filter(user=self.user, sos_enabled=True)
+
+    def test_reports_every_channel_of_every_contact(self):
+        reports = notify_trusted_contacts(self.user, self.contacts, latitude=1.5, longitude=2.5, message="help")
+
+        self.assertEqual(len(reports), 5)
+        for report in reports:
+            self.assertTrue(report.notified)
+            self.assertEqual([c.channel for c in report.channels], ["email", "sms"])
+            for channel in report.channels:
+                self.assertTrue(channel.success)
+                self.assertEqual(channel.error, "")
+                self.assertGreaterEqual(channel.latency_ms, 0)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn("query=1.5,2.5", mail.outbox[0].body)
+
+    def test_channels_are_sent_in_parallel(self):
+        def slow_sms(*args):
+            time.sleep(0.2)
+
+        with mock.patch("api.utils._deliver_sms", slow_sms):
+            started = time.monotonic()
+            reports = notify_trusted_contacts(self.user, self.contacts)
+            elapsed = time.monotonic() - started
+
+        self.assertTrue(all(r.notified for r in reports))
+        self.assertLess(elapsed, 0.6)  # sequential would take >= 1s
+
+    @override_settings(SOS_CHANNEL_TIMEOUTS={"email": 5, "sms": 0.05})
+    def test_slow_channel_is_reported_as_timed_out(self):
+        def hanging_sms(*args):
+            time.sleep(0.5)
+
+        with mock.patch("api.utils._deliver_sms", hanging_sms):
+            started = time.monotonic()
+            reports = notify_trusted_contacts(self.user, self.contacts)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.45)
+        for report in reports:
+            email, sms = report.channels
+            self.assertTrue(email.success)
+            self.assertFalse(sms.success)
+            self.assertIn("Timed out", sms.error)
+            self.assertTrue(report.notified)
+
+    @override_settings(EMAIL_BACKEND="api.tests.BrokenEmailBackend")
+    def test_failed_channel_records_error(self):
+        reports = notify_trusted_contacts(self.user, self.contacts)
+
+        email, sms = reports[0].channels
+        self.assertFalse(email.success)
+        self.assertIn("smtp down", email.error)
+        self.assertTrue(sms.success)
+
+
+@override_settings(SMS_PROVIDER="api.sms.FakeSMSProvider")
+class SOSTriggerViewTest(TestCase):
+    def setUp(self):
+        reset_sms_provider()
+        self.sms = get_sms_provider()
+        self.user = User.objects.create_user(username="bob", email="bob@example.com", password="pw")
+        TrustedContact.objects.create(user=self.user, name="Mom", email="mom@example.com", phone_number="+15550001")
+        TrustedContact.objects.create(user=self.user, name="Off", email="off@example.com", sos_enabled=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def trigger(self):
+        return self.client.post(reverse("sos-trigger"), {
+            "user_id": self.user.id,
+            "risk_level": "high",
+            "message": "help",
+            "location": {"latitude": 1.0, "longitude": 2.0},
+        }, format="json")
+
+    def test_trigger_queues_deliveries_without_sending(self):
+        response = self.trigger()
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["contacts_notified"], 1)
+        self.assertEqual(body["alert_id"], SafetyAlert.objects.get().id)
+        self.assertEqual({d["channel"] for d in body["deliveries"]}, {"email", "sms"})
+        self.assertTrue(all(d["status"] == "pending" and d["contact_name"] == "Mom" for d in body["deliveries"]))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(self.sms.sent, [])
+
+    def test_worker_delivers_queued_notifications(self):
+        alert_id = self.trigger().json()["alert_id"]
+        call_command("deliver_notifications", "--once", stdout=mock.MagicMock())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["mom@example.com"])
+        self.assertEqual(len(self.sms.sent), 1)
+        self.assertIn("SOS from bob", self.sms.sent[0][1])
+
+        statuses = self.client.get(reverse("sos-delivery-status", args=[alert_id])).json()
+        self.assertEqual([d["status"] for d in statuses], ["sent", "sent"])
+        self.assertTrue(all(d["attempts"] == 1 and d["latency_ms"] is not None for d in statuses))
+
+    def test_alert_is_rolled_back_if_queueing_fails(self):
+        with mock.patch("api.views.enqueue_sos_notifications", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.trigger()
+        self.assertFalse(SafetyAlert.objects.exists())
+
+    async def test_trigger_runs_natively_under_asgi(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        self.assertTrue(iscoroutinefunction(resolve(reverse("sos-trigger")).func))
+        token = str(AccessToken.for_user(self.user))
+        response = await AsyncClient().post(reverse("sos-trigger"), {
+            "user_id": self.user.id, "risk_level": "high", "message": "help",
+        }, content_type="application/json", headers={"Authorization": f"Bearer {token}"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["contacts_notified"], 1)
+        self.assertEqual(await NotificationOutbox.objects.filter(alert_id=response.json()["alert_id"]).acount(), 2)
+
+
+@override_settings(SOS_OUTBOX_MAX_ATTEMPTS=2, SOS_OUTBOX_BACKOFF_BASE=30, SMS_PROVIDER="api.sms.FakeSMSProvider")
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        reset_sms_provider()
+        self.user = User.objects.create_user(username="carol", email="carol@example.com", password="pw")
+        TrustedContact.objects.create(user=self.user, name="Dad", phone_number="+15550002")
+        self.alert = SafetyAlert.objects.create(user=self.user, alert_level="high")
+        enqueue_sos_notifications(self.alert, self.user, TrustedContact.objects.filter(user=self.user))
+
+    def test_failed_delivery_is_retried_with_backoff_then_marked_failed(self):
+        get_sms_provider().fail_with = ConnectionError("twilio 503")
+        self.assertEqual(process_outbox(), 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual(row.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.last_error, "twilio 503")
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=20))
+
+        # Not due yet, so nothing is claimed
+        self.assertEqual(process_outbox(), 0)
+
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_outbox(), 1)
+
+        row.refresh_from_db()
+        self.assertEqual(row.status, NotificationOutbox.STATUS_FAILED)
+        self.assertEqual(row.attempts, 2)
+
+    def test_claimed_rows_are_not_claimed_twice(self):
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+    def test_rows_of_a_crashed_worker_are_reclaimed_after_the_lease(self):
+        claim_batch()
+        NotificationOutbox.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        [row] = claim_batch()
+        self.assertEqual(row.attempts, 2)
+
+
+
+# --- Pooled SMTP ---
+class SMTPConnectionPoolTest(TestCase):
+    def setUp(self):
+        self.server = SMTPStandIn().start()
+        self.addCleanup(self.server.stop)
+        overrides = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1", EMAIL_PORT=self.server.port,
+            EMAIL_USE_SSL=False, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="sos", EMAIL_HOST_PASSWORD="secret",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.pool = SMTPConnectionPool(size=2, idle_timeout=60)
+        self.addCleanup(self.pool.close_all)
+
+    def alert(self, recipients=5):
+        return self.pool.send_batch([_email_message(f"c{i}@example.com", "SOS", "help") for i in range(recipients)])
+
+    def test_one_connection_serves_every_recipient_and_later_alerts(self):
+        for _ in range(3):
+            results = self.alert()
+            self.assertTrue(all(error == "" for _, error in results))
+
+        self.assertEqual(len(self.server.messages), 15)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.auths, 1)
+
+    def test_idle_connections_expire(self):
+        self.pool.idle_timeout = 0
+        self.alert()
+        time.sleep(0.01)
+        self.alert()
+        self.assertEqual(self.server.connections, 2)
+
+    def test_dead_idle_connection_is_replaced(self):
+        self.alert()
+        idle_connection = self.pool._idle[0][0]
+        idle_connection.connection.sock.shutdown(socket.SHUT_RDWR)
+
+        results = self.alert()
+        self.assertTrue(all(error == "" for _, error in results))
+        self.assertEqual(self.server.connections, 2)
+
+    def test_connection_dropped_mid_batch_resumes_on_a_new_connection(self):
+        self.server.drop_after = 2
+        results = self.alert(recipients=3)
+
+        self.assertTrue(all(error == "" for _, error in results))
+        self.assertEqual(sorted(self.server.messages), ["c0@example.com", "c1@example.com", "c2@example.com"])
+        self.assertEqual(self.server.connections, 2)
+
+
+    def test_421_mid_batch_resumes_on_a_new_connection(self):
+        self.server.shutdown_after = 2
+        results = self.alert(recipients=3)
+
+        self.assertEqual([error for _, error in results], ["", "", ""])
+        self.assertEqual(sorted(self.server.messages), ["c0@example.com", "c1@example.com", "c2@example.com"])
+        self.assertEqual(self.server.connections, 2)
+
+    def test_refused_recipient_fails_only_its_message(self):
+        with mock.patch("smtplib.SMTP.sendmail", side_effect=[
+            {}, smtplib.SMTPRecipientsRefused({"c1@example.com": (550, b"No such user")}), {},
+        ]):
+            results = self.alert(recipients=3)
+        self.assertEqual([bool(error) for _, error in results], [False, True, False])
+        self.assertEqual(self.server.connections, 1)
+
+# --- SMS provider ---
+class SMSProviderTest(TestCase):
+    def setUp(self):
+        reset_sms_provider()
+        self.addCleanup(reset_sms_provider)
+
+    @override_settings(SMS_PROVIDER="api.sms.FakeSMSProvider", SMS_MAX_CONCURRENCY=3)
+    def test_provider_is_built_once_per_process(self):
+        provider = get_sms_provider()
+        self.assertIs(get_sms_provider(), provider)
+        self.assertEqual(provider.max_concurrency, 3)
+
+        for i in range(10):
+            provider.send(f"+1555000{i}", "hi")
+        self.assertEqual(len(provider.sent), 10)
+        self.assertEqual(provider.connections_opened, 1)
+
+    def test_concurrency_cap_times_out_waiting_senders(self):
+        provider = FakeSMSProvider(latency=0.3, max_concurrency=1, timeout=0.05)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            first = pool.submit(provider.send, "+15550001", "a")
+            time.sleep(0.05)
+            second = pool.submit(provider.send, "+15550002", "b")
+            with self.assertRaises(TimeoutError):
+                second.result()
+            first.result()
+        self.assertEqual(provider.sent, [("+15550001", "a")])
+
+    def test_missing_provider_library_falls_back_to_console(self):
+        with mock.patch("api.sms.import_string", side_effect=ImportError("No module named 'twilio'")):
+            provider = build_sms_provider("api.sms.TwilioSMSProvider")
+        self.assertIsInstance(provider, ConsoleSMSProvider)
+
+
+# --- Chat ---
+def parse_sse(raw):
+    """Splits an SSE body into (event, data) pairs."""
+    events = []
+    for block in raw.decode().strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def read_stream(response):
+    """(arrival time, chunk) for every chunk of an async StreamingHttpResponse."""
+    async def collect():
+        return [(time.monotonic(), chunk) async for chunk in response.streaming_content]
+    return async_to_sync(collect)()
+
+
+def stream_body(response):
+    return b"".join(chunk for _, chunk in read_stream(response))
+
+
+class ChatAPIViewTest(TestCase):
+    def setUp(self):
+        reset_llm_backend()
+        self.addCleanup(reset_llm_backend)
+        cache.clear()  # per-user chat throttle buckets
+        self.user = User.objects.create_user(username="dana", email="dana@example.com", password="pw")
+        self.character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, **extra):
+        payload = {"character_id": self.character.id, "message": "hi there", **extra.pop("data", {})}
+        return self.client.post(reverse("chat-submit"), payload, format="json", **extra)
+
+    def test_plain_reply(self):
+        response = self.submit()
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["character_name"], "Nova")
+        self.assertTrue(body["ai_response"]["content"].startswith("Hello dana, I am Nova."))
+        self.assertEqual(ChatMessage.objects.filter(sender=ChatMessage.SENDER_AI).count(), 1)
+
+    def test_streamed_reply_matches_plain_reply_and_is_saved_at_the_end(self):
+        plain = self.submit().json()["ai_response"]["content"]
+
+        response = self.submit(data={"session_id": ChatSession.objects.get().id, "stream": True})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        # Nothing is saved for the AI until the stream has been consumed
+        self.assertEqual(ChatMessage.objects.filter(sender=ChatMessage.SENDER_AI).count(), 1)
+
+        events = parse_sse(stream_body(response))
+        self.assertEqual(events[0][0], "start")
+        self.assertEqual(events[0][1]["session_id"], ChatSession.objects.get().id)
+        tokens = [data["token"] for event, data in events if event == "message"]
+        self.assertGreater(len(tokens), 5)
+        event, done = events[-1]
+        self.assertEqual(event, "done")
+        self.assertEqual("".join(tokens), done["ai_response"]["content"])
+        self.assertEqual(done["ai_response"]["content"], plain)
+        self.assertEqual(ChatMessage.objects.filter(sender=ChatMessage.SENDER_AI).count(), 2)
+
+    @override_settings(CHAT_LLM_BACKEND="api.llm.StubLLMBackend", CHAT_LLM_OPTIONS={"delay": 0.02})
+    def test_first_token_arrives_before_generation_finishes(self):
+        response = self.submit(HTTP_ACCEPT="text/event-stream")
+        started = time.monotonic()
+        arrivals = [arrived for arrived, _ in read_stream(response)]
+        first_token = arrivals[1] - started  # after the start event
+        total = arrivals[-1] - started
+
+        self.assertLess(first_token, total / 4)
+
+    @override_settings(CHAT_LLM_BACKEND="api.llm.StubLLMBackend", CHAT_LLM_OPTIONS={"delay": 0.02})
+    async def test_concurrent_turns_overlap_under_asgi(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        payload = {"character_id": self.character.id, "message": "hi there"}
+        client = AsyncClient()
+        started = time.monotonic()
+        responses = await asyncio.gather(*(
+            client.post(reverse("chat-submit"), payload, content_type="application/json", headers=auth)
+            for _ in range(5)
+        ))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+        # Each turn spends ~0.4s waiting on the backend; run one after another they'd take ~2s
+        self.assertLess(elapsed, 1.2)
+
+    def test_failed_stream_does_not_save_a_reply(self):
+        async def broken(self, **kwargs):
+            yield "Hel"
+            raise RuntimeError("model crashed")
+
+        with mock.patch.object(StubLLMBackend, "astream", broken):
+            response = self.submit(data={"stream": True})
+            events = parse_sse(stream_body(response))
+
+        self.assertEqual(events[-1][0], "error")
+        self.assertFalse(ChatMessage.objects.filter(sender=ChatMessage.SENDER_AI).exists())
+
+    def test_turn_fits_query_budget(self):
+        session_id = self.submit().json()["session_id"]
+        with CaptureQueriesContext(connection) as queries:
+            self.submit(data={"session_id": session_id})
+        # session+character, context window, savepoint, one INSERT for both messages,
+        # last_updated UPDATE, release
+        self.assertLessEqual(len(queries), 6, "\n".join(q["sql"] for q in queries.captured_queries))
+        inserts = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1 if connection.features.can_return_rows_from_bulk_insert else 2)
+
+    def test_turn_bumps_session_last_updated(self):
+        session = ChatSession.objects.get(id=self.submit().json()["session_id"])
+        ChatSession.objects.filter(id=session.id).update(last_updated=timezone.now() - timedelta(days=1))
+        self.submit(data={"session_id": session.id})
+        session.refresh_from_db()
+        self.assertGreater(session.last_updated, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(
+            list(session.messages.values_list("sender", flat=True)),
+            [ChatMessage.SENDER_USER, ChatMessage.SENDER_AI] * 2,
+        )
+
+    def test_turn_is_atomic(self):
+        with mock.patch("api.views.record_risk", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.submit()
+        self.assertFalse(ChatMessage.objects.exists())
+
+    def test_failed_stream_keeps_the_user_message(self):
+        async def broken(self, **kwargs):
+            raise RuntimeError("model crashed")
+            yield
+
+        with mock.patch.object(StubLLMBackend, "astream", broken):
+            response = self.submit(data={"stream": True, "message": "they want to kill me"})
+            events = parse_sse(stream_body(response))
+
+        self.assertEqual(events[-1][1]["safety_alert_id"], SafetyAlert.objects.get().id)
+        self.assertEqual(list(ChatMessage.objects.values_list("sender", "content")), [("user", "they want to kill me")])
+
+    def test_validation_errors_are_rendered_for_event_stream_clients(self):
+        response = self.client.post(reverse("chat-submit"), {}, format="json", HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(parse_sse(response.content)[0][0], "error")
+
+
+# --- Admission control ---
+class ChatThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username="finn", email="finn@example.com", password="pw")
+        self.character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self):
+        return self.client.post(reverse("chat-submit"), {"character_id": self.character.id, "message": "hi"}, format="json")
+
+    @override_settings(CHAT_USER_RATE_PER_MINUTE=6, CHAT_USER_BURST=2)
+    def test_bucket_allows_a_burst_then_refills_at_the_rate(self):
+        now = [1000.0]
+        with mock.patch.object(ChatUserThrottle, "timer", lambda self: now[0]):
+            self.assertEqual([self.submit().status_code for _ in range(3)], [200, 200, 429])
+            response = self.submit()
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response["Retry-After"], "10")  # one token per 10s
+
+            now[0] += 10
+            self.assertEqual([self.submit().status_code for _ in range(2)], [200, 429])
+
+        # Another user has their own bucket
+        other = User.objects.create_user(username="gail", email="gail@example.com", password="pw")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.submit().status_code, 200)
+
+    @override_settings(CHAT_MAX_IN_FLIGHT=0, CHAT_SHED_RETRY_AFTER=3)
+    def test_chat_is_shed_at_the_in_flight_limit_but_sos_is_not(self):
+        response = self.submit()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        self.assertFalse(ChatSession.objects.exists())
+
+        sos = self.client.post(reverse("sos-trigger"), {"user_id": self.user.id, "risk_level": "high"}, format="json")
+        self.assertEqual(sos.status_code, 200)
+
+    def test_streamed_turn_holds_its_slot_until_the_stream_ends(self):
+        limiter = get_limiter("chat-submit")
+        response = self.client.post(reverse("chat-submit"), {"character_id": self.character.id, "message": "hi",
+                                                             "stream": True}, format="json")
+        self.assertEqual(limiter.in_flight, 1)
+        stream_body(response)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+@override_settings(CHAT_MAX_IN_FLIGHT=4, CHAT_USER_BURST=1000, CHAT_LLM_BACKEND="api.llm.StubLLMBackend",
+                   CHAT_LLM_OPTIONS={"delay": 0.02})
+class SOSPriorityLaneTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reset_llm_backend()
+        self.addCleanup(reset_llm_backend)
+        self.user = User.objects.create_user(username="hana", email="hana@example.com", password="pw")
+        self.character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        TrustedContact.objects.create(user=self.user, name="Mom", email="mom@example.com")
+
+    async def test_sos_latency_stays_bounded_while_chat_is_flooded(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        client = AsyncClient()
+        auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        chat = {"character_id": self.character.id, "message": "hi"}
+        flood = [asyncio.create_task(client.post(reverse("chat-submit"), chat, content_type="application/json",
+                                                 headers=auth))
+                 for _ in range(50)]
+        await asyncio.sleep(0.1)  # the admitted turns are now generating (~0.4s each)
+
+        started = time.monotonic()
+        sos = await client.post(reverse("sos-trigger"), {"user_id": self.user.id, "risk_level": "high"},
+                                content_type="application/json", headers=auth)
+        sos_latency = time.monotonic() - started
+        statuses = [r.status_code for r in await asyncio.gather(*flood)]
+
+        self.assertEqual(sos.status_code, 200)
+        self.assertLess(sos_latency, 0.25)
+        self.assertEqual(statuses.count(200), 4)
+        self.assertEqual(statuses.count(429), 46)
+        self.assertEqual(get_limiter("chat-submit").in_flight, 0)
+
+
+# --- Risk scanning ---
+class RiskScannerTest(TestCase):
+    lexicon = {
+        "critical": {"weight": 1.0, "terms": ["kill*", "want to die"]},
+        "danger": {"weight": 0.8, "terms": ["follow*", "hurt"]},
+        "distress": {"weight": 0.4, "terms": ["sad"]},
+    }
+
+    def test_matches_words_and_stems_in_one_pass(self):
+        scan = RiskScanner(self.lexicon).scan("Someone FOLLOWED me home and said they'd kill... I'm so sad")
+        self.assertEqual(scan.terms, ["follow", "kill", "sad"])
+        self.assertEqual(scan.score, 1.0)
+        self.assertEqual(scan.level, SafetyAlert.ALERT_HIGH)
+
+    def test_ignores_terms_inside_other_words(self):
+        scan = RiskScanner(self.lexicon).scan("What a skill! He was unhurt and unfollowable")
+        self.assertEqual((scan.score, scan.matches), (0.0, []))
+
+    def test_terms_not_marked_as_stems_match_whole_words_only(self):
+        scanner = RiskScanner({"critical": {"weight": 1.0, "terms": ["die", "pain", "follow", "sad"]}})
+        for text in ("Day 3 of my diet", "I love painting", "thanks to all my followers", "a new saddle", "sadly not"):
+            self.assertEqual(scanner.scan(text).matches, [], text)
+        self.assertEqual(scanner.scan("the pain. I'm sad, follow me").terms, ["pain", "sad", "follow"])
+
+    def test_transition_memo_is_bounded_by_the_lexicon_alphabet(self):
+        scanner = RiskScanner(self.lexicon)
+        scanner.scan("kill the hurt, I want to die sad follow " * 3)
+        memoized = sum(map(len, scanner._delta))
+        text = "".join(chr(code) for code in range(0x4E00, 0x4E00 + 5000))
+        self.assertEqual(scanner.scan(f"{text} kill {text}").terms, ["kill"])
+        self.assertEqual(sum(map(len, scanner._delta)), memoized)
+
+    def test_multi_word_terms_tolerate_punctuation_and_spacing(self):
+        scan = RiskScanner(self.lexicon).scan("I just   want to,die")
+        self.assertEqual(scan.terms, ["want to die"])
+
+    def test_clean_message_scores_zero(self):
+        scan = RiskScanner(self.lexicon).scan("Tell me a story about dragons")
+        self.assertEqual((scan.score, scan.matches), (0.0, []))
+
+
+class RiskLexiconReloadTest(TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.write({"danger": {"weight": 0.8, "terms": ["stalk"]}})
+        overrides = override_settings(RISK_LEXICON_PATH=self.path, RISK_LEXICON_CHECK_INTERVAL=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reload_scanner()
+        self.addCleanup(reload_scanner)
+
+    def write(self, lexicon, mtime=None):
+        with open(self.path, "w") as f:
+            json.dump(lexicon, f)
+        if mtime:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_scanner_is_reused_until_the_lexicon_file_changes(self):
+        scanner = get_scanner()
+        self.assertIs(get_scanner(), scanner)
+        self.assertEqual(scanner.scan("a ghost").terms, [])
+
+        self.write({"danger": {"weight": 0.8, "terms": ["stalk", "ghost"]}}, mtime=time.time() + 10)
+        self.assertEqual(get_scanner().scan("a ghost").terms, ["ghost"])
+
+    def test_invalid_edit_keeps_the_previous_scanner(self):
+        scanner = get_scanner()
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        os.utime(self.path, (time.time() + 10, time.time() + 10))
+        self.assertIs(get_scanner(), scanner)
+
+
+class ChatRiskAlertTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="erin", email="erin@example.com", password="pw")
+        self.character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, message):
+        return self.client.post(reverse("chat-submit"), {"character_id": self.character.id, "message": message}, format="json")
+
+    def test_risky_message_creates_alert_linked_to_session_and_message(self):
+        body = self.submit("someone wants to kill me, I am scared").json()
+
+        alert = SafetyAlert.objects.get()
+        self.assertEqual(body["safety_alert_id"], alert.id)
+        self.assertEqual(body["risk_score"], 1.0)
+        self.assertEqual(alert.chat_session_id, body["session_id"])
+        self.assertEqual(alert.chat_message.content, "someone wants to kill me, I am scared")
+        self.assertEqual(alert.alert_level, SafetyAlert.ALERT_HIGH)
+        self.assertEqual(alert.trigger_keywords, "kill, scared")
+
+    def test_distress_message_creates_a_low_level_alert(self):
+        body = self.submit("feeling a bit tired today").json()
+        self.assertEqual(body["risk_score"], 0.4)
+        alert = SafetyAlert.objects.get(id=body["safety_alert_id"])
+        self.assertEqual((alert.alert_level, alert.trigger_keywords), (SafetyAlert.ALERT_LOW, "tired"))
+
+    def test_clean_message_does_not_alert(self):
+        body = self.submit("tell me about your day").json()
+        self.assertEqual(body["risk_score"], 0.0)
+        self.assertIsNone(body["safety_alert_id"])
+        self.assertFalse(SafetyAlert.objects.exists())
+
+
+class RescanRiskCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="finn", email="finn@example.com", password="pw")
+        character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.session = ChatSession.objects.create(user=self.user, character=character)
+        texts = ["hello there", "he said he would kill me", "I am so scared", "nice weather", "a gun in the car"]
+        self.messages = [ChatMessage.objects.create(session=self.session, content=text) for text in texts]
+        ChatMessage.objects.create(session=self.session, sender=ChatMessage.SENDER_AI, content="don't die on me")
+        handle, self.checkpoint = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        os.remove(self.checkpoint)
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+
+    def rescan(self, **options):
+        out = StringIO()
+        call_command("rescan_risk", checkpoint=self.checkpoint, chunk_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_creates_alerts_for_risky_user_messages_only(self):
+        self.rescan(workers=0)
+        alerts = SafetyAlert.objects.order_by("chat_message_id")
+        self.assertEqual(
+            [(a.chat_message_id, a.trigger_keywords, a.risk_score) for a in alerts],
+            [(self.messages[1].id, "kill", 1.0), (self.messages[2].id, "scared", 0.8), (self.messages[4].id, "gun", 1.0)],
+        )
+        self.assertTrue(all(a.chat_session_id == self.session.id and a.user_id == self.user.id for a in alerts))
+
+    def test_process_pool_matches_inline_scoring(self):
+        self.rescan(workers=2)
+        self.assertEqual(
+            sorted(SafetyAlert.objects.values_list("chat_message_id", flat=True)),
+            [self.messages[i].id for i in (1, 2, 4)],
+        )
+
+    def test_rescan_updates_existing_alerts_instead_of_duplicating(self):
+        stale = SafetyAlert.objects.create(user=self.user, chat_message=self.messages[1], trigger_keywords="old", risk_score=0.5)
+        self.rescan(workers=0, restart=True)
+        self.rescan(workers=0, restart=True)
+        stale.refresh_from_db()
+        self.assertEqual((stale.trigger_keywords, stale.risk_score, stale.alert_level), ("kill", 1.0, SafetyAlert.ALERT_HIGH))
+        self.assertEqual(SafetyAlert.objects.count(), 3)
+
+    def test_resumes_from_checkpoint_after_interruption(self):
+        real_commit = RescanRiskCommand._commit
+        calls = []
+
+        def commit_then_interrupt(command, results, meta):
+            real_commit(command, results, meta)
+            calls.append(meta)
+            if len(calls) == 1:
+                raise KeyboardInterrupt
+
+        with mock.patch.object(RescanRiskCommand, "_commit", commit_then_interrupt):
+            out = self.rescan(workers=0)
+        self.assertIn("Run again to resume", out)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["last_id"], self.messages[1].id)
+
+        with mock.patch.object(RescanRiskCommand, "_commit", commit_then_interrupt):
+            out = self.rescan(workers=0)
+        self.assertIn(f"Resuming after message {self.messages[1].id}", out)
+        self.assertEqual(calls[1], {m.id: (self.session.id, self.user.id) for m in self.messages[2:4]})
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        self.assertEqual((state["last_id"], state["processed"], state["complete"]), (self.messages[4].id, 5, True))
+        self.assertEqual(SafetyAlert.objects.count(), 3)
+
+    def test_lexicon_change_restarts_from_the_beginning(self):
+        self.rescan(workers=0)
+        handle, lexicon = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, "w") as f:
+            json.dump({"critical": {"weight": 1.0, "terms": ["weather"]}}, f)
+        self.addCleanup(os.remove, lexicon)
+        with override_settings(RISK_LEXICON_PATH=lexicon):
+            out = self.rescan(workers=0)
+        self.assertIn("rescanning from the first message", out)
+        self.assertTrue(SafetyAlert.objects.filter(chat_message=self.messages[3], trigger_keywords="weather").exists())
+
+
+    def test_threshold_change_restarts_from_the_beginning(self):
+        self.rescan(workers=0)
+        with override_settings(RISK_HIGH_THRESHOLD=0.9):
+            out = self.rescan(workers=0)
+        self.assertIn("rescanning from the first message", out)
+        self.assertEqual(SafetyAlert.objects.get(chat_message=self.messages[2]).alert_level, SafetyAlert.ALERT_LOW)
+
+class ChatHistoryPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="gwen", email="gwen@example.com", password="pw")
+        character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.session = ChatSession.objects.create(user=self.user, character=character)
+        ChatMessage.objects.bulk_create([ChatMessage(session=self.session, content=f"m{i}") for i in range(7)])
+        # Several messages share a timestamp so paging has to break ties on id
+        base = timezone.now()
+        for i, message in enumerate(ChatMessage.objects.order_by("id")):
+            ChatMessage.objects.filter(id=message.id).update(timestamp=base + timedelta(seconds=i // 3))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("chat-session-messages", args=[self.session.id])
+
+    def walk(self, url, link="next"):
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append([m["content"] for m in body["results"]])
+            url = body[link]
+        return pages
+
+    def test_newest_first_pages_cover_history_once(self):
+        pages = self.walk(f"{self.url}?page_size=3")
+        self.assertEqual(pages, [["m6", "m5", "m4"], ["m3", "m2", "m1"], ["m0"]])
+
+    def test_oldest_first_and_previous_links(self):
+        first = self.client.get(f"{self.url}?order=oldest&page_size=3").json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([m["content"] for m in second["results"]], ["m3", "m4", "m5"])
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual([m["content"] for m in back["results"]], ["m0", "m1", "m2"])
+        self.assertIsNone(back["previous"])
+        self.assertEqual(back["next"], first["next"])
+
+    def test_deep_page_is_a_single_bounded_query(self):
+        url = self.client.get(f"{self.url}?page_size=2").json()["next"]
+        url = self.client.get(url).json()["next"]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertIn("LIMIT 3", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_other_users_session_and_bad_cursor_are_404(self):
+        other = User.objects.create_user(username="hal", email="hal@example.com", password="pw")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(f"{self.url}?cursor=not-a-cursor").status_code, 404)
+
+
+class CharacterCatalogueCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        creators = [User.objects.create_user(username=f"maker{i}", email=f"maker{i}@example.com", password="pw") for i in range(3)]
+        self.characters = [
+            Character.objects.create(creator=creators[i % 3], name=f"c{i}", personality_prompt="p", fandom_score=i) for i in range(6)
+        ]
+        Character.objects.create(creator=creators[0], name="hidden", personality_prompt="p", is_public=False)
+        self.url = reverse("character-list-create")
+
+    def test_cold_list_is_one_query_and_warm_list_hits_cache(self):
+        with self.assertNumQueries(1):
+            first = self.client.get(self.url)
+        self.assertEqual([c["name"] for c in first.json()], ["c5", "c4", "c3", "c2", "c1", "c0"])
+        self.assertEqual(first.json()[0]["creator_username"], "maker2")
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertIn("Last-Modified", first)
+
+    def test_conditional_requests_get_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_page_rebuilt_under_the_same_version_gets_a_new_last_modified(self):
+        with mock.patch("api.catalogue.time.time", return_value=1_000_000):
+            first = self.client.get(self.url)
+        # Changed without signals, then the page expires and is rebuilt under the same version
+        Character.objects.filter(id=self.characters[0].id).update(fandom_score=100)
+        cache.delete(page_cache_key(get_catalogue_state()[0], ""))
+        with mock.patch("api.catalogue.time.time", return_value=1_000_060):
+            second = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second["Last-Modified"], http_date(1_000_060))
+
+    def test_character_save_and_delete_invalidate(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.characters[0].fandom_score = 100
+            self.characters[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["name"], "c0")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.characters[0].delete()
+        self.assertNotIn("c0", [c["name"] for c in self.client.get(self.url).json()])
+
+    def test_creator_rename_invalidates_but_login_does_not(self):
+        self.client.get(self.url)
+        creator = self.characters[0].creator
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            creator.save(update_fields=["last_login"])
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            creator.username = "renamed"
+            creator.save()
+        self.assertIn("renamed", [c["creator_username"] for c in self.client.get(self.url).json()])
+
+
+class CharacterSearchTest(TestCase):
+    def setUp(self):
+        self.creator = User.objects.create_user(username="ivy", email="ivy@example.com", password="pw")
+        make = lambda name, prompt, tags, **kw: Character.objects.create(
+            creator=self.creator, name=name, personality_prompt=prompt, tags=tags, **kw
+        )
+        self.dragon = make("Ember the Dragon", "A grumpy dragon who hoards books", ["Fantasy", "comedy"], fandom_score=5)
+        self.knight = make("Sir Cedric", "A brave knight sworn to slay the dragon", ["fantasy"], fandom_score=9)
+        self.pilot = make("Nova", "Starship pilot and reluctant knight", ["scifi"], fandom_score=7)
+        self.secret = make("Hidden Dragon", "dragon dragon dragon", ["fantasy"], is_public=False)
+        self.url = reverse("character-search")
+
+    def search(self, **params):
+        return self.client.get(self.url, params)
+
+    def test_text_query_is_ranked_by_matched_tokens_then_weight(self):
+        body = self.search(q="brave dragon knight").json()
+        self.assertEqual([c["name"] for c in body["results"]], ["Sir Cedric", "Ember the Dragon", "Nova"])
+        # Cedric matches all three tokens; Ember matches one, but in the name (weight 5 + 1 in the prompt)
+        self.assertEqual([c["score"] for c in body["results"]], [3.0, 6.0, 1.0])
+
+    def test_tags_are_and_combined_and_case_insensitive(self):
+        names = lambda response: [c["name"] for c in response.json()["results"]]
+        self.assertEqual(names(self.search(tag=["fantasy"])), ["Sir Cedric", "Ember the Dragon"])
+        self.assertEqual(names(self.search(tag=["FANTASY", "comedy"])), ["Ember the Dragon"])
+        self.assertEqual(names(self.search(q="dragon", tag=["comedy"])), ["Ember the Dragon"])
+        self.assertIsNone(self.search(tag=["scifi"]).json()["results"][0]["score"])
+
+    def test_private_characters_are_never_returned(self):
+        self.assertNotIn("Hidden Dragon", [c["name"] for c in self.search(q="hidden dragon").json()["results"]])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.pilot.name = "Nova the Dragon Tamer"
+        self.pilot.tags = ["scifi", "fantasy"]
+        self.pilot.save()
+        self.assertIn("Nova the Dragon Tamer", [c["name"] for c in self.search(q="tamer", tag=["fantasy"]).json()["results"]])
+        self.dragon.delete()
+        self.assertFalse(CharacterSearchToken.objects.filter(character_id=self.dragon.id).exists())
+
+    def test_requires_query_or_tag_and_bounds_limit(self):
+        self.assertEqual(self.search().status_code, 400)
+        self.assertEqual(self.search(q="dragon", limit=0).status_code, 400)
+        self.assertEqual(len(self.search(q="dragon knight", limit=1).json()["results"]), 1)
+
+    def test_reindex_command_covers_bulk_created_rows(self):
+        Character.objects.bulk_create([Character(creator=self.creator, name="Bulk Wizard", personality_prompt="spells")])
+        self.assertEqual(self.search(q="wizard").json()["results"], [])
+        call_command("reindex_characters", stdout=StringIO())
+        self.assertEqual([c["name"] for c in self.search(q="wizard").json()["results"]], ["Bulk Wizard"])
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_admin_search_matches_partial_names(self):
+        admin_user = User.objects.create_superuser(username="root", email="root@example.com", password="pw")
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse("admin:api_character_changelist"), {"q": "Emb"})
+        self.assertEqual([c.name for c in response.context["cl"].result_list], ["Ember the Dragon"])
+
+
+@override_settings(CHAT_CONTEXT_TOKEN_BUDGET=100, CHAT_SUMMARY_TOKEN_BUDGET=30, CHAT_CONTEXT_FETCH_SIZE=4)
+class ChatContextTest(TestCase):
+    # Each message below is 40 characters = 10 estimated tokens + 4 overhead, so 5 fit the 70-token window
+    def setUp(self):
+        self.user = User.objects.create_user(username="jo", email="jo@example.com", password="pw")
+        character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        self.session = ChatSession.objects.create(user=self.user, character=character)
+        self.backend = StubLLMBackend()
+
+    def add(self, count):
+        start = self.session.messages.count()
+        for i in range(start, start + count):
+            ChatMessage.objects.create(session=self.session, content=f"message {i:03d}".ljust(40, "."))
+
+    def contents(self, context):
+        return [m.content[:11] for m in context.messages]
+
+    def test_short_session_fits_without_summary(self):
+        self.add(3)
+        context = build_context(self.session, self.backend)
+        self.assertEqual(self.contents(context), ["message 000", "message 001", "message 002"])
+        self.assertEqual((context.summary, self.session.summary_through_id), ("", None))
+
+    def test_evicted_turns_are_folded_into_the_summary(self):
+        self.add(8)
+        context = build_context(self.session, self.backend)
+        self.assertEqual(self.contents(context), [f"message {i:03d}" for i in range(3, 8)])
+        self.session.refresh_from_db()
+        self.assertIn("message 002", self.session.summary)
+        self.assertEqual(self.session.summary_through_id, self.session.messages.order_by("id")[2].id)
+        self.assertEqual(context.summary, self.session.summary)
+
+    def test_summary_is_only_extended_with_newly_evicted_messages(self):
+        self.add(8)
+        build_context(self.session, self.backend)
+        self.add(1)
+        with mock.patch.object(self.backend, "summarize", wraps=self.backend.summarize) as summarize:
+            build_context(self.session, self.backend)
+            build_context(self.session, self.backend)  # nothing new fell out: no summarization
+        self.assertEqual(summarize.call_count, 1)
+        self.assertEqual([m.content[:11] for m in summarize.call_args.args[1]], ["message 003"])
+
+    def test_query_count_does_not_grow_with_session_length(self):
+        self.add(12)
+        build_context(self.session, self.backend)
+        self.add(1)
+        with CaptureQueriesContext(connection) as short:
+            build_context(self.session, self.backend)
+        self.add(60)
+        build_context(self.session, self.backend)
+        self.add(1)
+        with CaptureQueriesContext(connection) as long:
+            build_context(self.session, self.backend)
+        self.assertEqual(len(long), len(short))
+
+    def test_oversized_newest_message_is_still_sent(self):
+        ChatMessage.objects.create(session=self.session, content="x" * 1000)
+        self.assertEqual(len(build_context(self.session, self.backend).messages), 1)
+
+
+@override_settings(FANDOM_FLUSH_INTERVAL=0, LEADERBOARD_SIZE=3)
+class FandomCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username="kim", email="kim@example.com", password="pw")
+        self.characters = [
+            Character.objects.create(creator=self.user, name=f"c{i}", personality_prompt="p", fandom_score=10 * i)
+            for i in range(5)
+        ]
+        self.ids = [c.id for c in self.characters]
+
+    def scores(self):
+        return list(Character.objects.filter(id__in=self.ids).order_by("id").values_list("fandom_score", flat=True))
+
+    def test_concurrent_increments_and_flushes_lose_nothing(self):
+        buffer = CounterBuffer(interval=0, max_pending=10_000)
+
+        def like(worker):
+            for i in range(500):
+                buffer.incr(self.ids[(worker + i) % 3])
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(like, worker) for worker in range(8)]
+            while not all(f.done() for f in futures):
+                buffer.flush()
+        buffer.flush()
+
+        self.assertEqual(sum(self.scores()) - sum(10 * i for i in range(5)), 8 * 500)
+        self.assertEqual(buffer.pending(), {})
+
+    def test_flushes_from_separate_buffers_add_up(self):
+        # Two processes each apply their own deltas with F(); neither overwrites the other
+        first, second = CounterBuffer(interval=0), CounterBuffer(interval=0)
+        first.incr(self.ids[0], 3)
+        second.incr(self.ids[0], 4)
+        second.flush()
+        first.flush()
+        self.assertEqual(self.scores()[0], 7)
+
+    def test_failed_flush_keeps_increments(self):
+        buffer = CounterBuffer(interval=0)
+        buffer.incr(self.ids[1], 2)
+        with mock.patch("api.counters.transaction.atomic", side_effect=DatabaseError("locked")):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending(), {self.ids[1]: 2})
+        buffer.flush()
+        self.assertEqual(self.scores()[1], 12)
+
+    def test_flush_refreshes_the_leaderboard_but_keeps_catalogue_pages(self):
+        url = reverse("character-list-create")
+        page = self.client.get(url)
+        self.client.get(url, {"top": 1})
+        state = get_catalogue_state()
+        buffer = CounterBuffer(interval=0)
+        buffer.incr(self.ids[0], 100)
+        buffer.flush()
+
+        self.assertEqual(get_catalogue_state(), state)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=page["ETag"]).status_code, 304)
+            top = self.client.get(url, {"top": 1}).json()
+        self.assertEqual([(c["id"], c["fandom_score"]) for c in top], [(self.ids[0], 100)])
+
+    def test_leaderboard_failure_does_not_reach_incr(self):
+        buffer = CounterBuffer(interval=0, max_pending=1)
+        with mock.patch("api.counters.refresh_leaderboard", side_effect=ConnectionError("cache down")), \
+                self.assertLogs("api.counters", "ERROR"):
+            buffer.incr(self.ids[2], 4)
+        self.assertEqual(self.scores()[2], 24)
+        self.assertEqual(buffer.pending(), {})
+
+    def test_like_endpoint_and_leaderboard(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for _ in range(50):
+            self.assertEqual(client.post(reverse("character-like", args=[self.ids[0]])).status_code, 202)
+        self.assertEqual(client.post(reverse("character-like", args=[999999])).status_code, 404)
+        self.assertEqual(self.scores()[0], 0)  # still buffered
+
+        get_counter_buffer().flush()
+        url = reverse("character-list-create")
+        with self.assertNumQueries(0):
+            top = self.client.get(url, {"top": 2})
+        self.assertEqual([c["name"] for c in top.json()], ["c0", "c4"])
+        self.assertEqual(top.json()[0]["fandom_score"], 50)
+        self.assertEqual(len(self.client.get(url, {"top": 50}).json()), 3)
+        self.assertEqual(self.client.get(url, {"top": 2}, HTTP_IF_NONE_MATCH=top["ETag"]).status_code, 304)
+        self.assertEqual(self.client.get(url, {"top": "x"}).status_code, 400)
+
+
+@override_settings(GATEWAY_SERVICE_KEY="gateway-secret")
+class TokenRevocationsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="revoked", email="revoked@example.com", password="pw")
+        self.client = APIClient()
+        self.url = reverse("token-revocations")
+
+    def _get(self, **params):
+        return self.client.get(self.url, params, HTTP_X_GATEWAY_KEY="gateway-secret")
+
+    def test_requires_gateway_key(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_X_GATEWAY_KEY="wrong").status_code, 403)
+        with override_settings(GATEWAY_SERVICE_KEY=""):
+            self.assertEqual(self.client.get(self.url, HTTP_X_GATEWAY_KEY="").status_code, 403)
+
+    def test_lists_blacklisted_jtis_incrementally(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        first = self._get().json()
+        self.assertEqual((first["blacklisted"], first["user_changes"]), ([], []))
+
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        data = self._get(since=first["cursor"]).json()
+        self.assertEqual([entry["jti"] for entry in data["blacklisted"]], [token["jti"]])
+        self.assertEqual(data["blacklisted"][0]["exp"], token["exp"])
+        self.assertEqual(self._get(since=data["cursor"]).json()["blacklisted"], [])
+
+    def test_token_blacklisted_during_a_poll_is_returned_by_the_next(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+        from rest_framework_simplejwt.tokens import RefreshToken
+        RefreshToken.for_user(self.user).blacklist()
+        late = RefreshToken.for_user(self.user)
+        aggregate = BlacklistedToken.objects.aggregate
+
+        def read_head_then_commit_another(*args, **kwargs):
+            head = aggregate(*args, **kwargs)
+            late.blacklist()  # lands between the head read and the rows query
+            return head
+
+        with mock.patch.object(BlacklistedToken.objects, "aggregate", side_effect=read_head_then_commit_another):
+            first = self._get().json()
+        self.assertNotIn(late["jti"], [entry["jti"] for entry in first["blacklisted"]])
+        second = self._get(since=first["cursor"]).json()
+        self.assertEqual([entry["jti"] for entry in second["blacklisted"]], [late["jti"]])
+
+    def test_user_status_changes_are_a_feed(self):
+        users_cursor = self._get().json()["users_cursor"]
+        self.user.is_active = False
+        self.user.save()
+        self.user.save(update_fields=["last_login"])  # not a status change
+        data = self._get(users_since=users_cursor).json()
+        self.assertEqual(data["user_changes"], [{"id": self.user.id, "is_active": False}])
+
+        self.user.is_active = True
+        self.user.save()
+        later = self._get(users_since=data["users_cursor"]).json()
+        self.assertEqual(later["user_changes"], [{"id": self.user.id, "is_active": True}])
+        self.assertEqual(self._get(users_since=later["users_cursor"]).json()["user_changes"], [])
+
+    def test_users_created_inactive_are_in_the_feed(self):
+        inactive = User.objects.create_user(username="dormant", email="dormant@example.com", password="pw", is_active=False)
+        self.assertEqual(self._get().json()["user_changes"], [{"id": inactive.id, "is_active": False}])
+
+
+@override_settings(GATEWAY_SERVICE_KEY="gateway-secret")
+class BulkUsersTest(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"bulk{i}", email=f"bulk{i}@example.com", password="pw") for i in range(3)]
+        self.client = APIClient()
+        self.url = reverse("users-bulk")
+
+    def _get(self, ids):
+        return self.client.get(self.url, {"ids": ids}, HTTP_X_GATEWAY_KEY="gateway-secret")
+
+    def test_returns_public_profiles_in_one_query(self):
+        ids = ",".join(str(u.id) for u in reversed(self.users)) + ",999999"
+        with CaptureQueriesContext(connection) as queries:
+            r = self._get(ids)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["users"], [{"id": u.id, "username": u.username} for u in self.users])
+        self.assertEqual(len(queries), 1)
+
+    def test_rejects_bad_or_oversized_batches_and_other_callers(self):
+        self.assertEqual(self._get("1,x").status_code, 400)
+        self.assertEqual(self._get(",".join(str(i) for i in range(1, 202))).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"ids": "1"}).status_code, 403)
+
+
+# --- Metrics ---
+class HistogramTest(TestCase):
+    def test_percentiles_are_within_bucket_precision(self):
+        histogram = Histogram()
+        values = [i / 1e5 for i in range(1, 100001)]  # 10µs .. 1s
+        for v in values:
+            histogram.record(v)
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = values[round(q * len(values)) - 1]
+            self.assertAlmostEqual(histogram.percentile(q), exact, delta=exact / 32)
+        self.assertEqual(histogram.percentile(1.0), 1.0)
+        self.assertAlmostEqual(histogram.sum, sum(values))
+
+    def test_cumulative_counts_and_range(self):
+        histogram = Histogram(scale=1)
+        for v in (0, 1, 1, 5, 100, 10 ** 15):  # the last is clamped to the top bucket
+            histogram.record(v)
+        self.assertEqual(histogram.cumulative([0, 1, 4, 5, 99, 100]), [1, 3, 3, 4, 4, 5])
+        self.assertEqual(histogram.count, 6)
+
+
+def scrape(client, **headers):
+    """{sample line without value: value} from GET /metrics."""
+    response = client.get(reverse("metrics"), **headers)
+    samples = {}
+    for line in response.content.decode().splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return response, samples
+
+
+@override_settings(SMS_PROVIDER="api.sms.FakeSMSProvider")
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_sms_provider()
+        self.user = User.objects.create_user(username="ivy", email="ivy@example.com", password="pw")
+        self.character = Character.objects.create(creator=self.user, name="Nova", personality_prompt="kind")
+        TrustedContact.objects.create(user=self.user, name="Mom", email="mom@example.com", phone_number="+15550009")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_records_latency_status_and_queries_per_view(self):
+        _, before = scrape(self.client)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse("chat-submit"), {"character_id": self.character.id, "message": "hi"}, format="json")
+        query_count = len(queries)  # read before the next request resets the query log
+        response, after = scrape(self.client)
+
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        delta = lambda sample: after.get(sample, 0) - before.get(sample, 0)  # noqa: E731
+        self.assertEqual(delta('django_http_requests_total{view="chat-submit",method="POST",status="200"}'), 1)
+        self.assertEqual(delta('django_http_request_duration_seconds_count{view="chat-submit",method="POST"}'), 1)
+        self.assertEqual(delta('django_db_queries_per_request_sum{view="chat-submit"}'), query_count)
+        self.assertGreater(delta('django_db_query_duration_seconds_per_request_sum{view="chat-submit"}'), 0)
+        self.assertIn('django_http_request_duration_seconds_quantile{view="chat-submit",method="POST",quantile="0.99"}',
+                      after)
+        self.assertIn('django_admission_in_flight{route="chat-submit"}', after)
+
+    def test_records_notification_delivery_time(self):
+        _, before = scrape(self.client)
+        self.client.post(reverse("sos-trigger"), {"user_id": self.user.id, "risk_level": "high"}, format="json")
+        process_outbox()
+        _, after = scrape(self.client)
+
+        for channel in ("email", "sms"):
+            sample = f'sos_notification_delivery_seconds_count{{channel="{channel}",outcome="sent"}}'
+            self.assertEqual(after[sample] - before.get(sample, 0), 1)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(scrape(self.client)[0].status_code, 401)
+        self.assertEqual(scrape(self.client, HTTP_AUTHORIZATION="Bearer scrape-secret")[0].status_code, 200)
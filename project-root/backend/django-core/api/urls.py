@@ -3,18 +3,33 @@ from django.urls import path
 from .views import (
     CharacterListCreateView, 
     CharacterDetailView, 
+    CharacterSearchView,
+    CharacterLikeView,
     SOSTriggerView, 
-    ChatAPIView
+    SOSDeliveryStatusView,
+    ChatAPIView,
+    ChatSessionMessagesView,
+    TokenRevocationsView,
 )
+# users/urls.py is not mounted; its gateway view is routed here, under /api/v1/ with the others
+from users.views import BulkUsersView
 
 urlpatterns = [
     # Character Endpoints
     path('characters/', CharacterListCreateView.as_view(), name='character-list-create'),
     path('characters/<int:pk>/', CharacterDetailView.as_view(), name='character-detail'),
+    path('characters/search/', CharacterSearchView.as_view(), name='character-search'),
+    path('characters/<int:pk>/like/', CharacterLikeView.as_view(), name='character-like'),
     
     # SOS Endpoint
     path('sos/trigger/', SOSTriggerView.as_view(), name='sos-trigger'), 
+    path('sos/alerts/<int:pk>/deliveries/', SOSDeliveryStatusView.as_view(), name='sos-delivery-status'),
     
     # CHAT Endpoint
     path('chat/submit/', ChatAPIView.as_view(), name='chat-submit'), 
+    path('chat/sessions/<int:pk>/messages/', ChatSessionMessagesView.as_view(), name='chat-session-messages'),
+
+    # Gateway service Endpoints
+    path('auth/revocations/', TokenRevocationsView.as_view(), name='token-revocations'),
+    path('users/bulk/', BulkUsersView.as_view(), name='users-bulk'),
 ]
\ No newline at end of file
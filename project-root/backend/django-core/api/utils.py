@@ -1,56 +1,71 @@
 # api/utils.py
 
-import os
+import time
 import logging
-from django.core.mail import send_mail
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from threading import Lock
+from django.core.mail import EmailMessage
 from django.conf import settings
 from django.utils import timezone # Added import for timezone
+from .mail import send_batch as send_pooled_batch
+from .metrics import NOTIFICATION_LATENCY
+from .sms import get_sms_provider
 
 logger = logging.getLogger(__name__)
 
+CHANNEL_EMAIL = "email"
+CHANNEL_SMS = "sms"
+
+
+def _email_message(to_email, subject, body):
+    # Use settings.DEFAULT_FROM_EMAIL which is now configured for SMTP
+    return EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[to_email])
+
+
+def _deliver_email_batch(messages):
+    """Sends EmailMessages over one pooled SMTP connection; returns (latency_ms, error) per message."""
+    results = send_pooled_batch(messages)
+    for message, (_, error) in zip(messages, results):
+        if error:
+            logger.error(f"Failed to send SOS email to {message.to[0]}: {error}")
+        else:
+            logger.info(f"SOS Email sent successfully to {message.to[0]}")
+    return results
+
+
+def _deliver_email(to_email, subject, body):
+    """Sends a single email, raising on failure."""
+    [(_, error)] = _deliver_email_batch([_email_message(to_email, subject, body)])
+    if error:
+        raise RuntimeError(error)
+
+
 def send_email_notification(to_email, subject, body):
     """Sends a single email using Django's configured SMTP backend."""
     try:
-        # Use settings.DEFAULT_FROM_EMAIL which is now configured for SMTP
-        send_mail(
-            subject=subject,
-            message=body,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[to_email],
-            fail_silently=False # Ensure errors are propagated for debugging
-        )
-        logger.info(f"SOS Email sent successfully to {to_email}")
+        _deliver_email(to_email, subject, body)
         return True
     except Exception as e:
         logger.exception(f"Failed to send SOS email to {to_email}. Check SMTP configuration.", exc_info=e)
         return False
 
 
+def _deliver_sms(phone_number, message):
+    """Sends a single SMS through the process-wide SMS provider, raising on failure."""
+    get_sms_provider().send(phone_number, message)
+
+
 def send_sms_placeholder(phone_number, message):
     """
-    Placeholder SMS sender. Replaced with Twilio/Fast2SMS implementation in production.
+    Sends an SMS via the configured SMS_PROVIDER (Twilio in production, console log otherwise).
     """
-    TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID")
-    TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-    TWILIO_FROM = os.getenv("TWILIO_FROM")
-    
-    if TWILIO_SID and TWILIO_TOKEN and TWILIO_FROM:
-        try:
-            # Note: Ensure twilio is installed in your virtual environment
-            from twilio.rest import Client 
-            client = Client(TWILIO_SID, TWILIO_TOKEN)
-            client.messages.create(body=message, from_=TWILIO_FROM, to=phone_number)
-            logger.info(f"SMS sent via Twilio to {phone_number}")
-            return True
-        except ImportError:
-            logger.error("Twilio is configured but the library is not installed (pip install twilio).")
-        except Exception as e:
-            logger.exception("Twilio send error", exc_info=e)
-            return False
-
-    # Fallback: log to console if Twilio not configured or failed
-    logger.info(f"[SMS Placeholder] To: {phone_number} Msg: {message}")
-    return True
+    try:
+        _deliver_sms(phone_number, message)
+        return True
+    except Exception as e:
+        logger.exception("SMS send error", exc_info=e)
+        return False
 
 
 def send_push_placeholder(device_token, title, body):
@@ -60,34 +75,147 @@ def send_push_placeholder(device_token, title, body):
     logger.info(f"[PUSH Placeholder] token={device_token} title={title} body={body}")
 
 
-def notify_trusted_contacts(user, contacts, latitude=None, longitude=None, message=None):
-    """Coordinates sending notifications to all trusted contacts."""
+# --- SOS fan-out ---
+@dataclass
+class ChannelResult:
+    """Outcome of delivering one channel (email/SMS) to one contact."""
+    channel: str
+    recipient: str
+    success: bool = False
+    latency_ms: float = 0.0
+    error: str = ""
+
+
+@dataclass
+class ContactDeliveryReport:
+    """All channel outcomes for a single trusted contact."""
+    contact_id: int
+    name: str
+    channels: list = field(default_factory=list)
+
+    @property
+    def notified(self):
+        return any(c.success for c in self.channels)
+
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _get_executor():
+    """Returns the process-wide pool that bounds concurrent SOS deliveries."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SOS_NOTIFY_MAX_WORKERS,
+                thread_name_prefix="sos-notify",
+            )
+        return _executor
+
+
+def _timed_delivery(send, *args):
+    """Runs a raising sender and returns (latency_ms, error)."""
+    started = time.perf_counter()
+    try:
+        send(*args)
+        error = ""
+    except Exception as e:
+        logger.exception("SOS delivery failed", exc_info=e)
+        error = str(e) or e.__class__.__name__
+    return (time.perf_counter() - started) * 1000, error
+
+
+def build_sos_messages(user, latitude=None, longitude=None, message=None):
+    """Returns the (subject, email_body, sms_body) sent to trusted contacts."""
     subject = "🚨 URGENT: SOS Alert from Digital Safety App"
-    
-    # Corrected map URL construction 
+
+    # Corrected map URL construction
     map_link = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}"
     location_text = f"Location Link: {map_link}" if latitude and longitude else "Location not provided"
-    
+
     body = (
         f"The user, {user.username}, has triggered an SOS alert.\n\n"
         f"Timestamp: {timezone.now().strftime('%Y-%m-%d %H:%M:%S %Z')}\n"
         f"User Message: {message or 'No additional message provided.'}\n"
         f"{location_text}"
     )
-    
-    contacts_notified = 0
+    sms_body = f"SOS from {user.username}. Msg: {message or 'Alert'}. {location_text}"
+    return subject, body, sms_body
+
+
+def _timed_sms(phone_number, body):
+    return [_timed_delivery(_deliver_sms, phone_number, body)]
+
+
+def deliver_concurrently(deliveries):
+    """
+    Runs (ChannelResult, subject, body) deliveries on the shared pool, filling in each result.
 
-    # Send notifications in a loop
+    Emails are grouped into batches of SOS_EMAIL_BATCH_SIZE that each reuse one
+    warm SMTP connection; every SMS is its own task. A channel that does not
+    finish within its SOS_CHANNEL_TIMEOUTS entry is reported as failed, so the
+    caller never waits longer than the slowest channel timeout.
+    """
+    timeouts = settings.SOS_CHANNEL_TIMEOUTS
+    executor = _get_executor()
+    submitted_at = time.monotonic()
+
+    jobs = []  # ([ChannelResult, ...], future returning [(latency_ms, error), ...])
+    emails = [d for d in deliveries if d[0].channel == CHANNEL_EMAIL]
+    batch_size = settings.SOS_EMAIL_BATCH_SIZE
+    for start in range(0, len(emails), batch_size):
+        batch = emails[start:start + batch_size]
+        messages = [_email_message(result.recipient, subject, body) for result, subject, body in batch]
+        jobs.append(([result for result, _, _ in batch], executor.submit(_deliver_email_batch, messages)))
+    for result, subject, body in deliveries:
+        if result.channel == CHANNEL_SMS:
+            jobs.append(([result], executor.submit(_timed_sms, result.recipient, body)))
+        elif result.channel != CHANNEL_EMAIL:
+            result.error = f"Unknown notification channel: {result.channel}"
+
+    for results, future in jobs:
+        channel = results[0].channel
+        timeout = timeouts.get(channel, 10)
+        remaining = max(0.0, submitted_at + timeout - time.monotonic())
+        try:
+            outcomes = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            elapsed = (time.monotonic() - submitted_at) * 1000
+            outcomes = [(elapsed, f"Timed out after {timeout:g}s")] * len(results)
+            logger.warning(f"SOS {channel} delivery to {', '.join(r.recipient for r in results)} timed out")
+        for result, (latency_ms, error) in zip(results, outcomes):
+            result.latency_ms = round(latency_ms, 2)
+            result.error = error
+            result.success = not error
+            NOTIFICATION_LATENCY.observe(latency_ms / 1000, channel, "sent" if result.success else "failed")
+    return [result for result, _, _ in deliveries]
+
+
+def notify_trusted_contacts(user, contacts, latitude=None, longitude=None, message=None):
+    """
+    Fans the SOS out to every channel of every contact in parallel.
+
+    Returns one ContactDeliveryReport per contact with the outcome of each channel.
+    """
+    subject, body, sms_body = build_sos_messages(user, latitude, longitude, message)
+
+    reports = []
+    deliveries = []
     for c in contacts:
-        if c.email and send_email_notification(c.email, subject, body):
-            contacts_notified += 1
-        
-        sms_body = f"SOS from {user.username}. Msg: {message or 'Alert'}. {location_text}"
-        if c.phone_number: # No need for 'and send_sms_placeholder...' inside the loop control here
-            send_sms_placeholder(c.phone_number, sms_body)
+        report = ContactDeliveryReport(contact_id=c.id, name=c.name)
+        reports.append(report)
+        if c.email:
+            report.channels.append(ChannelResult(channel=CHANNEL_EMAIL, recipient=c.email))
+            deliveries.append((report.channels[-1], subject, body))
+        if c.phone_number:
+            report.channels.append(ChannelResult(channel=CHANNEL_SMS, recipient=c.phone_number))
+            deliveries.append((report.channels[-1], "", sms_body))
 
         # push: assumes TrustedContact may have a device token field; placeholder for now.
         # if c.device_token:
         #     send_push_placeholder(c.device_token, subject, message)
-            
-    return contacts_notified
\ No newline at end of file
+
+    deliver_concurrently(deliveries)
+    return reports
@@ -1,30 +1,85 @@
 # api/views.py
 
+import asyncio
+import json
+import logging
+from asgiref.sync import sync_to_async
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.settings import api_settings
 from django.shortcuts import get_object_or_404
+from django.db import connection, transaction
+from django.db.models import Max
+from django.http import Http404, StreamingHttpResponse
 from django.conf import settings
-from .models import Character, ChatSession, ChatMessage, TrustedContact, SafetyAlert
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+from .models import Character, ChatSession, ChatMessage, TrustedContact, SafetyAlert, NotificationOutbox, UserStatusChange
 from users.models import User as UserProfile
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_to_epoch
 from .serializers import (
     CharacterSerializer, 
+    CharacterSearchSerializer,
+    CharacterSearchResultSerializer,
     ChatRequestSerializer, 
     ChatMessageSerializer, 
     SOSRequestSerializer, 
-    SOSResponseSerializer
+    SOSResponseSerializer,
+    NotificationOutboxSerializer,
 )
-# --- IMPORT THE HELPER FUNCTION FROM UTILS ---
-from .utils import notify_trusted_contacts as send_sos_notifications 
+# --- IMPORT THE OUTBOX HELPER (delivery happens in `manage.py deliver_notifications`) ---
+from .outbox import enqueue_sos_notifications
+from .llm import get_llm_backend
+from .context import build_context
+from .renderers import EventStreamRenderer
+from .async_views import AsyncAPIView
+from .admission import ChatUserThrottle
+from .pagination import KeysetPagination
+from .permissions import IsGatewayService
+from .catalogue import get_catalogue_page, get_leaderboard
+from .counters import record_like
+from .search import search_characters
+from .risk import get_scanner, record_risk
+
+logger = logging.getLogger(__name__)
 
 
 # --- 1. Character Views ---
 class CharacterListCreateView(generics.ListCreateAPIView):
-    """GET: List all public characters. POST: Create a new character (requires authentication)."""
-    queryset = Character.objects.filter(is_public=True).order_by('-fandom_score', 'name')
+    """
+    GET: List all public characters. POST: Create a new character (requires authentication).
+
+    GET pages are served from the catalogue cache (api/catalogue.py) with a strong
+    ETag and Last-Modified, so revalidating clients and CDNs get 304s.
+    `?top=N` serves the first N entries of the precomputed leaderboard instead.
+    """
+    queryset = Character.objects.filter(is_public=True).select_related('creator').order_by('-fandom_score', 'name')
     serializer_class = CharacterSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] 
+
+    def list(self, request, *args, **kwargs):
+        if 'top' in request.query_params:
+            try:
+                top = int(request.query_params['top'])
+            except ValueError:
+                return Response({"top": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+            data, etag, last_modified = get_leaderboard(max(1, min(top, settings.LEADERBOARD_SIZE)))
+        else:
+            page_key = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.lists()))
+            parent_list = super().list
+            data, etag, last_modified = get_catalogue_page(page_key, lambda: parent_list(request, *args, **kwargs).data)
+
+        response = get_conditional_response(request._request, etag=quote_etag(etag), last_modified=last_modified)
+        if response is None:
+            response = Response(data)
+        response["ETag"] = quote_etag(etag)
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=settings.CHARACTER_CATALOGUE_MAX_AGE, must_revalidate=True)
+        return response
     
     def perform_create(self, serializer):
         serializer.save(creator=self.request.user)
@@ -32,63 +87,163 @@ class CharacterListCreateView(generics.ListCreateAPIView):
 
 class CharacterDetailView(generics.RetrieveUpdateDestroyAPIView):
     """GET/PUT/PATCH/DELETE: Single character management."""
-    queryset = Character.objects.all()
+    queryset = Character.objects.select_related('creator')
     serializer_class = CharacterSerializer
     permission_classes = [IsAuthenticatedOrReadOnly] 
 
 
-# --- 2. SOS View ---
-class SOSTriggerView(APIView):
-    """Endpoint to trigger an SOS alert, save the alert, and notify trusted contacts."""
+class CharacterLikeView(APIView):
+    """POST: Like a public character. Counted in the process's fandom_score buffer (api/counters.py)."""
     permission_classes = [IsAuthenticated]
-    
-    def post(self, request, *args, **kwargs):
-        serializer = SOSRequestSerializer(data=request.data)
+
+    def post(self, request, pk, *args, **kwargs):
+        if not Character.objects.filter(id=pk, is_public=True).exists():
+            return Response({"detail": "Character not found."}, status=status.HTTP_404_NOT_FOUND)
+        record_like(pk)
+        return Response({"character_id": pk, "liked": True}, status=status.HTTP_202_ACCEPTED)
+
+
+class CharacterSearchView(APIView):
+    """GET ?q=<text>&tag=<tag>&tag=<tag>&limit=20: ranked search over public characters (tags are AND-ed)."""
+
+    def get(self, request, *args, **kwargs):
+        params = {"q": request.query_params.get("q", ""), "tag": request.query_params.getlist("tag")}
+        if "limit" in request.query_params:
+            params["limit"] = request.query_params["limit"]
+        serializer = CharacterSearchSerializer(data=params)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
+
         data = serializer.validated_data
-        
-        try:
-            user = UserProfile.objects.get(id=data['user_id']) 
-        except UserProfile.DoesNotExist:
-            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
-            
+        results = search_characters(data["q"], data["tag"], data["limit"])
+        return Response({"results": CharacterSearchResultSerializer(results, many=True).data})
+
+
+# --- 2. SOS View ---
+def _record_sos(user, data):
+    """Creates the SafetyAlert and queues its notifications in one transaction; the worker sends them."""
+    contacts = TrustedContact.objects.filter(user=user, sos_enabled=True)
+    location = data.get('location', {})
+    with transaction.atomic():
         alert = SafetyAlert.objects.create(
             user=user,
             alert_level=data['risk_level'],
-            risk_score=1.0, 
+            risk_score=1.0,
             trigger_keywords=f"SOS Initiated. Source: {data.get('source_character', 'Unknown')}",
             is_resolved=False
         )
-        
-        contacts = TrustedContact.objects.filter(user=user, sos_enabled=True)
-        
-        # Calling the function imported from utils.py
-        contacts_notified = send_sos_notifications(
-            user=user, 
-            contacts=contacts, 
-            latitude=data.get('location', {}).get('latitude'),
-            longitude=data.get('location', {}).get('longitude'),
+        queued = enqueue_sos_notifications(
+            alert=alert,
+            user=user,
+            contacts=contacts,
+            latitude=location.get('latitude'),
+            longitude=location.get('longitude'),
             message=data.get('message')
         )
-            
-        response_serializer = SOSResponseSerializer(data={
+    return alert, queued
+
+
+class SOSTriggerView(AsyncAPIView):
+    """Endpoint to trigger an SOS alert, save the alert, and notify trusted contacts."""
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request, *args, **kwargs):
+        serializer = SOSRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+
+        try:
+            user = await UserProfile.objects.aget(id=data['user_id'])
+        except UserProfile.DoesNotExist:
+            return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        alert, queued = await sync_to_async(_record_sos)(user, data)
+        contacts_notified = len({n.contact_id for n in queued})
+
+        response_serializer = SOSResponseSerializer({
             "success": True,
             "alert_id": alert.id,
             "contacts_notified": contacts_notified,
-            "message": f"Alert saved. {contacts_notified} contacts notified successfully.",
+            "message": f"Alert saved. {contacts_notified} contacts are being notified.",
+            "deliveries": queued,
         })
-        response_serializer.is_valid(raise_exception=True)
         return Response(response_serializer.data, status=status.HTTP_200_OK)
 
 
-# --- 3. Chat View ---
-class ChatAPIView(APIView):
-    """Handles user message submission, LLM interaction, and chat history management."""
+class SOSDeliveryStatusView(generics.ListAPIView):
+    """GET: Delivery status of every notification queued for one of the user's alerts."""
+    serializer_class = NotificationOutboxSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        alert = get_object_or_404(SafetyAlert, id=self.kwargs['pk'], user=self.request.user)
+        return NotificationOutbox.objects.filter(alert=alert).select_related('contact')
+
+
+# --- 3. Chat Views ---
+class ChatSessionMessagesView(generics.ListAPIView):
+    """GET: One of the user's chat sessions, keyset-paginated (?order=newest|oldest&cursor=...)."""
+    serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        session = get_object_or_404(ChatSession, id=self.kwargs['pk'], user=self.request.user)
+        return ChatMessage.objects.filter(session=session)
 
-    def post(self, request, *args, **kwargs):
+
+def _sse(data, event=None):
+    """Formats one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _save_turn(user, session, user_message, reply, scan):
+    """
+    Persists one chat turn in a single transaction: the user message and the AI
+    reply (None if generation failed) in one bulk INSERT, the SafetyAlert if the
+    message is risky, and the session's last_updated bump.
+
+    Returns (ai_message, alert).
+    """
+    messages = [user_message]
+    if reply is not None:
+        messages.append(ChatMessage(session=session, sender=ChatMessage.SENDER_AI, content=reply))
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            ChatMessage.objects.bulk_create(messages)
+        else:
+            # Without INSERT ... RETURNING (MySQL) bulk_create leaves ids unset; the alert and response need them
+            for message in messages:
+                message.save(force_insert=True)
+        _, alert = record_risk(user, session, user_message, scan=scan)
+        ChatSession.objects.filter(id=session.id).update(last_updated=timezone.now())
+    return (messages[1] if reply is not None else None), alert
+
+
+class ChatAPIView(AsyncAPIView):
+    """
+    Handles user message submission, LLM interaction, and chat history management.
+
+    The reply is generated first and the whole turn is then written in one
+    transaction (see _save_turn). Send `"stream": true` (or `Accept:
+    text/event-stream`) to receive the reply as server-sent events while the
+    backend generates it; the turn is saved once the stream completes.
+
+    The view is async: under ASGI a turn that is waiting on the model holds no
+    worker thread, and the risk scan runs alongside the context read.
+
+    Turns are rate-limited per user (ChatUserThrottle) and shed once too many
+    are in flight (api/admission.py); SOS is exempt from both.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ChatUserThrottle]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+
+    async def post(self, request, *args, **kwargs):
         serializer = ChatRequestSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -99,30 +254,116 @@ class ChatAPIView(APIView):
         session_id = data.get('session_id')
         character_id = data['character_id']
         
-        if session_id:
-            session = get_object_or_404(ChatSession, id=session_id, user=user)
-            character = session.character
-        else:
-            character = get_object_or_404(Character, id=character_id)
-            session = ChatSession.objects.create(user=user, character=character)
+        try:
+            if session_id:
+                session = await ChatSession.objects.select_related('character').aget(id=session_id, user=user)
+                character = session.character
+            else:
+                character = await Character.objects.aget(id=character_id)
+                session = await ChatSession.objects.acreate(user=user, character=character)
+        except (ChatSession.DoesNotExist, Character.DoesNotExist):
+            raise Http404
             
-        ChatMessage.objects.create(
-            session=session,
-            sender=ChatMessage.SENDER_USER,
-            content=data['message']
-        )
-        
-        # --- LLM PLACEHOLDER ---
-        ai_response = f"Hello {user.username}, I am {character.name}. Thank you for your message in session {session.id}. (LLM integration pending)"
-        
-        ai_message = ChatMessage.objects.create(
-            session=session,
-            sender=ChatMessage.SENDER_AI,
-            content=ai_response
+        user_message = ChatMessage(session=session, sender=ChatMessage.SENDER_USER, content=data['message'])
+        backend = get_llm_backend()
+        scan, context = await asyncio.gather(
+            sync_to_async(get_scanner().scan, thread_sensitive=False)(user_message.content),
+            sync_to_async(build_context)(session, backend, pending=[user_message]),
         )
+        llm_kwargs = dict(user=user, character=character, session=session, message=data['message'], context=context)
+
+        if data['stream'] or 'text/event-stream' in request.headers.get('Accept', ''):
+            response = StreamingHttpResponse(
+                self._stream_reply(backend, llm_kwargs, user, session, character, user_message, scan),
+                content_type='text/event-stream',
+            )
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+            return response
+
+        try:
+            reply = await backend.acomplete(**llm_kwargs)
+        except Exception:
+            await sync_to_async(_save_turn)(user, session, user_message, None, scan)  # keep the user's message (and any alert)
+            raise
+        ai_message, alert = await sync_to_async(_save_turn)(user, session, user_message, reply, scan)
         
         return Response({
             'session_id': session.id,
             'character_name': character.name,
             'ai_response': ChatMessageSerializer(ai_message).data,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            'risk_score': scan.score,
+            'safety_alert_id': alert.id if alert else None,
+        }, status=status.HTTP_200_OK)
+
+    async def _stream_reply(self, backend, llm_kwargs, user, session, character, user_message, scan):
+        chunks = []
+        try:
+            yield _sse({'session_id': session.id, 'character_name': character.name, 'risk_score': scan.score}, event='start')
+            async for chunk in backend.astream(**llm_kwargs):
+                chunks.append(chunk)
+                yield _sse({'token': chunk})
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client disconnected mid-reply: still record what the user said
+            await asyncio.shield(sync_to_async(_save_turn)(user, session, user_message, None, scan))
+            raise
+        except Exception:
+            logger.exception(f"LLM stream failed for session {session.id}")
+            _, alert = await sync_to_async(_save_turn)(user, session, user_message, None, scan)
+            yield _sse({
+                'detail': 'The reply could not be completed.',
+                'safety_alert_id': alert.id if alert else None,
+            }, event='error')
+            return
+
+        ai_message, alert = await sync_to_async(_save_turn)(user, session, user_message, "".join(chunks), scan)
+        yield _sse({
+            'session_id': session.id,
+            'character_name': character.name,
+            'ai_response': ChatMessageSerializer(ai_message).data,
+            'safety_alert_id': alert.id if alert else None,
+        }, event='done')
+
+
+# --- 4. Gateway Views ---
+class TokenRevocationsView(APIView):
+    """
+    GET ?since=<cursor>&users_since=<cursor>: what the gateway needs to reject revoked JWTs locally.
+
+    Returns the blacklisted token jtis (with their expiry) added after `since`,
+    and the changes of users' is_active after `users_since` (JWTAuthentication
+    rejects inactive users' tokens), each with its new cursor. Each feed's
+    high-water mark is read once and the rows are bounded by it, so a row
+    committed meanwhile is left for the next poll rather than skipped. The
+    gateway polls this periodically instead of asking per request.
+    """
+    authentication_classes = []
+    permission_classes = [IsGatewayService]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.query_params.get('since', 0))
+            users_since = int(request.query_params.get('users_since', 0))
+        except ValueError:
+            return Response({"since": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = BlacklistedToken.objects.aggregate(head=Max('id'))['head'] or 0
+        # SimpleJWT stores expiries as UTC (naive when USE_TZ is off); compare and convert with its helpers.
+        # Expired entries are skipped but still advance the cursor.
+        rows = list(
+            BlacklistedToken.objects.filter(id__gt=since, id__lte=cursor, token__expires_at__gt=aware_utcnow())
+            .order_by('id').values_list('token__jti', 'token__expires_at')
+        ) if cursor > since else []
+
+        users_cursor = UserStatusChange.objects.aggregate(head=Max('id'))['head'] or 0
+        changes = list(
+            UserStatusChange.objects.filter(id__gt=users_since, id__lte=users_cursor)
+            .order_by('id').values('user_id', 'is_active')
+        ) if users_cursor > users_since else []
+
+        return Response({
+            'cursor': max(cursor, since),
+            'blacklisted': [{'jti': jti, 'exp': datetime_to_epoch(expires_at)} for jti, expires_at in rows],
+            'users_cursor': max(users_cursor, users_since),
+            'user_changes': [{'id': c['user_id'], 'is_active': c['is_active']} for c in changes],
+        })
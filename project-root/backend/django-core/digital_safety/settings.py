@@ -49,12 +49,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Per-view latency and SQL metrics for /metrics (first, so it times the whole stack)
+    "api.metrics.MetricsMiddleware",
     # Security and WhiteNoise (must be near the top)
     "django.middleware.security.SecurityMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware', # ADDED FOR PRODUCTION STATIC FILES
+    'digital_safety.middleware.WhiteNoiseMiddleware', # ADDED FOR PRODUCTION STATIC FILES (async-capable wrapper)
     
     # Other middleware
     "corsheaders.middleware.CorsMiddleware",
+    # Sheds excess chat turns before they take a worker (after CORS so the 429 is readable)
+    "api.admission.AdmissionControlMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -90,11 +94,20 @@ DATABASES = {
 # If DATABASE_URL is found (set by Railway), override the default MySQL settings.
 if os.environ.get('DATABASE_URL'):
     DATABASES['default'] = dj_database_url.config(
-        conn_max_age=600, 
+        # 0 under ASGI (see Dockerfile): connections are not reused across async requests
+        conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', 600)), 
         conn_health_checks=True,
     )
     # Ensure DEBUG is False in production, regardless of what the .env file says
     DEBUG = False
+
+# C. Test Database Override
+# `manage.py test` runs against SQLite so the suite needs no MySQL server.
+elif 'test' in sys.argv:
+    DATABASES['default'] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "test_db.sqlite3",
+    }
     
 # =======================================================
 # 5. TEMPLATES
@@ -160,6 +173,11 @@ EMAIL_USE_SSL = True  # SSL enabled for Port 465
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER) 
+# Socket timeout (seconds) so a stalled SMTP server can't hang a worker thread forever
+EMAIL_TIMEOUT = float(os.environ.get('EMAIL_TIMEOUT', 10))
+# Warm SMTP connections kept between alerts (api/mail.py); each one skips the TLS handshake + AUTH
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 2))
+SMTP_POOL_IDLE_TIMEOUT = float(os.environ.get('SMTP_POOL_IDLE_TIMEOUT', 30))
 
 # Fallback check and DEBUG prints (Only run if the server starts)
 if DEBUG and 'runserver' in sys.argv:
@@ -168,4 +186,104 @@ if DEBUG and 'runserver' in sys.argv:
         print("FATAL DEBUG: EMAIL CREDENTIALS ARE EMPTY! Check .env file.")
     else:
         print(f"DEBUG: Email Host User: {EMAIL_HOST_USER}")
-        print(f"DEBUG: Using SSL on Port: {EMAIL_PORT}")
\ No newline at end of file
+        print(f"DEBUG: Using SSL on Port: {EMAIL_PORT}")
+
+
+# =======================================================
+# 9. SOS NOTIFICATIONS
+# =======================================================
+# Size of the shared thread pool that fans SOS alerts out to every contact/channel
+SOS_NOTIFY_MAX_WORKERS = int(os.environ.get('SOS_NOTIFY_MAX_WORKERS', 16))
+# Emails of one alert sent over the same SMTP connection (larger fan-outs use several)
+SOS_EMAIL_BATCH_SIZE = int(os.environ.get('SOS_EMAIL_BATCH_SIZE', 20))
+# Per-channel delivery timeouts (seconds); a slower channel is reported as timed out
+SOS_CHANNEL_TIMEOUTS = {
+    "email": float(os.environ.get('SOS_EMAIL_TIMEOUT', 15)),
+    "sms": float(os.environ.get('SOS_SMS_TIMEOUT', 10)),
+}
+# Outbox worker (`manage.py deliver_notifications`): retries with exponential backoff
+SOS_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('SOS_OUTBOX_MAX_ATTEMPTS', 5))
+SOS_OUTBOX_BACKOFF_BASE = float(os.environ.get('SOS_OUTBOX_BACKOFF_BASE', 2))
+SOS_OUTBOX_BACKOFF_MAX = float(os.environ.get('SOS_OUTBOX_BACKOFF_MAX', 300))
+# How long a claimed row stays reserved before another worker may retry it
+SOS_OUTBOX_LEASE_SECONDS = int(os.environ.get('SOS_OUTBOX_LEASE_SECONDS', 60))
+
+# SMS provider (api/sms.py): one client per process with a pooled, keep-alive HTTP session
+_TWILIO_CONFIGURED = all(os.environ.get(k) for k in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_FROM'))
+SMS_PROVIDER = os.environ.get(
+    'SMS_PROVIDER',
+    'api.sms.TwilioSMSProvider' if _TWILIO_CONFIGURED else 'api.sms.ConsoleSMSProvider',
+)
+SMS_PROVIDER_OPTIONS = {}
+SMS_MAX_CONCURRENCY = int(os.environ.get('SMS_MAX_CONCURRENCY', 8))
+SMS_SEND_TIMEOUT = float(os.environ.get('SMS_SEND_TIMEOUT', 8))
+
+
+# =======================================================
+# 10. CHAT / LLM
+# =======================================================
+# Backend that generates character replies (api/llm.py); the stub is deterministic and local
+CHAT_LLM_BACKEND = os.environ.get('CHAT_LLM_BACKEND', 'api.llm.StubLLMBackend')
+CHAT_LLM_OPTIONS = {}
+# Conversation context sent with each turn (api/context.py): newest messages within the budget,
+# older turns folded into a per-session summary of at most CHAT_SUMMARY_TOKEN_BUDGET tokens
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('CHAT_CONTEXT_TOKEN_BUDGET', 3000))
+CHAT_SUMMARY_TOKEN_BUDGET = int(os.environ.get('CHAT_SUMMARY_TOKEN_BUDGET', 500))
+CHAT_CONTEXT_FETCH_SIZE = int(os.environ.get('CHAT_CONTEXT_FETCH_SIZE', 50))
+
+# Admission control (api/admission.py). Each user may start CHAT_USER_BURST turns at once,
+# refilled at CHAT_USER_RATE_PER_MINUTE (0 disables the per-user limit).
+CHAT_USER_RATE_PER_MINUTE = float(os.environ.get('CHAT_USER_RATE_PER_MINUTE', 30))
+CHAT_USER_BURST = int(os.environ.get('CHAT_USER_BURST', 10))
+# Chat turns in flight per process; keep it below the process's capacity so SOS always has room
+CHAT_MAX_IN_FLIGHT = int(os.environ.get('CHAT_MAX_IN_FLIGHT', 64))
+# Retry-After (seconds) sent with a chat turn shed because CHAT_MAX_IN_FLIGHT was reached
+CHAT_SHED_RETRY_AFTER = int(os.environ.get('CHAT_SHED_RETRY_AFTER', 2))
+
+# Chat risk scanning (api/risk.py). The lexicon is re-read when the file changes.
+RISK_LEXICON_PATH = os.environ.get('RISK_LEXICON_PATH', str(BASE_DIR / "api" / "risk_lexicon.json"))
+RISK_LEXICON_CHECK_INTERVAL = float(os.environ.get('RISK_LEXICON_CHECK_INTERVAL', 5))
+# Messages scoring at/above this create a SafetyAlert; at/above RISK_HIGH_THRESHOLD it is "high".
+# With the shipped lexicon, distress terms (0.4) raise low alerts and danger/critical ones (0.8+) high alerts.
+RISK_ALERT_THRESHOLD = float(os.environ.get('RISK_ALERT_THRESHOLD', 0.4))
+RISK_HIGH_THRESHOLD = float(os.environ.get('RISK_HIGH_THRESHOLD', 0.8))
+
+
+# =======================================================
+# 11. CACHING
+# =======================================================
+# Shared Redis cache when REDIS_URL is set; otherwise (development, tests) a per-process local-memory cache
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "digital-safety"}}
+
+# Public character catalogue (api/catalogue.py): cached pages live this long unless a Character change bumps them first
+CHARACTER_CATALOGUE_TTL = int(os.environ.get('CHARACTER_CATALOGUE_TTL', 300))
+# Cache-Control max-age for clients/CDNs; 0 means they always revalidate (cheap 304s via ETag)
+CHARACTER_CATALOGUE_MAX_AGE = int(os.environ.get('CHARACTER_CATALOGUE_MAX_AGE', 0))
+
+# fandom_score counters (api/counters.py): increments are buffered per process and flushed
+# every FANDOM_FLUSH_INTERVAL seconds (0 disables the background flusher) or once
+# FANDOM_FLUSH_MAX_PENDING characters have pending increments
+FANDOM_FLUSH_INTERVAL = float(os.environ.get('FANDOM_FLUSH_INTERVAL', 5))
+FANDOM_FLUSH_MAX_PENDING = int(os.environ.get('FANDOM_FLUSH_MAX_PENDING', 1000))
+# Size of the precomputed top-characters leaderboard served by GET characters/?top=N
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', 100))
+
+
+# =======================================================
+# 12. API GATEWAY
+# =======================================================
+# Shared secret the FastAPI gateway sends as X-Gateway-Key on service calls
+# (e.g. syncing token revocations). Unset disables those endpoints.
+GATEWAY_SERVICE_KEY = os.environ.get('GATEWAY_SERVICE_KEY', '')
+
+
+# =======================================================
+# 13. METRICS
+# =======================================================
+# GET /metrics serves Prometheus text (api/metrics.py); when set, scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
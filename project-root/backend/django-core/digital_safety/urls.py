@@ -8,6 +8,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.views import TokenBlacklistView # <-- IMPORTED FOR LOGOUT
 # -----------------------------------------------------------------
 from django.http import JsonResponse
+from api.metrics import metrics_view
 
 # --- 1. DRF Router Setup ---
 router = routers.DefaultRouter()
@@ -27,6 +28,9 @@ urlpatterns = [
 
     # Root Path
     path("", home, name="home"),
+
+    # Prometheus scrape endpoint
+    path("metrics", metrics_view, name="metrics"),
     
     # JWT Authentication Endpoints
     path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
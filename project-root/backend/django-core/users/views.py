@@ -1,10 +1,12 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from .models import TrustedContact
+from api.permissions import IsGatewayService
 
 class RegisterView(APIView):
     def post(self, request):
@@ -47,4 +49,24 @@ class AddTrustedContactView(APIView):
 
         TrustedContact.objects.create(user=user, name=name, phone=phone)
 
-        return Response({"message": "Trusted contact added"}, status=201)
\ No newline at end of file
+        return Response({"message": "Trusted contact added"}, status=201)
+
+
+class BulkUsersView(APIView):
+    """
+    GET ?ids=1,2,3: public profiles (id, username) of up to MAX_IDS users in one query,
+    for the gateway's batched UsersClient. Unknown ids are left out.
+    """
+    MAX_IDS = 200
+    authentication_classes = []
+    permission_classes = [IsGatewayService]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            ids = list(dict.fromkeys(int(i) for i in request.query_params.get('ids', '').split(',') if i))
+        except ValueError:
+            return Response({"ids": ["A comma-separated list of integers is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.MAX_IDS:
+            return Response({"ids": [f"At most {self.MAX_IDS} ids per request."]}, status=status.HTTP_400_BAD_REQUEST)
+        users = get_user_model().objects.filter(id__in=ids).order_by('id').values('id', 'username')
+        return Response({'users': list(users)})
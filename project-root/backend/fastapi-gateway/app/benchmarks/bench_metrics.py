@@ -0,0 +1,73 @@
+"""
+Per-request cost of the gateway's metrics: requests through main.app with and
+without MetricsMiddleware (and upstream latency recording), plus one /metrics render.
+
+Run from app/:  python -m benchmarks.bench_metrics [--requests N]
+"""
+import argparse
+import asyncio
+import os
+import time
+from unittest import mock
+import httpx
+
+import main
+from services import upstream as upstream_module
+from services.metrics import Histogram, MetricsMiddleware, registry, state_collector
+from test_support import UpstreamStandIn
+
+ALL_MIDDLEWARE = list(main.app.user_middleware)
+
+
+def set_metrics(enabled: bool):
+    middleware = [m for m in main.app.user_middleware if m.cls is not MetricsMiddleware]
+    if enabled:
+        middleware.insert(0, next(m for m in ALL_MIDDLEWARE if m.cls is MetricsMiddleware))
+    main.app.user_middleware = middleware
+    main.app.middleware_stack = None  # rebuilt on the next request
+
+
+async def per_request_us(client: httpx.AsyncClient, method: str, path: str, total: int, **kwargs) -> float:
+    await client.request(method, path, **kwargs)  # warm up (middleware stack, upstream connection)
+    started = time.perf_counter()
+    for _ in range(total):
+        await client.request(method, path, **kwargs)
+    return (time.perf_counter() - started) / total * 1e6
+
+
+async def run(total: int):
+    histogram = Histogram()
+    started = time.perf_counter()
+    for i in range(total * 100):
+        histogram.record(i * 1e-7)
+    print(f"Histogram.record: {(time.perf_counter() - started) / (total * 100) * 1e9:6.0f} ns")
+
+    async with UpstreamStandIn() as standin:
+        os.environ["UPSTREAM_BASE_URL"] = standin.url
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway") as client:
+                cases = (("cache stats", "GET", "/cache/stats", {}),
+                         ("login (upstream)", "POST", "/auth/login", {"json": {"username": "u", "password": "p"}}))
+                for label, method, path, kwargs in cases:
+                    runs = []
+                    # Best of three interleaved runs, so drift affects both sides alike
+                    for _ in range(3):
+                        set_metrics(False)
+                        with mock.patch.object(upstream_module.UPSTREAM_LATENCY, "observe", lambda *a: None):
+                            base = await per_request_us(client, method, path, total, **kwargs)
+                        set_metrics(True)
+                        runs.append((base, await per_request_us(client, method, path, total, **kwargs)))
+                    base, instrumented = min(r[0] for r in runs), min(r[1] for r in runs)
+                    print(f"{label:>17}: {base:7.1f} us/request without metrics, {instrumented:7.1f} us with "
+                          f"({instrumented - base:+.1f} us, {(instrumented - base) / base:+.1%})")
+
+            started = time.perf_counter()
+            body = registry.render(state_collector(main.app.state))
+            print(f"/metrics render: {(time.perf_counter() - started) * 1000:.2f} ms for {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
@@ -0,0 +1,84 @@
+"""
+Component lookups with 50k components: the old linear scan over a list versus
+the indexed ComponentRegistry, plus manifest load and filtered listing times.
+
+Run from app/:  python -m benchmarks.bench_registry [--components N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from services.registry import ComponentRegistry
+
+KINDS = ["Button", "Card", "Toggle", "Slider", "Modal", "Badge", "Tooltip", "Tabs", "Input", "Avatar"]
+TAGS = ["form", "layout", "feedback", "navigation", "overlay", "data", "media", "cta", "button", "card"]
+
+
+def manifest(n: int, rng: random.Random) -> list:
+    return [
+        {"id": f"cmp-{i}", "name": f"Neon{rng.choice(KINDS)}{i % 500}", "description": f"Component {i}",
+         "props": {"glow": rng.random() > 0.5}, "tags": rng.sample(TAGS, 2)}
+        for i in range(n)
+    ]
+
+
+def timed_us(run, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+def linear_get(components: list, component_id: str):
+    for c in components:
+        if c["id"] == component_id:
+            return c
+    return None
+
+
+async def main(n: int, repeat: int):
+    rng = random.Random(7)
+    components = manifest(n, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "components.json")
+        with open(path, "w") as f:
+            json.dump({"components": components}, f)
+        registry = ComponentRegistry(path)
+        started = time.perf_counter()
+        registry.load()
+        print(f"load {n} components: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        ids = [f"cmp-{rng.randrange(n)}" for _ in range(repeat)]
+        scan = statistics.median(timed_us(lambda: linear_get(components, i), 1) for i in ids)
+        indexed = statistics.median(timed_us(lambda: registry.get(i), 1) for i in ids)
+        print(f"get by id: linear scan p50 {scan:9.1f} us | registry p50 {indexed:6.2f} us ({scan / indexed:,.0f}x)")
+        for label, filters in (("by name", {"name": "NeonCard42"}), ("by tag", {"tag": "overlay"}),
+                               ("tag + q", {"tag": "overlay", "q": "modal"}), ("unfiltered", {})):
+            us = timed_us(lambda: registry.list(**filters, offset=100, limit=50), repeat)
+            print(f"list {label:<10} (page of 50): p50 {us:8.1f} us")
+
+        # Requests keep reading the old snapshot while a reload parses in a worker thread
+        with open(path, "w") as f:
+            json.dump({"components": components[::-1]}, f)
+        reload = asyncio.create_task(registry.reload_if_changed())
+        served, started = 0, time.perf_counter()
+        while not reload.done():
+            registry.get(ids[served % len(ids)])
+            served += 1
+            await asyncio.sleep(0)
+        print(f"hot reload: {(time.perf_counter() - started) * 1000:.0f} ms, {served} lookups served meanwhile")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--components", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.components, args.repeat))
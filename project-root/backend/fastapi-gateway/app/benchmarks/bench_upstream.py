@@ -0,0 +1,60 @@
+"""
+Requests per second to a local stand-in upstream: a new httpx.AsyncClient per
+request (the old auth_proxy) versus the shared pooled UpstreamClient.
+
+Run from app/:  python -m benchmarks.bench_upstream [--requests N] [--concurrency C]
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+
+from services.upstream import UpstreamClient
+from test_support import UpstreamStandIn
+
+PAYLOAD = {"username": "bench", "password": "bench"}
+
+
+async def client_per_request(url: str):
+    async with httpx.AsyncClient() as client:
+        r = await client.post(f"{url}/api/auth/token/", json=PAYLOAD)
+        return r.json()
+
+
+async def run(label: str, call, total: int, concurrency: int, standin: UpstreamStandIn):
+    semaphore = asyncio.Semaphore(concurrency)
+    connections_before = standin.connections
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {total / elapsed:9.0f} req/s  "
+          f"({standin.connections - connections_before} upstream connections for {total} requests)")
+    return total / elapsed
+
+
+async def main(total: int, concurrency: int, delay: float):
+    async with UpstreamStandIn(delay=delay) as standin:
+        os.environ["UPSTREAM_BASE_URL"] = standin.url
+        before = await run("client per request", lambda: client_per_request(standin.url), total, concurrency, standin)
+        upstream = UpstreamClient.from_env()
+        try:
+            after = await run("shared UpstreamClient", lambda: upstream.post("/api/auth/token/", json=PAYLOAD),
+                              total, concurrency, standin)
+        finally:
+            await upstream.aclose()
+    print(f"speed-up: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.0, help="Simulated upstream latency in seconds.")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.delay))
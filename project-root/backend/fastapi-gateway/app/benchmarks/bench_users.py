@@ -0,0 +1,59 @@
+"""
+Upstream calls per rendered list when enriching rows with their users: one
+lookup per row (N+1 over HTTP) versus the batched UsersClient, against a local
+stand-in for Django's bulk user endpoint.
+
+Run from app/:  python -m benchmarks.bench_users [--rows N] [--users U] [--latency S]
+"""
+import argparse
+import asyncio
+import random
+import time
+import httpx
+from urllib.parse import parse_qs, urlsplit
+
+from services.upstream import UpstreamClient
+from test_support import UpstreamStandIn
+from services.users_client import BULK_USERS_PATH, UsersClient
+
+
+def bulk_users(method, target, headers, body):
+    ids = parse_qs(urlsplit(target).query)["ids"][0].split(",")
+    return 200, {"users": [{"id": int(i), "username": f"user{i}"} for i in ids]}
+
+
+async def render_per_row(upstream: UpstreamClient, rows: list):
+    async def user(user_id):
+        r = await upstream.get(BULK_USERS_PATH, params={"ids": user_id}, coalesce=False)
+        return r.json()["users"][0]
+    return [dict(row, creator=await user(row["creator_id"])) for row in rows]
+
+
+async def render_batched(users: UsersClient, rows: list):
+    creators = await asyncio.gather(*(users.get_user(row["creator_id"]) for row in rows))
+    return [dict(row, creator=creator) for row, creator in zip(rows, creators)]
+
+
+async def main(n_rows: int, n_users: int, latency: float):
+    rng = random.Random(7)
+    rows = [{"id": i, "creator_id": rng.randint(1, n_users)} for i in range(n_rows)]
+    async with UpstreamStandIn(bulk_users, delay=latency) as standin:
+        upstream = UpstreamClient(standin.url, limits=httpx.Limits(), timeout=10)
+        users = UsersClient(upstream, "bench")
+        for label, render in (("one lookup per row", lambda: render_per_row(upstream, rows)),
+                              ("UsersClient, cold cache", lambda: render_batched(users, rows)),
+                              ("UsersClient, warm cache", lambda: render_batched(users, rows))):
+            before, started = standin.requests, time.perf_counter()
+            await render()
+            print(f"{label:<24} {standin.requests - before:4d} upstream calls for {n_rows} rows "
+                  f"in {(time.perf_counter() - started) * 1000:7.1f} ms")
+        await upstream.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated Django latency in seconds.")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.users, args.latency))
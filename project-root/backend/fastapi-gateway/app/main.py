@@ -1,8 +1,47 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import components, auth_proxy
+from routers import components, auth_proxy, characters
+from services.auth import JWTVerifier
+from services.cache import ResponseCache
+from services.metrics import MetricsMiddleware, metrics_endpoint
+from services.registry import ComponentRegistry
+from services.upstream import UpstreamClient
+from services.users_client import UsersClient
 
-app = FastAPI(title="Neon UI Gateway")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client to Django for the whole process; routers get it via services.upstream.get_upstream
+    app.state.upstream = UpstreamClient.from_env()
+    # Batched user lookups for enriching lists (services.users_client.get_users_client)
+    app.state.users = UsersClient.from_env(app.state.upstream)
+    # Hot GET responses (see services.cache.cached_response)
+    app.state.cache = ResponseCache.from_env()
+    # Component manifest, hot-reloaded in the background; cached component responses are dropped on reload
+    app.state.registry = ComponentRegistry.from_env(on_reload=lambda: app.state.cache.invalidate("components:"))
+    registry_watch = asyncio.create_task(app.state.registry.watch(float(os.getenv("COMPONENTS_RELOAD_INTERVAL", 2))))
+    # Local JWT checks (services.auth.require_user); revocations are polled from Django in the background
+    app.state.jwt = JWTVerifier.from_env()
+    service_key = os.getenv("GATEWAY_SERVICE_KEY")
+    revocation_sync = None
+    if service_key:
+        revocation_sync = asyncio.create_task(app.state.jwt.revocations.run(
+            app.state.upstream, service_key, float(os.getenv("REVOCATION_SYNC_INTERVAL", 30))))
+    try:
+        yield
+    finally:
+        background = [task for task in (registry_watch, revocation_sync) if task]
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await app.state.cache.close()
+        await app.state.upstream.aclose()
+
+
+app = FastAPI(title="Neon UI Gateway", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,5 +50,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request latency covers CORS and the whole app; scraped at /metrics
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth_proxy.router, prefix="/auth", tags=["auth"])
 app.include_router(components.router, prefix="/components", tags=["components"])
+app.include_router(characters.router, prefix="/characters", tags=["characters"])
+
+
+@app.get("/cache/stats", tags=["ops"])
+async def cache_stats():
+    return app.state.cache.stats()
+
+
+app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], tags=["ops"], include_in_schema=False)
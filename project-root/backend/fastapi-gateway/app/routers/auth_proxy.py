@@ -1,13 +1,27 @@
-from fastapi import APIRouter
-import httpx
-import os
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from services.auth import JWTVerifier, get_verifier, require_user
+from services.resilience import DEADLINE_HEADER, deadline_for
+from services.upstream import UpstreamClient, get_upstream, upstream_errors
 
 router = APIRouter()
 
-DJANGO_BASE = f"http://{os.getenv('DJANGO_HOST', 'django')}:{os.getenv('DJANGO_PORT', '8001')}"
 
 @router.post("/login")
-async def login_proxy(payload: dict):
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{DJANGO_BASE}/api/token/", json=payload)
-        return r.json()
+async def login_proxy(payload: dict, request: Request, upstream: UpstreamClient = Depends(get_upstream)):
+    with upstream_errors("Auth service"):
+        r = await upstream.post("/api/auth/token/", json=payload, route="auth.login",
+                                deadline=deadline_for("auth.login", request.headers.get(DEADLINE_HEADER)))
+    try:
+        body = r.json()
+    except ValueError:
+        raise HTTPException(status_code=502, detail="Auth service returned an invalid response")
+    return JSONResponse(body, status_code=r.status_code)
+
+
+@router.get("/verify")
+async def verify(claims: dict = Depends(require_user), verifier: JWTVerifier = Depends(get_verifier)):
+    """Edge auth check (e.g. for an ingress auth_request): 200 with the token's user, or 401. Never calls Django."""
+    user_id = claims[verifier.user_id_claim]
+    return JSONResponse({"user_id": user_id, "exp": claims["exp"]}, headers={"X-User-Id": str(user_id)})
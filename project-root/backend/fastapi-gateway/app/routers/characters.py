@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Request
+
+from services.cache import CachedResponse, cached_response
+from services.resilience import DEADLINE_HEADER, deadline_for
+from services.upstream import UpstreamClient, get_upstream, upstream_errors
+
+router = APIRouter()
+
+# Upstream headers kept with a cached catalogue page and sent to clients
+FORWARDED_HEADERS = ("etag", "last-modified", "cache-control")
+
+
+@router.get("/")
+async def list_characters(request: Request, upstream: UpstreamClient = Depends(get_upstream)):
+    """Django's public character catalogue (/api/v1/characters/), served from the gateway cache."""
+
+    async def load(previous: CachedResponse | None) -> CachedResponse:
+        # The catalogue is the same for every caller, so no credentials are forwarded
+        # and one cache entry serves everyone; refreshes revalidate with the ETag.
+        headers = {}
+        if previous is not None and "etag" in previous.headers:
+            headers["If-None-Match"] = previous.headers["etag"]
+        with upstream_errors("Catalogue service"):
+            r = await upstream.get("/api/v1/characters/", params=request.query_params.multi_items(), headers=headers,
+                                   route="characters.list",
+                                   deadline=deadline_for("characters.list", request.headers.get(DEADLINE_HEADER)))
+        if r.status_code == 304 and previous is not None:
+            return previous
+        return CachedResponse(
+            status_code=r.status_code, body=r.content,
+            media_type=r.headers.get("content-type", "application/json"),
+            headers={name: r.headers[name] for name in FORWARDED_HEADERS if name in r.headers},
+        )
+
+    return await cached_response(request, "characters", load)
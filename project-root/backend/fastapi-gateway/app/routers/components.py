@@ -1,28 +1,39 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request
+
+from schemas import Component
+from services.cache import CachedResponse, cached_response
+from services.registry import ComponentRegistry, get_registry
 
 router = APIRouter()
 
-class Component(BaseModel):
-    id: str
-    name: str
-    description: str
-    props: dict = {}
 
-# simple in-memory demo list (replace with call to Django microservice)
-DEMO = [
-    {"id": "btn-1", "name": "NeonButton", "description": "A glowing CTA"},
-    {"id": "card-1", "name": "NeonCard", "description": "Fancy card"}
-]
+def _json(status_code: int, data, headers: Optional[dict] = None) -> CachedResponse:
+    return CachedResponse(status_code, json.dumps(data).encode(), headers=headers or {})
+
 
 @router.get("/", response_model=List[Component])
-async def list_components():
-    return DEMO
+async def list_components(
+    request: Request,
+    name: Optional[str] = None,
+    tag: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Substring of the component name"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    registry: ComponentRegistry = Depends(get_registry),
+):
+    """Components in manifest order, filtered and paginated; the total is in X-Total-Count."""
+    async def load(previous):
+        page, total = registry.list(name=name, tag=tag, q=q, offset=offset, limit=limit)
+        return _json(200, page, {"X-Total-Count": str(total)})
+    return await cached_response(request, "components", load)
 
 @router.get("/{component_id}", response_model=Component)
-async def get_component(component_id: str):
-    for c in DEMO:
-        if c["id"] == component_id:
-            return c
-    raise HTTPException(status_code=404, detail="Component not found")
+async def get_component(component_id: str, request: Request, registry: ComponentRegistry = Depends(get_registry)):
+    async def load(previous):
+        component = registry.get(component_id)
+        if component is None:
+            return _json(404, {"detail": "Component not found"})
+        return _json(200, component)
+    return await cached_response(request, "components", load)
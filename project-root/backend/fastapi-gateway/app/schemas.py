@@ -3,3 +3,10 @@ from pydantic import BaseModel
 class User(BaseModel):
     id: str
     name: str
+
+class Component(BaseModel):
+    id: str
+    name: str
+    description: str
+    props: dict = {}
+    tags: list[str] = []
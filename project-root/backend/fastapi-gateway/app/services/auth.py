@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwk, jwt
+
+from services.upstream import UpstreamClient
+
+logger = logging.getLogger(__name__)
+
+REVOCATIONS_PATH = "/api/v1/auth/revocations/"
+
+
+class TokenRejected(Exception):
+    pass
+
+
+class RevocationList:
+    """
+    The gateway's copy of Django's revoked tokens, refreshed by polling
+    /api/v1/auth/revocations/ rather than per request: blacklisted jtis (kept
+    until the token would expire anyway) and inactive users, both followed
+    incrementally by cursor.
+
+    User ids are kept as strings: SimpleJWT writes the user id claim as a
+    string, while Django's feed sends integers.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.blacklisted: dict[str, int] = {}
+        self.inactive_users: set[str] = set()
+        self.cursor = 0
+        self.users_cursor = 0
+        self.synced_at: Optional[float] = None
+
+    def is_revoked(self, claims: dict, user_id_claim: str = "user_id") -> bool:
+        return claims.get("jti") in self.blacklisted or str(claims.get(user_id_claim)) in self.inactive_users
+
+    async def sync(self, upstream: UpstreamClient, service_key: str):
+        r = await upstream.get(REVOCATIONS_PATH, params={"since": self.cursor, "users_since": self.users_cursor},
+                               headers={"X-Gateway-Key": service_key}, route="auth.revocations", coalesce=False)
+        r.raise_for_status()
+        data = r.json()
+        now = self.clock()
+        self.blacklisted.update((entry["jti"], entry["exp"]) for entry in data["blacklisted"])
+        self.blacklisted = {jti: exp for jti, exp in self.blacklisted.items() if exp > now}
+        for change in data["user_changes"]:  # oldest first, so the latest change wins
+            if change["is_active"]:
+                self.inactive_users.discard(str(change["id"]))
+            else:
+                self.inactive_users.add(str(change["id"]))
+        self.cursor = data["cursor"]
+        self.users_cursor = data["users_cursor"]
+        self.synced_at = now
+
+    async def run(self, upstream: UpstreamClient, service_key: str, interval: float):
+        """Syncs every `interval` seconds until cancelled; a failed sync keeps the previous lists."""
+        while True:
+            try:
+                await self.sync(upstream, service_key)
+            except Exception as e:
+                logger.warning(f"Token revocation sync failed (last synced at {self.synced_at}): {e!r}")
+            await asyncio.sleep(interval)
+
+
+class JWTVerifier:
+    """
+    Verifies Django's SimpleJWT tokens at the gateway: signature, exp/nbf, optional
+    aud/iss, token_type and the user id claim, then the synced RevocationList.
+
+    The verifying key is parsed once, and recently verified tokens are kept in a
+    bounded LRU so repeat requests skip the signature check (expiry and
+    revocation are still checked on every call).
+    """
+
+    def __init__(self, key: str, algorithm: str = "HS256", *, audience: Optional[str] = None,
+                 issuer: Optional[str] = None, leeway: float = 0, user_id_claim: str = "user_id",
+                 revocations: Optional[RevocationList] = None, cache_size: int = 10000,
+                 clock: Callable[[], float] = time.time):
+        self.algorithm = algorithm
+        self._key = jwk.construct(key, algorithm)
+        self.audience, self.issuer, self.leeway = audience, issuer, leeway
+        self.user_id_claim = user_id_claim
+        self.revocations = revocations or RevocationList(clock)
+        self.cache_size = cache_size
+        self.clock = clock
+        self.cache_hits = 0
+        self._verified: OrderedDict[str, dict] = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "JWTVerifier":
+        algorithm = os.getenv("JWT_ALGORITHM", "HS256")
+        # SimpleJWT signs with Django's SECRET_KEY unless SIMPLE_JWT says otherwise
+        key = (os.getenv("JWT_VERIFYING_KEY") or os.getenv("JWT_SIGNING_KEY")
+               or os.getenv("DJANGO_SECRET_KEY", "your-fallback-secret-key-for-dev"))
+        return cls(key, algorithm, audience=os.getenv("JWT_AUDIENCE") or None,
+                   issuer=os.getenv("JWT_ISSUER") or None, leeway=float(os.getenv("JWT_LEEWAY", 0)),
+                   user_id_claim=os.getenv("JWT_USER_ID_CLAIM", "user_id"),
+                   cache_size=int(os.getenv("JWT_VERIFIED_CACHE_SIZE", 10000)))
+
+    def verify(self, token: str, token_type: str = "access") -> dict:
+        claims = self._verified.get(token)
+        if claims is None:
+            claims = self._decode(token)
+            if claims.get("token_type") != token_type:
+                raise TokenRejected("Token has wrong type")
+            if claims.get(self.user_id_claim) is None:
+                raise TokenRejected("Token contained no recognizable user identification")
+            self._verified[token] = claims
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        else:
+            self.cache_hits += 1
+            self._verified.move_to_end(token)
+            if claims["exp"] + self.leeway <= self.clock():
+                del self._verified[token]
+                raise TokenRejected("Token is expired")
+        if self.revocations.is_revoked(claims, self.user_id_claim):
+            raise TokenRejected("Token is blacklisted")
+        return claims
+
+    def _decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(
+                token, self._key, algorithms=[self.algorithm], audience=self.audience, issuer=self.issuer,
+                options={"require_exp": True, "verify_aud": self.audience is not None, "leeway": self.leeway},
+            )
+        except JWTError as e:
+            raise TokenRejected(f"Token is invalid or expired: {e}")
+
+
+bearer = HTTPBearer(auto_error=False)
+
+
+def get_verifier(request: Request) -> JWTVerifier:
+    """FastAPI dependency: the JWTVerifier owned by the app lifespan."""
+    return request.app.state.jwt
+
+
+async def require_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer),
+                       verifier: JWTVerifier = Depends(get_verifier)) -> dict:
+    """FastAPI dependency: the verified access token's claims, or 401 without calling Django."""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Authentication credentials were not provided.",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verifier.verify(credentials.credentials)
+    except TokenRejected as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+import httpx
+from fastapi import HTTPException, Request, Response
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    body: bytes
+    media_type: str = "application/json"
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class _Entry:
+    value: CachedResponse
+    fresh_until: float
+    stale_until: float
+    error_until: float
+    size: int
+
+
+Loader = Callable[[Optional[CachedResponse]], Awaitable[CachedResponse]]
+
+
+def _upstream_failure(error: BaseException) -> bool:
+    return isinstance(error, httpx.HTTPError) or (isinstance(error, HTTPException) and error.status_code >= 500)
+
+
+def route_ttl(route: str) -> tuple[float, float]:
+    """(ttl, stale_ttl) seconds for a route, from CACHE_TTL_<ROUTE> / CACHE_STALE_<ROUTE>."""
+    name = route.upper()
+    return (float(os.getenv(f"CACHE_TTL_{name}", os.getenv("CACHE_TTL_DEFAULT", 30))),
+            float(os.getenv(f"CACHE_STALE_{name}", os.getenv("CACHE_STALE_DEFAULT", 60))))
+
+
+class ResponseCache:
+    """
+    In-memory LRU cache of GET responses, bounded by entry count and body bytes.
+
+    Entries are fresh for `ttl` seconds, then served stale for up to `stale_ttl`
+    more while one background task refreshes them; after that they are misses.
+    If such a miss fails upstream (5xx, timeout, open circuit), the old entry is
+    still served for up to `stale_if_error` seconds while Django recovers.
+    Only 200 responses are stored. The loader receives the previous value (or
+    None) so it can revalidate with If-None-Match.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024, stale_if_error: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stale_if_error = stale_if_error
+        self.clock = clock
+        self.hits = self.stale_hits = self.misses = self.evictions = self.refresh_errors = self.stale_errors = 0
+        self.bytes = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 1024)),
+                   max_bytes=int(os.getenv("CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+                   stale_if_error=float(os.getenv("CACHE_STALE_IF_ERROR", 300)))
+
+    async def get_or_load(self, key: str, loader: Loader, ttl: float,
+                          stale_ttl: float = 0.0) -> tuple[CachedResponse, str]:
+        """Returns (response, "hit" | "stale" | "miss")."""
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+            if now < entry.fresh_until:
+                self.hits += 1
+                return entry.value, "hit"
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                task = asyncio.create_task(self._refresh(key, loader, entry.value, ttl, stale_ttl))
+                self._refreshing[key] = task
+            return entry.value, "stale"
+
+        self.misses += 1
+        fallback = entry if entry is not None and now < entry.error_until else None
+        try:
+            value = await loader(entry.value if entry else None)
+        except Exception as e:
+            if fallback is None or not _upstream_failure(e):
+                raise
+            logger.warning(f"Serving stale {key} while upstream fails: {e!r}")
+            value = None
+        if fallback is not None and (value is None or value.status_code >= 500):
+            self.stale_errors += 1
+            return fallback.value, "stale"
+        self._store(key, value, ttl, stale_ttl)
+        return value, "miss"
+
+    async def _refresh(self, key, loader, previous, ttl, stale_ttl):
+        try:
+            self._store(key, await loader(previous), ttl, stale_ttl)
+        except Exception as e:
+            # The stale entry keeps being served until its stale window ends
+            self.refresh_errors += 1
+            logger.warning(f"Background refresh of {key} failed: {e!r}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def _store(self, key: str, value: CachedResponse, ttl: float, stale_ttl: float):
+        if value.status_code != 200 or ttl <= 0 or len(value.body) > self.max_bytes:
+            return
+        self._discard(key)
+        now = self.clock()
+        self._entries[key] = _Entry(value, now + ttl, now + ttl + stale_ttl, now + ttl + stale_ttl + self.stale_if_error,
+                                    len(value.body))
+        self.bytes += len(value.body)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def invalidate(self, prefix: str = ""):
+        for key in [k for k in self._entries if k.startswith(prefix)]:
+            self._discard(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries), "bytes": self.bytes,
+            "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses, "stale_errors": self.stale_errors,
+            "evictions": self.evictions, "refresh_errors": self.refresh_errors,
+            "refreshing": len(self._refreshing),
+        }
+
+    async def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+
+
+def cache_key(request: Request, route: str, vary_on_auth: bool = False) -> str:
+    """route + path + sorted query; per-credential when the response depends on who asks."""
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    key = f"{route}:{request.url.path}?{query}"
+    if vary_on_auth:
+        credential = request.headers.get("authorization", "")
+        key += "|" + (hashlib.sha256(credential.encode()).hexdigest()[:32] if credential else "anon")
+    return key
+
+
+def get_cache(request: Request) -> ResponseCache:
+    """FastAPI dependency: the ResponseCache owned by the app lifespan."""
+    return request.app.state.cache
+
+
+async def cached_response(request: Request, route: str, loader: Loader, vary_on_auth: bool = False) -> Response:
+    """Serves a GET route through the app's ResponseCache with the route's TTLs; sets X-Cache."""
+    ttl, stale_ttl = route_ttl(route)
+    value, outcome = await get_cache(request).get_or_load(cache_key(request, route, vary_on_auth), loader, ttl, stale_ttl)
+    headers = {**value.headers, "X-Cache": outcome.upper()}
+    return Response(value.body, status_code=value.status_code, media_type=value.media_type, headers=headers)
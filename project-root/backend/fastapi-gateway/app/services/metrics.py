@@ -0,0 +1,247 @@
+import hmac
+import os
+import time
+from typing import Callable, Iterable, Iterator, Optional
+import httpx
+from fastapi import Request, Response
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Prometheus `le` boundaries each histogram is exported at
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram (the same layout as Django's api.metrics).
+
+    Values are scaled to integers (`scale=1e6` records seconds at microsecond
+    resolution). Below 2**sub_bits every integer has its own bucket; above, each
+    power of two is split into 2**(sub_bits - 1) equal buckets, so a bucket's
+    width is at most ~3% of its value over the whole range. The gateway records
+    from its one event loop thread, so there is no lock.
+    """
+
+    def __init__(self, scale: float = 1e6, sub_bits: int = 6, max_bits: int = 40):
+        self.scale = scale
+        self.sub_bits = sub_bits
+        self._half = 1 << (sub_bits - 1)
+        self._max = (1 << max_bits) - 1
+        self.counts = [0] * ((1 << sub_bits) + (max_bits - sub_bits) * self._half)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _lowest(self, index: int) -> int:
+        """Smallest scaled value that falls in bucket `index`."""
+        if index < 1 << self.sub_bits:
+            return index
+        shift, offset = divmod(index - (1 << self.sub_bits), self._half)
+        return (offset + self._half) << (shift + 1)
+
+    def record(self, value: float):
+        v = int(value * self.scale)
+        if v < 0:
+            v = 0
+        elif v > self._max:
+            v = self._max
+        shift = v.bit_length() - self.sub_bits
+        self.counts[v if shift <= 0 else (1 << self.sub_bits) + (shift - 1) * self._half + (v >> shift) - self._half] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank, seen = max(1, round(q * self.count)), 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Upper edge of the bucket, never past the largest value seen
+                return min((self._lowest(index + 1) - 1) / self.scale, self.max)
+        return self.max
+
+    def cumulative(self, bounds: Iterable[float]) -> list[int]:
+        """Count of recorded values <= each bound (to bucket precision)."""
+        result, seen, index = [], 0, 0
+        for bound in bounds:
+            limit = int(bound * self.scale)
+            while index < len(self.counts) and self._lowest(index) <= limit:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class HistogramFamily:
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple = SECONDS_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self.children: dict[tuple, Histogram] = {}
+
+    def observe(self, value: float, *labels):
+        histogram = self.children.get(labels)
+        if histogram is None:
+            histogram = self.children[labels] = Histogram()
+        histogram.record(value)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for values, histogram in sorted(self.children.items()):
+            labels = _labels(self.labels, values)
+            sep = "," if labels else ""
+            for bound, seen in zip(self.buckets, histogram.cumulative(self.buckets)):
+                yield f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {seen}'
+            yield f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {histogram.count}'
+            yield f"{self.name}_sum{{{labels}}} {histogram.sum}"
+            yield f"{self.name}_count{{{labels}}} {histogram.count}"
+        # HDR percentiles of this process, exact to bucket precision (no aggregation across processes)
+        yield f"# HELP {self.name}_quantile {self.help} (percentiles)"
+        yield f"# TYPE {self.name}_quantile gauge"
+        for values, histogram in sorted(self.children.items()):
+            labels = _labels(self.labels, values)
+            for q in QUANTILES:
+                yield f'{self.name}_quantile{{{labels}{"," if labels else ""}quantile="{q}"}} {histogram.percentile(q)}'
+
+
+class CounterFamily:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name, self.help, self.labels = name, help_text, labels
+        self.children: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.children[labels] = self.children.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for values, count in sorted(self.children.items()):
+            yield f"{self.name}{{{_labels(self.labels, values)}}} {count}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families: list = []
+
+    def register(self, family):
+        self.families.append(family)
+        return family
+
+    def render(self, *collectors: Callable[[], Iterable[str]]) -> str:
+        """The exposition text; `collectors` yield extra lines read at scrape time (gauges)."""
+        lines = [line for family in self.families for line in family.render()]
+        lines += [line for collect in collectors for line in collect()]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.register(HistogramFamily(
+    "gateway_http_request_duration_seconds", "Time from request to the end of the response, by route.",
+    ("route", "method")))
+REQUESTS = registry.register(CounterFamily(
+    "gateway_http_requests_total", "Responses by route, method and status.", ("route", "method", "status")))
+UPSTREAM_LATENCY = registry.register(HistogramFamily(
+    "gateway_upstream_request_duration_seconds", "Time of one call (attempt) to Django, by upstream route and outcome.",
+    ("route", "outcome")))
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handled the request, or "unmatched"."""
+    # Newer FastAPI resolves included routers lazily and puts the prefixed route here;
+    # scope["route"] is then the route as declared on its APIRouter (without the prefix)
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    if context is not None:
+        return context.path
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording each HTTP request's latency and status.
+
+    Requests are labelled by the matched route's path template (e.g.
+    /characters/{character_id}), so cardinality is bounded by the app's routes;
+    unrouted paths are "unmatched". Latency runs until the app returns, i.e.
+    after the last body chunk has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500  # if the app raises before starting a response, the server answers 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = route_template(scope)
+            REQUEST_LATENCY.observe(time.perf_counter() - started, path, scope["method"])
+            REQUESTS.inc(path, scope["method"], status)
+
+
+def upstream_outcome(status_code: Optional[int], error: Optional[BaseException]) -> str:
+    """Label for one upstream attempt: "2xx".."5xx", "timeout" or "error"."""
+    if error is None:
+        return f"{status_code // 100}xx"
+    return "timeout" if isinstance(error, httpx.TimeoutException) else "error"
+
+
+def state_collector(app_state) -> Callable[[], Iterator[str]]:
+    """Gauges and counters read from the lifespan's services when /metrics is scraped."""
+
+    def collect() -> Iterator[str]:
+        cache = app_state.cache.stats()
+        yield "# HELP gateway_cache_events_total Response cache lookups and evictions by kind."
+        yield "# TYPE gateway_cache_events_total counter"
+        for kind in ("hits", "stale_hits", "misses", "evictions", "refresh_errors", "stale_errors"):
+            yield f'gateway_cache_events_total{{kind="{kind}"}} {cache[kind]}'
+        yield "# HELP gateway_cache_bytes Bytes of response bodies held by the cache."
+        yield "# TYPE gateway_cache_bytes gauge"
+        yield f"gateway_cache_bytes {cache['bytes']}"
+
+        upstream = app_state.upstream
+        yield "# HELP gateway_upstream_retries_total Upstream calls retried."
+        yield "# TYPE gateway_upstream_retries_total counter"
+        yield f"gateway_upstream_retries_total {upstream.retries}"
+        yield "# HELP gateway_upstream_coalesced_total GETs that shared an in-flight upstream request."
+        yield "# TYPE gateway_upstream_coalesced_total counter"
+        yield f"gateway_upstream_coalesced_total {upstream.coalesced}"
+        yield "# HELP gateway_circuit_open Whether a route's circuit breaker is open (1) or half open (0.5)."
+        yield "# TYPE gateway_circuit_open gauge"
+        for route, breaker in sorted(upstream.breakers.items()):
+            yield f'gateway_circuit_open{{route="{_escape(route)}"}} {_BREAKER_STATES[breaker.state]}'
+
+    return collect
+
+
+_BREAKER_STATES = {"closed": 0, "half_open": 0.5, "open": 1}
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """GET /metrics: Prometheus text exposition of this process's metrics, behind METRICS_TOKEN if set."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        return Response(status_code=401)
+    return Response(registry.render(state_collector(request.app.state)), media_type=CONTENT_TYPE)
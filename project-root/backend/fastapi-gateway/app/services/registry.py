@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+from fastapi import Request
+
+from schemas import Component
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST = Path(__file__).resolve().parent.parent / "components.json"
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """One loaded manifest: components in manifest order plus lookup indexes (positions into `components`)."""
+    components: tuple = ()
+    names: tuple = ()
+    by_id: dict = field(default_factory=dict)
+    by_name: dict = field(default_factory=dict)
+    by_tag: dict = field(default_factory=dict)
+    version: Optional[tuple] = None
+
+
+def _file_version(path: Path) -> tuple:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_manifest(path: Path) -> _Snapshot:
+    """
+    Parses and validates a manifest: {"components": [...]} or a bare list.
+    Raises ValueError on invalid entries or duplicate ids.
+    """
+    version = _file_version(path)
+    data = json.loads(path.read_bytes())
+    entries = data["components"] if isinstance(data, dict) else data
+    components, by_id, by_name, by_tag = [], {}, {}, {}
+    for position, entry in enumerate(entries):
+        component = Component.model_validate(entry).model_dump()
+        if component["id"] in by_id:
+            raise ValueError(f"Duplicate component id {component['id']!r}")
+        components.append(component)
+        by_id[component["id"]] = component
+        by_name.setdefault(component["name"].lower(), []).append(position)
+        for tag in dict.fromkeys(tag.lower() for tag in component["tags"]):
+            by_tag.setdefault(tag, []).append(position)
+    names = tuple(component["name"].lower() for component in components)
+    return _Snapshot(tuple(components), names, by_id, by_name, by_tag, version)
+
+
+class ComponentRegistry:
+    """
+    Components from a manifest file, indexed by id, name and tag.
+
+    Reads use whichever snapshot is current and never wait on a reload: `watch`
+    polls the file's mtime/size, parses a changed file in a worker thread, and
+    swaps the snapshot in one assignment. An invalid manifest is logged and the
+    previous snapshot kept.
+    """
+
+    def __init__(self, path: Path, on_reload: Optional[Callable[[], None]] = None):
+        self.path = Path(path)
+        self.on_reload = on_reload
+        self.reloads = 0
+        self._snapshot = _Snapshot()
+
+    @classmethod
+    def from_env(cls, on_reload: Optional[Callable[[], None]] = None) -> "ComponentRegistry":
+        registry = cls(os.getenv("COMPONENTS_MANIFEST", DEFAULT_MANIFEST), on_reload)
+        registry.load()
+        return registry
+
+    def __len__(self):
+        return len(self._snapshot.components)
+
+    def load(self):
+        self._swap(load_manifest(self.path))
+
+    async def reload_if_changed(self) -> bool:
+        try:
+            if _file_version(self.path) == self._snapshot.version:
+                return False
+            snapshot = await asyncio.to_thread(load_manifest, self.path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Component manifest {self.path} not reloaded, keeping {len(self)} components: {e}")
+            return False
+        self._swap(snapshot)
+        return True
+
+    async def watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload_if_changed()
+
+    def _swap(self, snapshot: _Snapshot):
+        self._snapshot = snapshot
+        self.reloads += 1
+        logger.info(f"Loaded {len(snapshot.components)} components from {self.path}")
+        if self.on_reload:
+            self.on_reload()
+
+    def get(self, component_id: str) -> Optional[dict]:
+        return self._snapshot.by_id.get(component_id)
+
+    def list(self, name: Optional[str] = None, tag: Optional[str] = None, q: Optional[str] = None,
+             offset: int = 0, limit: int = 100) -> tuple[list, int]:
+        """Returns (page, total matches) in manifest order. `name`/`tag` are exact (case-insensitive), `q` a name substring."""
+        snapshot = self._snapshot
+        candidates = None
+        for index, key in ((snapshot.by_name, name), (snapshot.by_tag, tag)):
+            if key is not None:
+                positions = index.get(key.lower(), [])
+                candidates = positions if candidates is None else sorted(set(candidates) & set(positions))
+        if q is not None:
+            needle = q.lower()
+            positions = range(len(snapshot.components)) if candidates is None else candidates
+            candidates = [p for p in positions if needle in snapshot.names[p]]
+        if candidates is None:
+            return list(snapshot.components[offset:offset + limit]), len(snapshot.components)
+        return [snapshot.components[p] for p in candidates[offset:offset + limit]], len(candidates)
+
+
+def get_registry(request: Request) -> ComponentRegistry:
+    """FastAPI dependency: the ComponentRegistry owned by the app lifespan."""
+    return request.app.state.registry
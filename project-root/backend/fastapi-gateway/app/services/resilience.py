@@ -0,0 +1,134 @@
+import os
+import random
+import time
+from collections import deque
+from typing import Callable, Optional
+import httpx
+
+# Header carrying the caller's remaining time budget to Django, in milliseconds
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# Upstream statuses that count as failures for the breaker and may be retried
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without calling Django while a route's circuit is open."""
+
+    def __init__(self, route: str, retry_after: float):
+        super().__init__(f"Circuit for {route} is open")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    def __init__(self, route: str):
+        super().__init__(f"Deadline for {route} exceeded")
+
+
+def _route_env(name: str, route: str, default: float) -> float:
+    key = route.upper().replace(".", "_").replace("-", "_")
+    return float(os.getenv(f"{name}_{key}", os.getenv(f"{name}_DEFAULT", default)))
+
+
+def route_deadline(route: str) -> float:
+    """Seconds a call on `route` may take end to end, from UPSTREAM_DEADLINE_<ROUTE> (default 5)."""
+    return _route_env("UPSTREAM_DEADLINE", route, 5)
+
+
+def deadline_for(route: str, incoming_ms: Optional[str] = None, clock: Callable[[], float] = time.monotonic) -> float:
+    """Absolute deadline (on `clock`) for a call on `route`, tightened by a budget the gateway's caller sent."""
+    budget = route_deadline(route)
+    if incoming_ms:
+        try:
+            budget = min(budget, max(int(incoming_ms), 0) / 1000)
+        except ValueError:
+            pass
+    return clock() + budget
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures; open calls fail
+    fast for `reset_timeout` seconds; then half-open lets one probe through, which
+    closes the circuit on success or reopens it on failure.
+    """
+
+    def __init__(self, route: str, failure_threshold: int = 5, reset_timeout: float = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        self.route = route
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_timeout - self.clock()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.route, remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(self.route, self.reset_timeout)
+            self._probing = True
+
+    def record_success(self):
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state, self.opened_at, self._probing = "open", self.clock(), False
+
+    def release(self):
+        """For calls that ended with neither outcome (e.g. cancelled): frees the half-open probe slot."""
+        self._probing = False
+
+
+class RetryBudget:
+    """
+    Caps retries at `ratio` of the requests seen in the last `window` seconds (plus
+    `min_retries` per window so light traffic can still retry), so retries cannot
+    multiply load on a struggling Django.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_retries: int = 10, window: float = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ratio, self.min_retries, self.window = ratio, min_retries, window
+        self.clock = clock
+        self.exhausted = 0
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        now = self.clock()
+        # Trim here too: a healthy upstream never calls try_retry, and the deque would grow forever
+        while self._requests and self._requests[0] <= now - self.window:
+            self._requests.popleft()
+        self._requests.append(now)
+
+    def try_retry(self) -> bool:
+        now = self.clock()
+        self._trim(now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+
+def backoff_delay(attempt: int, base: float = 0.05, cap: float = 1.0) -> float:
+    """Full-jitter exponential backoff for retry `attempt` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
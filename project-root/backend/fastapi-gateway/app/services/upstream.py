@@ -0,0 +1,228 @@
+import asyncio
+import math
+import os
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional
+import httpx
+from fastapi import HTTPException, Request
+
+from services.metrics import UPSTREAM_LATENCY, upstream_outcome
+from services.resilience import (
+    DEADLINE_HEADER, IDEMPOTENT_METHODS, RETRYABLE_STATUSES, CircuitBreaker, CircuitOpenError, DeadlineExceeded,
+    RetryBudget, backoff_delay, deadline_for,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def django_base_url() -> str:
+    return os.getenv(
+        "UPSTREAM_BASE_URL",
+        f"http://{os.getenv('DJANGO_HOST', 'django')}:{os.getenv('DJANGO_PORT', '8001')}",
+    )
+
+
+# Request headers that can change a GET's response; part of the single-flight key
+VARY_HEADERS = ("authorization", "accept", "accept-language", "if-none-match", "if-modified-since", "cookie")
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task, deadline: float):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class UpstreamClient:
+    """
+    The gateway's one client for calls to Django, created and closed by the app lifespan.
+
+    Wraps a single pooled httpx.AsyncClient so every router shares keep-alive
+    connections (and their DNS/TLS setup) instead of opening a client per request,
+    with explicit pool limits and timeouts.
+
+    Every call is named by a `route` and runs under a deadline (see
+    services.resilience): the remaining budget is sent to Django as
+    X-Request-Timeout-Ms and enforced locally, idempotent calls are retried with
+    jittered backoff while the shared RetryBudget allows, and each route has a
+    CircuitBreaker that fails fast while Django is failing. Each attempt's
+    latency is recorded per route and outcome (services.metrics).
+    """
+
+    def __init__(self, base_url: str, *, limits: httpx.Limits, timeout: httpx.Timeout,
+                 http2: bool = False, transport: httpx.AsyncBaseTransport | None = None,
+                 max_retries: int = 2, retry_budget: Optional[RetryBudget] = None,
+                 breaker_threshold: int = 5, breaker_reset: float = 10):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("UPSTREAM_HTTP2 is set but the h2 package is missing (pip install httpx[http2]); using HTTP/1.1")
+                http2 = False
+        self.base_url = base_url
+        self.coalesced = 0
+        self.retries = 0
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker_threshold, self.breaker_reset = breaker_threshold, breaker_reset
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._inflight: dict[tuple, _Flight] = {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url, limits=limits, timeout=timeout, http2=http2, transport=transport,
+        )
+
+    @classmethod
+    def from_env(cls, transport: httpx.AsyncBaseTransport | None = None) -> "UpstreamClient":
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=_env_float("UPSTREAM_KEEPALIVE_EXPIRY", 30),
+        )
+        timeout = httpx.Timeout(
+            connect=_env_float("UPSTREAM_CONNECT_TIMEOUT", 2),
+            read=_env_float("UPSTREAM_READ_TIMEOUT", 10),
+            write=_env_float("UPSTREAM_WRITE_TIMEOUT", 5),
+            pool=_env_float("UPSTREAM_POOL_TIMEOUT", 2),
+        )
+        http2 = os.getenv("UPSTREAM_HTTP2", "0").lower() in ("1", "true", "yes")
+        retry_budget = RetryBudget(ratio=_env_float("RETRY_BUDGET_RATIO", 0.1),
+                                   min_retries=int(os.getenv("RETRY_BUDGET_MIN_RETRIES", 10)),
+                                   window=_env_float("RETRY_BUDGET_WINDOW", 10))
+        return cls(django_base_url(), limits=limits, timeout=timeout, http2=http2, transport=transport,
+                   max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", 2)), retry_budget=retry_budget,
+                   breaker_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                   breaker_reset=_env_float("CIRCUIT_RESET_TIMEOUT", 10))
+
+    def breaker(self, route: str) -> CircuitBreaker:
+        if route not in self.breakers:
+            self.breakers[route] = CircuitBreaker(route, self.breaker_threshold, self.breaker_reset)
+        return self.breakers[route]
+
+    async def request(self, method: str, path: str, *, route: str = "default", deadline: Optional[float] = None,
+                      idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """`deadline` is absolute on time.monotonic (see resilience.deadline_for); defaults to the route's."""
+        request = self._client.build_request(method, path, **kwargs)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        return await self._send(request, route, deadline or deadline_for(route), idempotent)
+
+    async def _send(self, request: httpx.Request, route: str, deadline: float, idempotent: bool) -> httpx.Response:
+        breaker = self.breaker(route)
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(route)
+            breaker.before_call()
+            request.headers[DEADLINE_HEADER] = str(math.floor(remaining * 1000))
+            error, response = None, None
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(remaining):
+                    response = await self._client.send(request)
+            except TimeoutError:
+                error = DeadlineExceeded(route)
+            except httpx.TransportError as e:
+                error = e
+            except BaseException:
+                breaker.release()
+                raise
+            UPSTREAM_LATENCY.observe(time.perf_counter() - started, route,
+                                     upstream_outcome(response.status_code if error is None else None, error))
+            if error is None and response.status_code not in RETRYABLE_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+
+            attempt += 1
+            delay = backoff_delay(attempt)
+            if (not idempotent or attempt > self.max_retries or isinstance(error, DeadlineExceeded)
+                    or deadline - time.monotonic() <= delay or not self.retry_budget.try_retry()):
+                if error is not None:
+                    raise error
+                return response
+            logger.info(f"Retrying {request.method} {request.url.path} ({route}) after {error or response.status_code}")
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, path: str, *, params=None, headers=None, route: str = "default",
+                  deadline: Optional[float] = None, coalesce: bool = True) -> httpx.Response:
+        """
+        GET with single-flight coalescing: concurrent calls for the same URL and
+        VARY_HEADERS share one upstream request and all receive its response (or
+        its exception). The shared httpx.Response is fully read; treat it as read-only.
+
+        Each caller waits until its own deadline at most, then gets DeadlineExceeded.
+        The shared request runs under the deadline of the caller that started it; if
+        that runs out while a later caller still has time, that caller retries on a
+        fresh request. A caller that times out or is cancelled only stops waiting;
+        the upstream request is cancelled when its last waiter goes.
+        """
+        request = self._client.build_request("GET", path, params=params, headers=headers)
+        deadline = deadline or deadline_for(route)
+        if not coalesce:
+            return await self._send(request, route, deadline, idempotent=True)
+        key = (str(request.url), *(request.headers.get(name) for name in VARY_HEADERS))
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = _Flight(asyncio.create_task(self._send(request, route, deadline, idempotent=True)),
+                                                   deadline)
+            flight.task.add_done_callback(lambda task: self._land(key, flight))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), deadline - time.monotonic())
+        except TimeoutError:
+            raise DeadlineExceeded(route) from None
+        except DeadlineExceeded:
+            if flight.deadline >= deadline:
+                raise
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Detach first, so a caller arriving before the task unwinds starts a fresh flight
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                flight.task.cancel()
+        # The shared request ran out of a tighter caller's budget; this caller has time for its own
+        return await self.get(path, params=params, headers=headers, route=route, deadline=deadline)
+
+    def _land(self, key: tuple, flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        # Retrieve the outcome so an error nobody waited for isn't logged as "never retrieved"
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def get_upstream(request: Request) -> UpstreamClient:
+    """FastAPI dependency: the UpstreamClient owned by the app lifespan."""
+    return request.app.state.upstream
+
+
+@contextmanager
+def upstream_errors(service: str = "Upstream"):
+    """Maps failures talking to Django onto gateway 503 (circuit open), 504 and 502 responses."""
+    try:
+        yield
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"{service} unavailable",
+                            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail=f"{service} timed out")
+    except httpx.TransportError:
+        raise HTTPException(status_code=502, detail=f"{service} unavailable")
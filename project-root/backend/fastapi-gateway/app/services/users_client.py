@@ -1,3 +1,98 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+from fastapi import Request
+
+from services.upstream import UpstreamClient
+
+BULK_USERS_PATH = "/api/v1/users/bulk/"
+
+
 class UsersClient:
-    def get_user(self, user_id: str):
-        return {"id": user_id, "name": "Test User"}
+    """
+    Looks up users from Django, DataLoader-style.
+
+    `get_user` calls made in the same event-loop tick are collected and sent as one
+    request to Django's bulk user endpoint (in chunks of `max_batch` ids), so
+    rendering a list costs one upstream call rather than one per row. Results,
+    including unknown users (None), are kept in a short-TTL per-process LRU.
+    """
+
+    def __init__(self, upstream: UpstreamClient, service_key: str, *, ttl: float = 30, max_batch: int = 200,
+                 cache_size: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.upstream = upstream
+        self.service_key = service_key
+        self.ttl, self.max_batch, self.cache_size = ttl, max_batch, cache_size
+        self.clock = clock
+        self.batches = 0
+        self._cache: OrderedDict[str, tuple[float, Optional[dict]]] = OrderedDict()
+        self._queue: dict[str, asyncio.Future] = {}
+        self._scheduled = False
+        self._dispatches: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, upstream: UpstreamClient) -> "UsersClient":
+        return cls(upstream, os.getenv("GATEWAY_SERVICE_KEY", ""),
+                   ttl=float(os.getenv("USERS_CACHE_TTL", 30)),
+                   max_batch=int(os.getenv("USERS_MAX_BATCH", 200)),
+                   cache_size=int(os.getenv("USERS_CACHE_SIZE", 10000)))
+
+    async def get_user(self, user_id) -> Optional[dict]:
+        """The user as {"id", "name"} (see schemas.User), or None if Django has no such user."""
+        user_id = str(user_id)
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] > self.clock():
+            self._cache.move_to_end(user_id)
+            return cached[1]
+        future = self._queue.get(user_id)
+        if future is None:
+            future = self._queue[user_id] = asyncio.get_running_loop().create_future()
+            if not self._scheduled:
+                # Runs after every coroutine already scheduled for this tick has queued its ids
+                self._scheduled = True
+                asyncio.get_running_loop().call_soon(self._start_dispatch)
+        # Shielded so one cancelled caller doesn't cancel the result other callers share
+        return await asyncio.shield(future)
+
+    async def get_users(self, user_ids: Iterable) -> dict:
+        """{user_id: user or None} for all ids, in one batch."""
+        ids = list(dict.fromkeys(str(i) for i in user_ids))
+        return dict(zip(ids, await asyncio.gather(*(self.get_user(i) for i in ids))))
+
+    def _start_dispatch(self):
+        task = asyncio.create_task(self._dispatch())
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self):
+        queue, self._queue, self._scheduled = self._queue, {}, False
+        ids = list(queue)
+        await asyncio.gather(*(self._load(ids[i:i + self.max_batch], queue) for i in range(0, len(ids), self.max_batch)))
+
+    async def _load(self, ids: list, futures: dict):
+        self.batches += 1
+        try:
+            r = await self.upstream.get(BULK_USERS_PATH, params={"ids": ",".join(ids)},
+                                        headers={"X-Gateway-Key": self.service_key}, route="users.bulk")
+            r.raise_for_status()
+            found = {str(u["id"]): {"id": str(u["id"]), "name": u["username"]} for u in r.json()["users"]}
+        except Exception as e:
+            for user_id in ids:
+                if not futures[user_id].done():
+                    futures[user_id].set_exception(e)
+            return
+        expires = self.clock() + self.ttl
+        for user_id in ids:
+            self._cache[user_id] = (expires, found.get(user_id))
+            self._cache.move_to_end(user_id)
+            if not futures[user_id].done():
+                futures[user_id].set_result(found.get(user_id))
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def get_users_client(request: Request) -> UsersClient:
+    """FastAPI dependency: the UsersClient owned by the app lifespan."""
+    return request.app.state.users
@@ -0,0 +1,98 @@
+"""Stand-ins for external services, shared by tests.py and the benchmarks. The gateway itself never imports this."""
+
+import asyncio
+import inspect
+import json
+from http import HTTPStatus
+
+
+async def _default_handler(method: str, path: str, headers: dict, body: bytes):
+    return 200, {"ok": True, "path": path}
+
+
+class UpstreamStandIn:
+    """
+    A minimal keep-alive HTTP/1.1 server on 127.0.0.1 that stands in for Django
+    in gateway tests and benchmarks.
+
+    `handler(method, path, headers, body)` (sync or async) returns
+    (status, payload) or (status, payload, extra_headers); dict/list payloads are
+    sent as JSON. Returning DROP closes the connection without a response, and
+    async handlers can sleep to inject latency. `connections` and `requests`
+    count what actually reached it.
+    """
+
+    DROP = object()
+
+    def __init__(self, handler=None, delay: float = 0.0):
+        self.handler = handler or _default_handler
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+        self._writers = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def stop(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+                result = self.handler(method, target, headers, body)
+                if inspect.isawaitable(result):
+                    result = await result
+                if result is self.DROP:
+                    break
+                status, payload, extra = (*result, {})[:3]
+                if isinstance(payload, bytes):
+                    data, content_type = payload, "application/octet-stream"
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                        f"Content-Type: {content_type}", f"Content-Length: {len(data)}"]
+                head += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
@@ -0,0 +1,722 @@
+"""Gateway tests. Run from app/:  python -m unittest tests"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from unittest import mock
+import httpx
+from jose import jwt
+
+from starlette.requests import Request
+
+import main
+from services.auth import JWTVerifier, RevocationList, TokenRejected
+from services.cache import CachedResponse, ResponseCache, cache_key
+from services.metrics import REQUESTS, UPSTREAM_LATENCY, Histogram
+from services.registry import ComponentRegistry
+from services.resilience import CircuitOpenError, DeadlineExceeded, RetryBudget
+from services.upstream import UpstreamClient
+from services.users_client import UsersClient
+from test_support import UpstreamStandIn
+
+
+class GatewayTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs main.app with its lifespan against an UpstreamStandIn; set `handler`/`delay` per test class."""
+    handler = None
+    delay = 0.0
+    env = {}
+
+    async def asyncSetUp(self):
+        self.standin = await UpstreamStandIn(self.handler, self.delay).start()
+        self.addAsyncCleanup(self.standin.stop)
+        env = mock.patch.dict(os.environ, {"UPSTREAM_BASE_URL": self.standin.url, **self.env})
+        env.start()
+        self.addCleanup(env.stop)
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+        self.addAsyncCleanup(lifespan.__aexit__, None, None, None)
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway")
+        self.addAsyncCleanup(self.client.aclose)
+
+
+def _token_handler(method, path, headers, body):
+    if path != "/api/auth/token/":
+        return 404, {"detail": "Not found."}
+    if b'"password": "wrong"' in body or b'"password":"wrong"' in body:
+        return 401, {"detail": "No active account found with the given credentials"}
+    return 200, {"access": "a", "refresh": "r"}
+
+
+class LoginProxyTest(GatewayTestCase):
+    handler = staticmethod(_token_handler)
+
+    async def test_login_posts_to_django_token_endpoint(self):
+        r = await self.client.post("/auth/login", json={"username": "u", "password": "p"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {"access": "a", "refresh": "r"})
+
+    async def test_upstream_status_is_passed_through(self):
+        r = await self.client.post("/auth/login", json={"username": "u", "password": "wrong"})
+        self.assertEqual(r.status_code, 401)
+
+    async def test_logins_share_pooled_connections(self):
+        for _ in range(5):
+            await self.client.post("/auth/login", json={"username": "u", "password": "p"})
+        self.assertEqual(self.standin.requests, 5)
+        self.assertEqual(self.standin.connections, 1)
+
+
+class LoginProxyTimeoutTest(GatewayTestCase):
+    delay = 0.5
+    env = {"UPSTREAM_READ_TIMEOUT": "0.05"}
+
+    async def test_slow_upstream_times_out_with_504(self):
+        r = await self.client.post("/auth/login", json={"username": "u", "password": "p"})
+        self.assertEqual(r.status_code, 504)
+
+
+class LoginProxyUnavailableTest(GatewayTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await self.standin.stop()
+
+    async def test_unreachable_upstream_is_502(self):
+        r = await self.client.post("/auth/login", json={"username": "u", "password": "p"})
+        self.assertEqual(r.status_code, 502)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _loader(body=b"{}", status_code=200, calls=None, fail=False):
+    async def load(previous):
+        if calls is not None:
+            calls.append(previous)
+        if fail:
+            raise RuntimeError("upstream down")
+        return CachedResponse(status_code, body)
+    return load
+
+
+class ResponseCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(max_entries=3, max_bytes=100, clock=self.clock)
+
+    async def test_hit_within_ttl_and_miss_after_stale_window(self):
+        calls = []
+        self.assertEqual((await self.cache.get_or_load("k", _loader(calls=calls), ttl=10))[1], "miss")
+        self.clock.now = 9
+        self.assertEqual((await self.cache.get_or_load("k", _loader(calls=calls), ttl=10))[1], "hit")
+        self.clock.now = 10
+        self.assertEqual((await self.cache.get_or_load("k", _loader(calls=calls), ttl=10))[1], "miss")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    async def test_stale_entry_is_served_while_one_background_refresh_runs(self):
+        await self.cache.get_or_load("k", _loader(b"old"), ttl=10, stale_ttl=30)
+        self.clock.now = 15
+        calls = []
+        first = await self.cache.get_or_load("k", _loader(b"new", calls=calls), ttl=10, stale_ttl=30)
+        second = await self.cache.get_or_load("k", _loader(b"new", calls=calls), ttl=10, stale_ttl=30)
+        self.assertEqual((first[0].body, first[1]), (b"old", "stale"))
+        self.assertEqual(second[1], "stale")
+        await asyncio.gather(*self.cache._refreshing.values())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].body, b"old")
+        value, outcome = await self.cache.get_or_load("k", _loader(b"unused"), ttl=10, stale_ttl=30)
+        self.assertEqual((value.body, outcome), (b"new", "hit"))
+
+    async def test_failed_refresh_keeps_serving_stale(self):
+        await self.cache.get_or_load("k", _loader(b"old"), ttl=10, stale_ttl=30)
+        self.clock.now = 15
+        with self.assertLogs("services.cache", "WARNING"):
+            await self.cache.get_or_load("k", _loader(fail=True), ttl=10, stale_ttl=30)
+            await asyncio.gather(*self.cache._refreshing.values())
+        value, outcome = await self.cache.get_or_load("k", _loader(b"unused"), ttl=10, stale_ttl=30)
+        self.assertEqual((value.body, outcome), (b"old", "stale"))
+        self.assertEqual(self.cache.stats()["refresh_errors"], 1)
+
+    async def test_lru_bounds_entries_and_bytes(self):
+        for key in "abc":
+            await self.cache.get_or_load(key, _loader(b"x" * 10), ttl=10)
+        await self.cache.get_or_load("a", _loader(), ttl=10)  # a becomes most recent
+        await self.cache.get_or_load("d", _loader(b"x" * 10), ttl=10)
+        self.assertEqual(list(self.cache._entries), ["c", "a", "d"])
+        await self.cache.get_or_load("e", _loader(b"x" * 91), ttl=10)
+        self.assertEqual(list(self.cache._entries), ["e"])
+        self.assertLessEqual(self.cache.bytes, 100)
+        self.assertEqual(self.cache.stats()["evictions"], 4)
+
+    async def test_errors_are_not_cached(self):
+        calls = []
+        for _ in range(2):
+            value, outcome = await self.cache.get_or_load("k", _loader(status_code=503, calls=calls), ttl=10)
+        self.assertEqual((value.status_code, outcome, len(calls)), (503, "miss", 2))
+
+    def test_cache_key_varies_on_credentials_only_when_asked(self):
+        def request(query, auth=None):
+            headers = [(b"authorization", auth.encode())] if auth else []
+            return Request({"type": "http", "method": "GET", "path": "/characters/", "query_string": query.encode(),
+                            "headers": headers})
+
+        self.assertEqual(cache_key(request("b=2&a=1", "Bearer x"), "characters"),
+                         cache_key(request("a=1&b=2"), "characters"))
+        scoped = [cache_key(request("a=1", auth), "characters", vary_on_auth=True)
+                  for auth in ("Bearer x", "Bearer y", None)]
+        self.assertEqual(len(set(scoped)), 3)
+        self.assertNotIn("Bearer", scoped[0])
+
+
+def _catalogue_handler(method, path, headers, body):
+    if headers.get("if-none-match") == '"v1"':
+        return 304, b""
+    return 200, [{"id": 1, "name": "Nova"}], {"ETag": '"v1"', "Cache-Control": "public, max-age=60"}
+
+
+class CharacterCatalogueProxyTest(GatewayTestCase):
+    handler = staticmethod(_catalogue_handler)
+    env = {"CACHE_TTL_CHARACTERS": "30", "CACHE_STALE_CHARACTERS": "60"}
+
+    async def test_catalogue_is_served_from_gateway_memory(self):
+        first = await self.client.get("/characters/?page=1")
+        second = await self.client.get("/characters/?page=1", headers={"Authorization": "Bearer someone"})
+        self.assertEqual(first.json(), [{"id": 1, "name": "Nova"}])
+        self.assertEqual((first.headers["x-cache"], second.headers["x-cache"]), ("MISS", "HIT"))
+        self.assertEqual(second.headers["etag"], '"v1"')
+        self.assertEqual(self.standin.requests, 1)
+        stats = (await self.client.get("/cache/stats")).json()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    async def test_stale_page_revalidates_in_background(self):
+        await self.client.get("/characters/")
+        cache = main.app.state.cache
+        for entry in cache._entries.values():
+            entry.fresh_until = cache.clock() - 1
+        r = await self.client.get("/characters/")
+        self.assertEqual(r.headers["x-cache"], "STALE")
+        await asyncio.gather(*cache._refreshing.values())
+        r = await self.client.get("/characters/")
+        self.assertEqual((r.headers["x-cache"], r.json()), ("HIT", [{"id": 1, "name": "Nova"}]))
+        self.assertEqual(self.standin.requests, 2)
+
+
+class ComponentsCacheTest(GatewayTestCase):
+    async def test_components_are_cached_and_misses_are_not(self):
+        self.assertEqual((await self.client.get("/components/")).headers["x-cache"], "MISS")
+        r = await self.client.get("/components/")
+        self.assertEqual((r.headers["x-cache"], r.json()[0]["id"]), ("HIT", "btn-1"))
+        self.assertEqual((await self.client.get("/components/card-1")).json()["name"], "NeonCard")
+        for _ in range(2):
+            r = await self.client.get("/components/nope")
+        self.assertEqual((r.status_code, r.headers["x-cache"]), (404, "MISS"))
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.standin = await UpstreamStandIn(delay=0.05).start()
+        self.addAsyncCleanup(self.standin.stop)
+        with mock.patch.dict(os.environ, {"UPSTREAM_BASE_URL": self.standin.url}):
+            self.upstream = UpstreamClient.from_env()
+        self.addAsyncCleanup(self.upstream.aclose)
+
+    async def test_concurrent_identical_gets_hit_upstream_once(self):
+        responses = await asyncio.gather(*(self.upstream.get("/api/v1/characters/", params={"page": 1}) for _ in range(1000)))
+        self.assertEqual(self.standin.requests, 1)
+        self.assertEqual(self.upstream.coalesced, 999)
+        self.assertTrue(all(r.json() == {"ok": True, "path": "/api/v1/characters/?page=1"} for r in responses))
+        self.assertEqual(self.upstream._inflight, {})
+
+    async def test_different_urls_or_credentials_are_not_coalesced(self):
+        await asyncio.gather(
+            self.upstream.get("/api/v1/characters/"),
+            self.upstream.get("/api/v1/characters/", params={"page": 2}),
+            self.upstream.get("/api/v1/characters/", headers={"Authorization": "Bearer a"}),
+            self.upstream.get("/api/v1/characters/", headers={"Authorization": "Bearer b"}),
+            self.upstream.get("/api/v1/characters/", coalesce=False),
+        )
+        self.assertEqual(self.standin.requests, 5)
+
+    async def test_error_reaches_every_waiter(self):
+        await self.standin.stop()
+        results = await asyncio.gather(*(self.upstream.get("/api/v1/characters/") for _ in range(50)), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, httpx.ConnectError) for r in results))
+        self.assertEqual(self.upstream._inflight, {})
+
+    async def test_cancelled_waiter_does_not_cancel_the_others(self):
+        waiters = [asyncio.create_task(self.upstream.get("/api/v1/characters/")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual([r.status_code for r in results[1:]], [200, 200])
+        self.assertEqual(self.standin.requests, 1)
+
+    async def test_upstream_call_is_cancelled_with_its_last_waiter(self):
+        waiters = [asyncio.create_task(self.upstream.get("/api/v1/characters/")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        flight = next(iter(self.upstream._inflight.values()))
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        self.assertEqual(self.upstream._inflight, {})
+        await asyncio.gather(flight.task, return_exceptions=True)
+        self.assertTrue(flight.task.cancelled())
+        # A new caller starts a fresh upstream request
+        self.assertEqual((await self.upstream.get("/api/v1/characters/")).status_code, 200)
+
+
+    async def test_each_waiter_keeps_its_own_deadline(self):
+        self.standin.delay = 0.2
+        now = time.monotonic()
+        loose = asyncio.create_task(self.upstream.get("/api/v1/characters/", deadline=now + 2))
+        tight = asyncio.create_task(self.upstream.get("/api/v1/characters/", deadline=now + 0.05))
+        with self.assertRaises(DeadlineExceeded):
+            await tight
+        self.assertLess(time.monotonic() - now, 0.15)
+        # The tight caller gave up without cancelling the request the looser one still waits on
+        self.assertEqual((await loose).status_code, 200)
+        self.assertEqual((self.standin.requests, self.upstream.coalesced), (1, 1))
+
+    async def test_looser_waiter_outlives_a_flight_started_with_a_tighter_deadline(self):
+        self.standin.delay = 0.2
+        now = time.monotonic()
+        tight = asyncio.create_task(self.upstream.get("/api/v1/characters/", deadline=now + 0.1))
+        await asyncio.sleep(0.01)
+        loose = asyncio.create_task(self.upstream.get("/api/v1/characters/", deadline=now + 2))
+        with self.assertRaises(DeadlineExceeded):
+            await tight
+        # The shared request was cut at the tight deadline; the looser caller retries on its own
+        self.assertEqual((await loose).status_code, 200)
+        self.assertEqual((self.standin.requests, self.upstream._inflight), (2, {}))
+
+SECRET = "test-django-secret"
+
+
+def make_token(secret=SECRET, lifetime=300, **claims):
+    """A token shaped like SimpleJWT's access tokens (which carry the user id as a string)."""
+    now = int(time.time())
+    payload = {"token_type": "access", "exp": now + lifetime, "iat": now, "jti": uuid.uuid4().hex, "user_id": "7"}
+    payload.update(claims)
+    return jwt.encode({k: v for k, v in payload.items() if v is not None}, secret, algorithm="HS256")
+
+
+class JWTVerifierTest(unittest.TestCase):
+    def setUp(self):
+        self.verifier = JWTVerifier(SECRET)
+
+    def test_valid_access_token(self):
+        claims = self.verifier.verify(make_token())
+        self.assertEqual(claims["user_id"], "7")
+
+    def test_rejections(self):
+        for token in (make_token(secret="other"), make_token(lifetime=-1), make_token(token_type="refresh"),
+                      make_token(user_id=None), make_token(exp=None), "not-a-jwt"):
+            with self.subTest(token=token), self.assertRaises(TokenRejected):
+                self.verifier.verify(token)
+
+    def test_audience_and_issuer_are_checked_when_configured(self):
+        verifier = JWTVerifier(SECRET, audience="neon", issuer="django")
+        self.assertEqual(verifier.verify(make_token(aud="neon", iss="django"))["user_id"], "7")
+        for token in (make_token(aud="other", iss="django"), make_token(aud="neon", iss="other"), make_token()):
+            with self.subTest(token=token), self.assertRaises(TokenRejected):
+                verifier.verify(token)
+
+    def test_verified_tokens_skip_the_signature_check_but_not_expiry(self):
+        clock = [time.time()]
+        verifier = JWTVerifier(SECRET, clock=lambda: clock[0])
+        token = make_token(lifetime=60)
+        verifier.verify(token)
+        with mock.patch("services.auth.jwt.decode") as decode:
+            verifier.verify(token)
+            decode.assert_not_called()
+        self.assertEqual(verifier.cache_hits, 1)
+        clock[0] += 61
+        with self.assertRaises(TokenRejected):
+            verifier.verify(token)
+
+    def test_verified_cache_is_bounded(self):
+        verifier = JWTVerifier(SECRET, cache_size=2)
+        for _ in range(3):
+            verifier.verify(make_token())
+        self.assertEqual(len(verifier._verified), 2)
+
+    def test_revoked_jti_and_inactive_user_are_rejected_even_when_cached(self):
+        token = make_token()
+        jti = jwt.get_unverified_claims(token)["jti"]
+        self.verifier.verify(token)
+        self.verifier.revocations.blacklisted[jti] = int(time.time()) + 300
+        with self.assertRaises(TokenRejected):
+            self.verifier.verify(token)
+        self.verifier.revocations.inactive_users.add("8")
+        with self.assertRaises(TokenRejected):
+            self.verifier.verify(make_token(user_id="8"))
+
+
+class RevocationSyncTest(unittest.IsolatedAsyncioTestCase):
+    async def test_sync_is_incremental_and_prunes_expired_entries(self):
+        now = int(time.time())
+        seen = []
+
+        def handler(method, path, headers, body):
+            seen.append((path, headers.get("x-gateway-key")))
+            if path.endswith("since=0&users_since=0"):
+                return 200, {"cursor": 2, "users_cursor": 2,
+                             "user_changes": [{"id": 9, "is_active": False}, {"id": 10, "is_active": False}],
+                             "blacklisted": [{"jti": "a", "exp": now + 60}, {"jti": "old", "exp": now - 1}]}
+            return 200, {"cursor": 3, "users_cursor": 3, "user_changes": [{"id": 10, "is_active": True}],
+                         "blacklisted": [{"jti": "b", "exp": now + 60}]}
+
+        async with UpstreamStandIn(handler) as standin:
+            with mock.patch.dict(os.environ, {"UPSTREAM_BASE_URL": standin.url}):
+                upstream = UpstreamClient.from_env()
+            revocations = RevocationList()
+            await revocations.sync(upstream, "key")
+            self.assertEqual((set(revocations.blacklisted), revocations.inactive_users), ({"a"}, {"9", "10"}))
+            await revocations.sync(upstream, "key")
+            await upstream.aclose()
+        self.assertEqual((set(revocations.blacklisted), revocations.inactive_users, revocations.cursor), ({"a", "b"}, {"9"}, 3))
+        self.assertEqual(seen, [("/api/v1/auth/revocations/?since=0&users_since=0", "key"),
+                                ("/api/v1/auth/revocations/?since=2&users_since=2", "key")])
+
+    async def test_synced_inactive_user_is_rejected(self):
+        def handler(method, path, headers, body):
+            return 200, {"cursor": 0, "users_cursor": 1, "user_changes": [{"id": 7, "is_active": False}], "blacklisted": []}
+
+        verifier = JWTVerifier(SECRET)
+        token = make_token()  # user_id "7", as SimpleJWT's for_user writes it
+        verifier.verify(token)
+        async with UpstreamStandIn(handler) as standin:
+            with mock.patch.dict(os.environ, {"UPSTREAM_BASE_URL": standin.url}):
+                upstream = UpstreamClient.from_env()
+            await verifier.revocations.sync(upstream, "key")
+            await upstream.aclose()
+        with self.assertRaises(TokenRejected):
+            verifier.verify(token)
+
+
+class EdgeAuthTest(GatewayTestCase):
+    env = {"DJANGO_SECRET_KEY": SECRET, "GATEWAY_SERVICE_KEY": ""}
+
+    async def test_tokens_are_checked_without_calling_django(self):
+        r = await self.client.get("/auth/verify", headers={"Authorization": f"Bearer {make_token()}"})
+        self.assertEqual((r.status_code, r.headers["x-user-id"]), (200, "7"))
+        for headers in ({}, {"Authorization": f"Bearer {make_token(secret='forged')}"}):
+            r = await self.client.get("/auth/verify", headers=headers)
+            self.assertEqual((r.status_code, r.headers["www-authenticate"]), (401, "Bearer"))
+        self.assertEqual(self.standin.requests, 0)
+
+
+MANIFEST = [
+    {"id": "btn-1", "name": "NeonButton", "description": "A glowing CTA", "tags": ["button", "CTA"]},
+    {"id": "btn-2", "name": "NeonButton", "description": "Outline variant", "tags": ["button"]},
+    {"id": "card-1", "name": "NeonCard", "description": "Fancy card", "tags": ["card"]},
+    {"id": "toggle-1", "name": "GlowToggle", "description": "Switch", "tags": ["button", "form"]},
+]
+
+
+def write_manifest(path, components):
+    with open(path, "w") as f:
+        json.dump({"components": components}, f)
+    # Make consecutive writes visible to the mtime/size check even within one clock tick
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+class ComponentRegistryTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "components.json")
+        write_manifest(self.path, MANIFEST)
+        self.reloaded = []
+        self.registry = ComponentRegistry(self.path, on_reload=lambda: self.reloaded.append(True))
+        self.registry.load()
+
+    def ids(self, **filters):
+        page, total = self.registry.list(**filters)
+        return [c["id"] for c in page], total
+
+    def test_lookups_and_filters(self):
+        self.assertEqual(self.registry.get("card-1")["name"], "NeonCard")
+        self.assertIsNone(self.registry.get("nope"))
+        self.assertEqual(self.ids(name="neonbutton"), (["btn-1", "btn-2"], 2))
+        self.assertEqual(self.ids(tag="cta"), (["btn-1"], 1))
+        self.assertEqual(self.ids(tag="button", name="NeonButton"), (["btn-1", "btn-2"], 2))
+        self.assertEqual(self.ids(tag="button", q="glow"), (["toggle-1"], 1))
+        self.assertEqual(self.ids(q="neon"), (["btn-1", "btn-2", "card-1"], 3))
+        self.assertEqual(self.ids(tag="missing"), ([], 0))
+
+    def test_pagination_reports_the_total(self):
+        self.assertEqual(self.ids(offset=1, limit=2), (["btn-2", "card-1"], 4))
+        self.assertEqual(self.ids(tag="button", offset=2, limit=5), (["toggle-1"], 3))
+
+    async def test_hot_reload_swaps_and_keeps_the_last_good_manifest(self):
+        self.assertFalse(await self.registry.reload_if_changed())
+        write_manifest(self.path, MANIFEST[:1])
+        self.assertTrue(await self.registry.reload_if_changed())
+        self.assertEqual((len(self.registry), len(self.reloaded)), (1, 2))
+
+        write_manifest(self.path, MANIFEST[:1] * 2)
+        with self.assertLogs("services.registry", "ERROR"):
+            self.assertFalse(await self.registry.reload_if_changed())
+        os.remove(self.path)
+        with self.assertLogs("services.registry", "ERROR"):
+            self.assertFalse(await self.registry.reload_if_changed())
+        self.assertEqual(self.registry.get("btn-1")["name"], "NeonButton")
+
+
+class ComponentsRouteTest(GatewayTestCase):
+    async def asyncSetUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "components.json")
+        write_manifest(self.path, MANIFEST)
+        self.env = {"COMPONENTS_MANIFEST": self.path, "COMPONENTS_RELOAD_INTERVAL": "3600"}
+        await super().asyncSetUp()
+
+    async def test_filtered_page_and_reload_invalidates_cached_responses(self):
+        r = await self.client.get("/components/", params={"tag": "button", "limit": 2})
+        self.assertEqual(([c["id"] for c in r.json()], r.headers["x-total-count"]), (["btn-1", "btn-2"], "3"))
+        self.assertEqual((await self.client.get("/components/card-1")).json()["description"], "Fancy card")
+        self.assertEqual((await self.client.get("/components/card-1")).headers["x-cache"], "HIT")
+
+        write_manifest(self.path, [dict(MANIFEST[2], description="Reloaded")])
+        await main.app.state.registry.reload_if_changed()
+        r = await self.client.get("/components/card-1")
+        self.assertEqual((r.headers["x-cache"], r.json()["description"]), ("MISS", "Reloaded"))
+        self.assertEqual((await self.client.get("/components/btn-1")).status_code, 404)
+        self.assertEqual((await self.client.get("/components/", params={"limit": 0})).status_code, 422)
+
+
+class UsersClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+
+        def handler(method, path, headers, body):
+            ids = path.split("ids=")[1].split("%2C")
+            self.calls.append((ids, headers.get("x-gateway-key")))
+            if self.fail:
+                return 503, {"detail": "down"}
+            return 200, {"users": [{"id": int(i), "username": f"user{i}"} for i in ids if int(i) < 100]}
+
+        self.fail = False
+        self.standin = await UpstreamStandIn(handler).start()
+        self.addAsyncCleanup(self.standin.stop)
+        with mock.patch.dict(os.environ, {"UPSTREAM_BASE_URL": self.standin.url, "UPSTREAM_MAX_RETRIES": "0"}):
+            self.upstream = UpstreamClient.from_env()
+        self.addAsyncCleanup(self.upstream.aclose)
+        self.clock = FakeClock()
+        self.users = UsersClient(self.upstream, "key", ttl=30, max_batch=50, clock=self.clock)
+
+    async def test_lookups_in_one_tick_become_one_request(self):
+        ids = [5, 3, 5, 7, 123]
+        results = await asyncio.gather(*(self.users.get_user(i) for i in ids))
+        self.assertEqual(self.calls, [(["5", "3", "7", "123"], "key")])
+        self.assertEqual(results[0], {"id": "5", "name": "user5"})
+        self.assertEqual(results[2], results[0])
+        self.assertIsNone(results[4])
+
+    async def test_results_are_cached_until_the_ttl(self):
+        await self.users.get_users([1, 2, 999])
+        self.assertEqual((await self.users.get_users([1, 2, 999]))["2"], {"id": "2", "name": "user2"})
+        self.assertEqual(len(self.calls), 1)
+        self.clock.now = 31
+        await self.users.get_user(1)
+        self.assertEqual(len(self.calls), 2)
+
+    async def test_large_batches_are_chunked(self):
+        await self.users.get_users(range(120))
+        self.assertEqual([len(ids) for ids, _ in self.calls], [50, 50, 20])
+
+    async def test_upstream_error_reaches_every_caller_and_is_not_cached(self):
+        self.fail = True
+        results = await asyncio.gather(*(self.users.get_user(i) for i in (1, 2)), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, httpx.HTTPStatusError) for r in results))
+        self.fail = False
+        self.assertEqual(await self.users.get_user(1), {"id": "1", "name": "user1"})
+        self.assertEqual(len(self.calls), 2)
+
+
+class FaultyDjango:
+    """Handler for UpstreamStandIn that plays a script of faults, then answers 200."""
+
+    def __init__(self, *faults):
+        self.faults = list(faults)
+        self.deadlines = []
+
+    async def __call__(self, method, path, headers, body):
+        self.deadlines.append(int(headers["x-request-timeout-ms"]) if "x-request-timeout-ms" in headers else None)
+        fault = self.faults.pop(0) if self.faults else "ok"
+        if fault == "drop":
+            return UpstreamStandIn.DROP
+        if isinstance(fault, float):
+            await asyncio.sleep(fault)
+        elif isinstance(fault, int):
+            return fault, {"detail": "injected"}
+        return 200, {"ok": True}
+
+
+class UpstreamResilienceTest(unittest.IsolatedAsyncioTestCase):
+    async def start(self, django, **options):
+        self.django = django
+        self.standin = await UpstreamStandIn(django).start()
+        self.addAsyncCleanup(self.standin.stop)
+        options = {"max_retries": 2, "retry_budget": RetryBudget(ratio=1, min_retries=10),
+                   "breaker_threshold": 100, "breaker_reset": 0.2, **options}
+        self.upstream = UpstreamClient(self.standin.url, limits=httpx.Limits(), timeout=httpx.Timeout(5), **options)
+        self.addAsyncCleanup(self.upstream.aclose)
+
+    async def test_deadline_is_forwarded_and_enforced_locally(self):
+        await self.start(FaultyDjango(1.0))
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            await self.upstream.get("/slow/", route="slow", deadline=started + 0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertLessEqual(self.django.deadlines[0], 100)
+        self.assertEqual(self.standin.requests, 1)
+
+    async def test_idempotent_calls_retry_with_backoff(self):
+        await self.start(FaultyDjango(503, "drop"))
+        r = await self.upstream.get("/flaky/", route="flaky")
+        self.assertEqual((r.status_code, self.standin.requests, self.upstream.retries), (200, 3, 2))
+
+    async def test_non_idempotent_calls_are_not_retried(self):
+        await self.start(FaultyDjango(503, "drop"))
+        r = await self.upstream.post("/api/auth/token/", json={}, route="auth.login")
+        self.assertEqual((r.status_code, self.standin.requests), (503, 1))
+        with self.assertRaises(httpx.TransportError):
+            await self.upstream.post("/api/auth/token/", json={}, route="auth.login")
+        self.assertEqual(self.upstream.retries, 0)
+
+    async def test_retry_budget_caps_retries_to_a_share_of_traffic(self):
+        await self.start(FaultyDjango(*[503] * 100), retry_budget=RetryBudget(ratio=0.1, min_retries=0))
+        for _ in range(20):
+            self.assertEqual((await self.upstream.get("/down/", route="down")).status_code, 503)
+        self.assertLessEqual(self.upstream.retries, 2)
+        self.assertLessEqual(self.standin.requests, 22)
+        self.assertGreater(self.upstream.retry_budget.exhausted, 0)
+
+    def test_retry_budget_forgets_requests_outside_the_window_without_retries(self):
+        clock = FakeClock()
+        budget = RetryBudget(window=10, clock=clock)
+        for i in range(1000):
+            clock.now = i
+            budget.record_request()
+        self.assertEqual(len(budget._requests), 10)
+
+    async def test_breaker_fails_fast_then_probes_and_closes(self):
+        await self.start(FaultyDjango(503, 503, 503), max_retries=0, breaker_threshold=3)
+        for _ in range(3):
+            await self.upstream.get("/down/", route="down")
+        with self.assertRaises(CircuitOpenError):
+            await self.upstream.get("/down/", route="down")
+        self.assertEqual(self.standin.requests, 3)
+        # Other routes have their own breaker
+        self.assertEqual((await self.upstream.get("/other/", route="other")).status_code, 200)
+
+        await asyncio.sleep(0.25)
+        self.assertEqual((await self.upstream.get("/down/", route="down")).status_code, 200)
+        self.assertEqual(self.upstream.breaker("down").state, "closed")
+
+    async def test_failed_probe_reopens_the_circuit(self):
+        await self.start(FaultyDjango("drop", "drop"), max_retries=0, breaker_threshold=1)
+        with self.assertRaises(httpx.TransportError):
+            await self.upstream.get("/down/", route="down")
+        await asyncio.sleep(0.25)
+        with self.assertRaises(httpx.TransportError):
+            await self.upstream.get("/down/", route="down")
+        with self.assertRaises(CircuitOpenError):
+            await self.upstream.get("/down/", route="down")
+
+
+class GatewayResilienceTest(GatewayTestCase):
+    env = {"CIRCUIT_FAILURE_THRESHOLD": "2", "CIRCUIT_RESET_TIMEOUT": "30", "UPSTREAM_MAX_RETRIES": "0",
+           "CACHE_TTL_CHARACTERS": "30", "CACHE_STALE_CHARACTERS": "0"}
+
+    async def asyncSetUp(self):
+        self.handler = FaultyDjango()
+        await super().asyncSetUp()
+
+    async def test_caller_deadline_is_tightened_and_forwarded(self):
+        await self.client.post("/auth/login", json={}, headers={"X-Request-Timeout-Ms": "250"})
+        self.assertLessEqual(self.handler.deadlines[0], 250)
+        await self.client.post("/auth/login", json={})
+        self.assertGreater(self.handler.deadlines[1], 250)
+
+    async def test_open_circuit_fails_fast_and_serves_stale_catalogue(self):
+        self.assertEqual((await self.client.get("/characters/")).headers["x-cache"], "MISS")
+        for entry in main.app.state.cache._entries.values():
+            entry.fresh_until = entry.stale_until = main.app.state.cache.clock() - 1
+        self.handler.faults = [503, 503]
+        for _ in range(3):
+            r = await self.client.get("/characters/")
+            self.assertEqual((r.status_code, r.headers["x-cache"], r.json()), (200, "STALE", {"ok": True}))
+        self.assertEqual(self.standin.requests, 3)
+        self.assertEqual(main.app.state.upstream.breaker("characters.list").state, "open")
+
+        r = await self.client.post("/auth/login", json={})
+        self.assertEqual(r.status_code, 200)
+        for _ in range(2):
+            self.handler.faults = [503]
+            await self.client.post("/auth/login", json={})
+        r = await self.client.post("/auth/login", json={})
+        self.assertEqual((r.status_code, r.headers["retry-after"]), (503, "30"))
+
+
+class MetricsTest(GatewayTestCase):
+    handler = staticmethod(_token_handler)
+
+    def test_histogram_percentiles_within_bucket_precision(self):
+        histogram = Histogram()
+        for ms in range(1, 1001):
+            histogram.record(ms / 1000)
+        for q, expected in ((0.5, 0.5), (0.9, 0.9), (0.99, 0.99)):
+            self.assertAlmostEqual(histogram.percentile(q), expected, delta=expected / 32)
+        self.assertEqual(histogram.percentile(1), 1.0)
+        self.assertEqual(histogram.cumulative([0.0005, 0.1, 60]), [0, 100, 1000])
+
+    async def test_requests_are_recorded_by_route_template_with_upstream_latency(self):
+        ok, rejected = ("/auth/login", "POST", 200), ("/auth/login", "POST", 401)
+        before = REQUESTS.children.get(ok, 0), REQUESTS.children.get(rejected, 0)
+        upstream_before = UPSTREAM_LATENCY.children.get(("auth.login", "2xx"))
+        upstream_before = upstream_before.count if upstream_before else 0
+        for password in ("p", "p", "wrong"):
+            await self.client.post("/auth/login", json={"username": "u", "password": password})
+        await self.client.get("/no/such/path")
+
+        self.assertEqual((REQUESTS.children[ok], REQUESTS.children[rejected]), (before[0] + 2, before[1] + 1))
+        self.assertIn(("unmatched", "GET", 404), REQUESTS.children)
+        # Django's 401 is a 4xx upstream outcome, not an error
+        self.assertEqual(UPSTREAM_LATENCY.children[("auth.login", "2xx")].count, upstream_before + 2)
+        self.assertIn(("auth.login", "4xx"), UPSTREAM_LATENCY.children)
+
+        r = await self.client.get("/metrics")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(f'gateway_http_requests_total{{route="/auth/login",method="POST",status="200"}} '
+                      f'{before[0] + 2}', r.text)
+        self.assertIn('gateway_http_request_duration_seconds_quantile{route="/auth/login",method="POST",quantile="0.99"}',
+                      r.text)
+        self.assertIn('gateway_upstream_request_duration_seconds_bucket{route="auth.login",outcome="2xx",le="+Inf"}',
+                      r.text)
+        self.assertIn('gateway_cache_events_total{kind="hits"} 0', r.text)
+
+    async def test_metrics_token(self):
+        with mock.patch.dict(os.environ, {"METRICS_TOKEN": "s3cret"}):
+            self.assertEqual((await self.client.get("/metrics")).status_code, 401)
+            r = await self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(r.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()